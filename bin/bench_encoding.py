@@ -0,0 +1,83 @@
+"""utility binary to benchmark response encodings of api endpoints."""
+import os
+import os.path
+import sys
+import timeit
+
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(current_dir)
+
+
+import simplejson as json
+
+from smartops.api import utils
+from smartops.app import app
+from smartops.utils import flags
+from smartops.utils import logsetting
+
+
+flags.add('app_id', type='int',
+          help='app id whose endpoints are benchmarked',
+          default=1)
+flags.add('repeat', type='int',
+          help='times to encode each response',
+          default=100)
+
+
+ENDPOINTS = [
+    '/apps',
+    '/apps/%(app_id)s',
+    '/apps/%(app_id)s/blueprint',
+    '/apps/%(app_id)s/sla',
+    '/apps/%(app_id)s/status',
+    '/apps/%(app_id)s/dryrun_base_plan',
+]
+
+
+# (name, mimetype, pretty, content encoding)
+ENCODINGS = [
+    ('json pretty', 'application/json', True, None),
+    ('json', 'application/json', False, None),
+    ('json gzip', 'application/json', False, 'gzip'),
+    ('msgpack', 'application/msgpack', False, None),
+    ('msgpack gzip', 'application/msgpack', False, 'gzip'),
+]
+
+
+def _encode(data, mimetype, pretty, content_encoding):
+    result = utils.encode_data(data, mimetype, pretty)
+    if content_encoding:
+        result = utils.compress_data(result, content_encoding)
+    return result
+
+
+def benchmark():
+    client = app.test_client()
+    print '%-32s %-14s %10s %12s' % (
+        'endpoint', 'encoding', 'bytes', 'encode(ms)'
+    )
+    for endpoint in ENDPOINTS:
+        url = endpoint % {'app_id': flags.OPTIONS.app_id}
+        resp = client.get(url, headers={'Accept': 'application/json'})
+        if resp.status_code != 200:
+            print '%-32s skipped: status %s' % (url, resp.status_code)
+            continue
+        data = json.loads(resp.get_data())
+        for name, mimetype, pretty, content_encoding in ENCODINGS:
+            if mimetype not in dict(utils.ENCODERS):
+                continue
+            size = len(_encode(data, mimetype, pretty, content_encoding))
+            seconds = timeit.timeit(
+                lambda: _encode(data, mimetype, pretty, content_encoding),
+                number=flags.OPTIONS.repeat
+            )
+            print '%-32s %-14s %10d %12.3f' % (
+                url, name, size, seconds * 1000 / flags.OPTIONS.repeat
+            )
+
+
+if __name__ == '__main__':
+    flags.init()
+    logsetting.init()
+    benchmark()
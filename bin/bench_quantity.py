@@ -0,0 +1,82 @@
+"""utility binary to benchmark parsing of resource quantities."""
+import os
+import os.path
+import random
+import sys
+import timeit
+
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(current_dir)
+
+
+from smartops.utils import flags
+from smartops.utils import logsetting
+from smartops.utils import quantity
+
+
+flags.add('containers', type='int',
+          help='number of containers in the benchmarked plan',
+          default=10000)
+flags.add('repeat', type='int',
+          help='times to parse the plan',
+          default=10)
+
+
+# quantities the replace based parsing handles.
+CPU_VALUES = ['100m', '250m', '500m', '1000m', '2000m']
+MEMORY_VALUES = ['128Mi', '256Mi', '512Mi', '1024Mi', '2048Mi']
+
+
+def _replace_parse(cpus, memories):
+    cpu = sum([float(value.replace('m', '')) / 1000 for value in cpus])
+    memory = sum([float(value.replace('Mi', '')) for value in memories])
+    return cpu, memory
+
+
+def _memoized_parse(cpus, memories):
+    cpu = sum([quantity.parse_cpu(value) for value in cpus])
+    memory = sum([quantity.parse_memory(value) for value in memories])
+    return cpu, memory
+
+
+def _vectorized_parse(cpus, memories):
+    return (
+        quantity.sum_quantities(cpus) / float(quantity.MILLI),
+        quantity.sum_quantities(memories) // quantity.MILLI
+    )
+
+
+def _uncached_parse(cpus, memories):
+    cpu = sum([float(quantity.parse_quantity(value)) for value in cpus])
+    memory = sum([int(quantity.parse_quantity(value)) for value in memories])
+    return cpu, memory
+
+
+def benchmark():
+    cpus = [
+        random.choice(CPU_VALUES) for _ in range(flags.OPTIONS.containers)
+    ]
+    memories = [
+        random.choice(MEMORY_VALUES)
+        for _ in range(flags.OPTIONS.containers)
+    ]
+    print '%-12s %12s' % ('parser', 'parse(ms)')
+    for name, parse in [
+        ('replace', _replace_parse),
+        ('uncached', _uncached_parse),
+        ('memoized', _memoized_parse),
+        ('vectorized', _vectorized_parse),
+    ]:
+        seconds = timeit.timeit(
+            lambda: parse(cpus, memories), number=flags.OPTIONS.repeat
+        )
+        print '%-12s %12.3f' % (
+            name, seconds * 1000 / flags.OPTIONS.repeat
+        )
+
+
+if __name__ == '__main__':
+    flags.init()
+    logsetting.init()
+    benchmark()
@@ -0,0 +1,85 @@
+"""utility binary to measure throughput of a running api server.
+
+Run it against the dev server and the prefork server to compare, e.g.
+    python bin/runserver.py --server_mode=dev --nodebug
+    python bin/runserver.py --server_mode=prefork
+    python bin/bench_server.py --url=http://127.0.0.1:8000/apps/1
+"""
+import os
+import os.path
+import sys
+import threading
+import time
+
+
+current_dir = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(current_dir)
+
+
+import requests
+
+from smartops.utils import flags
+from smartops.utils import logsetting
+
+
+flags.add('url',
+          help='url requested by the benchmark',
+          default='http://127.0.0.1:8000/apps')
+flags.add('concurrency', type='int',
+          help='number of concurrent clients',
+          default=16)
+flags.add('duration', type='int',
+          help='seconds to run the benchmark',
+          default=10)
+
+
+def _run_client(url, deadline, latencies, errors):
+    session = requests.Session()
+    while time.time() < deadline:
+        start = time.time()
+        try:
+            resp = session.get(url)
+            resp.raise_for_status()
+        except requests.RequestException:
+            errors.append(1)
+            continue
+        latencies.append(time.time() - start)
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def benchmark():
+    latencies = []
+    errors = []
+    start = time.time()
+    deadline = start + flags.OPTIONS.duration
+    threads = [
+        threading.Thread(
+            target=_run_client,
+            args=(flags.OPTIONS.url, deadline, latencies, errors)
+        )
+        for _ in range(flags.OPTIONS.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+    latencies.sort()
+    print 'url:          %s' % flags.OPTIONS.url
+    print 'concurrency:  %d' % flags.OPTIONS.concurrency
+    print 'requests:     %d' % len(latencies)
+    print 'errors:       %d' % len(errors)
+    print 'requests/s:   %.1f' % (len(latencies) / elapsed)
+    print 'p50(ms):      %.2f' % (_percentile(latencies, 50) * 1000)
+    print 'p99(ms):      %.2f' % (_percentile(latencies, 99) * 1000)
+
+
+if __name__ == '__main__':
+    flags.init()
+    logsetting.init()
+    benchmark()
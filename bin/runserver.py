@@ -1,6 +1,8 @@
 import logging
+import multiprocessing
+import os
+import tempfile
 
-from smartops.api import app
 from smartops.utils import flags
 from smartops.utils import logsetting
 
@@ -8,13 +10,138 @@ from smartops.utils import logsetting
 flags.add('server_host',
           help='server host address',
           default='0.0.0.0')
+flags.add('server_port', type='int',
+          help='server port',
+          default=8000)
 flags.add_bool('debug',
                help='run in debug mode',
                default=True)
+flags.add('server_mode',
+          help='server mode in [dev, prefork]. dev runs the flask '
+               'development server, prefork runs pre-forked gunicorn '
+               'workers',
+          default='dev')
+flags.add('workers', type='int',
+          help='number of worker processes in prefork mode',
+          default=multiprocessing.cpu_count() * 2 + 1)
+flags.add('threads', type='int',
+          help='number of threads per worker in prefork mode',
+          default=8)
+flags.add('max_requests', type='int',
+          help='requests a worker serves before it is recycled, '
+               '0 to disable recycling',
+          default=10000)
+flags.add('max_requests_jitter', type='int',
+          help='random jitter added to max_requests so workers '
+               'are not recycled at the same time',
+          default=1000)
+flags.add('graceful_timeout', type='int',
+          help='seconds workers get to finish requests on reload '
+               'or shutdown',
+          default=30)
+flags.add('worker_timeout', type='int',
+          help='seconds a silent worker is given before it is killed',
+          default=60)
+flags.add_bool('preload',
+               help='load the app in the master before forking workers',
+               default=True)
+
+
+def _post_fork(server, worker):
+    # connections opened by the master must not be shared by workers.
+    from smartops.db.handlers import database
+    if database.ENGINE is not None:
+        database.ENGINE.dispose()
+
+
+def _worker_exit(server, worker):
+    # the metrics of the worker are kept after it is recycled.
+    from smartops.api import metrics
+    metrics.merge_exited()
+
+
+def _init_metrics_dir():
+    """Empty the dir where workers write their metrics to be merged."""
+    from smartops.utils import setting_wrapper as setting
+    if not setting.METRICS_MULTIPROCESS_DIR:
+        setting.METRICS_MULTIPROCESS_DIR = tempfile.mkdtemp(
+            prefix='smartops-metrics-'
+        )
+    directory = setting.METRICS_MULTIPROCESS_DIR
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for filename in os.listdir(directory):
+        if filename.endswith(('.json', '.tmp', '.lock')):
+            os.remove(os.path.join(directory, filename))
+    logging.info('workers write metrics to %s', directory)
+
+
+def run_prefork_server():
+    """Run the app in pre-forked gunicorn workers.
+
+    Send SIGHUP to the master to reload workers gracefully.
+    """
+    from gunicorn.app.base import BaseApplication
+    from smartops.utils import setting_wrapper as setting
+
+    if flags.OPTIONS.workers > 1 and setting.RESPONSE_CACHE_BACKEND in [
+        'lru', 'fake_redis'
+    ]:
+        # workers would not see the invalidations of each other.
+        logging.warning(
+            'response cache %s is per process, disabled for %s workers',
+            setting.RESPONSE_CACHE_BACKEND, flags.OPTIONS.workers
+        )
+        setting.RESPONSE_CACHE_BACKEND = 'none'
+    _init_metrics_dir()
+
+    class Application(BaseApplication):
+
+        def load_config(self):
+            options = {
+                'bind': '%s:%s' % (
+                    flags.OPTIONS.server_host, flags.OPTIONS.server_port
+                ),
+                'workers': flags.OPTIONS.workers,
+                'threads': flags.OPTIONS.threads,
+                'worker_class': 'gthread',
+                'max_requests': flags.OPTIONS.max_requests,
+                'max_requests_jitter': flags.OPTIONS.max_requests_jitter,
+                'graceful_timeout': flags.OPTIONS.graceful_timeout,
+                'timeout': flags.OPTIONS.worker_timeout,
+                'preload_app': flags.OPTIONS.preload,
+                'post_fork': _post_fork,
+                'worker_exit': _worker_exit,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from smartops.app import app
+            app.debug = False
+            return app
+
+    Application().run()
+
+
+def run_dev_server():
+    """Run the app in the flask development server."""
+    from smartops.app import app
+    app.run(
+        host=flags.OPTIONS.server_host, port=flags.OPTIONS.server_port,
+        debug=flags.OPTIONS.debug, threaded=True
+    )
 
 
 if __name__ == '__main__':
     flags.init()
     logsetting.init()
-    logging.info('run server')
-    app.run(host=flags.OPTIONS.server_host, port=8000, debug=flags.OPTIONS.debug)
+    logging.info('run server in %s mode', flags.OPTIONS.server_mode)
+    if flags.OPTIONS.server_mode == 'prefork':
+        run_prefork_server()
+    elif flags.OPTIONS.server_mode == 'dev':
+        run_dev_server()
+    else:
+        raise ValueError(
+            'unknown server mode %s' % flags.OPTIONS.server_mode
+        )
@@ -2,29 +2,110 @@ import logging
 
 from smartops.actions import util
 from smartops.db.handlers import app as app_handler
+from smartops.db.handlers import app_status as status_handler
+from smartops.db.handlers import blueprint as blueprint_handler
+from smartops.deployment import deploy_executor
 from smartops.deployment.deploy_manager import DeployManager
 from smartops.deployment.deploy_manager import CapacityPlannerDeployManager
 
 
-def deploy(app_id, entrypoint, blueprint, test_plan):
+def _is_superseded(app_id, revision):
+    """Check if another revision than revision was deployed since."""
+    if revision is None:
+        return False
+    deployed_revision = blueprint_handler.get_deployed_revision_by_app_id(
+        app_id
+    )
+    if deployed_revision == revision:
+        return False
+    logging.info(
+        'revision %s of app %s was superseded by %s, status not updated',
+        revision, app_id, deployed_revision
+    )
+    return True
+
+
+def deploy(
+    app_id, entrypoint, blueprint, test_plan, changes=None, revision=None
+):
+    """Deploy app blueprint.
+
+    Only the components added or changed in changes, the diff from the
+    deployed blueprint, are deployed unless changes is None. revision
+    of the blueprint is recorded as deployed on success. The app is
+    LAUNCHING until all its pods and controllers are ready, then
+    LAUNCHED, or ERROR when deployment fails or they are not ready in
+    setting.DEPLOY_READY_TIMEOUT. The lock is only held while applying,
+    not while waiting for them to be ready, so another revision may be
+    deployed meanwhile; the status is then left to that deployment.
+    """
     with util.lock('serialized_action', timeout=1000) as lock:
         if not lock:
             raise Exception('Failed to acquire lock for deployment.')
 
+        status_handler.update_status_by_app_id(
+            app_id, status='LAUNCHING', message='Deploying application',
+            severity='INFO'
+        )
         deploy_successful = True
         try:
             deploy_manager = DeployManager(
-                app_id, entrypoint, blueprint, test_plan)
+                app_id, blueprint, test_plan, entrypoint, changes=changes
+            )
             logging.info('Created deploy manager for %s', app_id)
-            deploy_manager.deploy()
+            for result in deploy_manager.deploy():
+                logging.info(
+                    'component %s %s of app %s %s in %.3fs',
+                    result['kind'], result['name'], app_id,
+                    result['status'], result['seconds']
+                )
+                if result['status'] == deploy_executor.FAILED:
+                    deploy_successful = False
         except Exception as error:
             logging.exception(error)
             deploy_successful = False
 
+        if deploy_successful and revision is not None:
+            blueprint_handler.update_deployed_revision_by_app_id(
+                app_id, revision
+            )
         if not deploy_successful:
-            util.ActionHelper.update_staus(
-                app_id, status='ERROR', message='Failed to deploy application.'
+            status_handler.update_status_by_app_id(
+                app_id, status='ERROR',
+                message='Failed to deploy application.', severity='ERROR'
             )
+            return
+
+    try:
+        not_ready = deploy_manager.wait_until_ready()
+    except Exception as error:
+        logging.exception(error)
+        if _is_superseded(app_id, revision):
+            return
+        status_handler.update_status_by_app_id(
+            app_id, status='ERROR',
+            message='Failed to wait for application to be ready.',
+            severity='ERROR'
+        )
+        return
+    if _is_superseded(app_id, revision):
+        return
+    if not_ready:
+        status_handler.update_status_by_app_id(
+            app_id, status='ERROR',
+            message=(
+                'Components not ready: %s' % ', '.join(sorted([
+                    '%s %s %s' % (kind, name, reason)
+                    for (kind, _, name), reason in not_ready.items()
+                ]))
+            )[:200],
+            severity='ERROR'
+        )
+    else:
+        status_handler.update_status_by_app_id(
+            app_id, status='LAUNCHED', message='Application is ready',
+            severity='INFO'
+        )
 
 
 def deploy_capacity_planner(app_id, entrypoint, blueprint, test_plan):
@@ -7,7 +7,9 @@ from contextlib import contextmanager
 
 from jinja2 import Environment, FileSystemLoader
 from smartops.db.handlers import app as app_handler
+from smartops.db.handlers import blueprint as blueprint_handler
 from smartops.utils import setting_wrapper as setting
+from smartops.utils import topology
 
 
 @contextmanager
@@ -45,7 +47,12 @@ def lock(lock_name, blocking=True, timeout=10):
 
 
 def generate_application_topology(app_id, entrypoint, blueprint, test_plan):
-    return
+    """Get the service topology of app as an escaped json string."""
+    topology_graph = blueprint_handler.get_topology_graph_by_app_id(app_id)
+    # escaped to be embedded in a json string of the plan template.
+    return json.dumps(
+        json.dumps(topology.get_service_topology(topology_graph))
+    )[1:-1]
 
 def load_capacity_plan(app_id, entrypoint, blueprint, test_plan):
     plan_dir = setting.CAPACITY_PLAN_DIR
@@ -4,27 +4,56 @@ import logging
 import re
 import requests
 import simplejson as json
+import threading
+import time
 import yaml
 
 from flask import Blueprint
-from flask import make_response
 from flask import request
 from smartops.api import exception_handler
+from smartops.api import metrics
 from smartops.api import utils
 from smartops.db.handlers import app as app_handler
 from smartops.db.handlers import app_status as status_handler
 from smartops.db.handlers import blueprint as blueprint_handler
+from smartops.db.handlers import cache
 from smartops.db.handlers import capacity_plan as capacity_plan_handler
 from smartops.db.handlers import database
 # from smartops.db.handlers import metrics as metrics_handler
 from smartops.db.handlers import sla as sla_handler
+from smartops.db import exception
 from smartops.utils import flags
+from smartops.utils import http_client
 from smartops.utils import logsetting
+from smartops.utils import pubsub
+from smartops.utils import setting_wrapper as setting
 from smartops.utils import util
 
 
 api = Blueprint('api', __name__)
 
+
+@api.before_request
+def _start_request_metrics():
+    metrics.start_request()
+
+
+@api.after_request
+def _end_request_metrics(resp):
+    if resp.is_streamed:
+        metrics.end_request(resp.status_code)
+    else:
+        metrics.end_request(resp.status_code, resp.content_length)
+    return resp
+
+
+@api.teardown_request
+def _end_failed_request_metrics(exc):
+    # after_request is skipped when the view raises.
+    if exc is not None:
+        metrics.end_request(500)
+
+
 def _wrap_response(func, response_code):
     def wrapped_func(*args, **kwargs):
         return utils.make_json_response(
@@ -41,6 +70,8 @@ def _get_request_args(**kwargs):
        kwargs: for each key, the value is the type converter.
     """
     args = dict(request.args)
+    # pretty only selects the response format, see utils.make_json_response
+    args.pop('pretty', None)
     logging.log(
         logsetting.getLevelByName('fine'),
         'origin request args: %s', args
@@ -59,6 +90,69 @@ def _get_request_args(**kwargs):
     return args
 
 
+def _pop_request_arg(args, key, default=None):
+    """Pop single value arg from request args got by _get_request_args."""
+    value = args.pop(key, default)
+    if isinstance(value, list):
+        value = value[-1] if value else default
+    return value
+
+
+def _conditional_get(get_version, mimetype=None):
+    """Decorator to answer conditional GET of app resource.
+
+    get_version(app_id) should be a cheap lookup returning a string
+    which changes whenever the resource changes, or None if the
+    resource does not exist. If the etag generated from it matches
+    If-None-Match, 304 is returned without calling decorated func.
+    func should read the resource after, not from a cache, so the body
+    is never older than the etag; see _conditional_get_cached.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(app_id):
+            version = get_version(app_id)
+            if version is None:
+                return func(app_id)
+            etag = utils.make_etag(version, mimetype)
+            if request.if_none_match.contains(etag):
+                return utils.make_not_modified_response(etag)
+            resp = func(app_id)
+            if resp.status_code == 200:
+                resp.set_etag(etag)
+            return resp
+        return wrapper
+    return decorator
+
+
+def _conditional_get_cached(getter, mimetype=None):
+    """Decorator to answer conditional GET of a cached app resource.
+
+    getter(app_id) should be decorated by cache.cached. If-None-Match
+    is checked against the cached version alone, so a 304 does not
+    load the value. Otherwise the response has the etag of the cache
+    entry it is made from, so the etag always matches the body even if
+    the entry is stale. The decorated func(app_id, value) makes the
+    response of value; no etag is set if the version is None.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(app_id):
+            if request.if_none_match:
+                version = getter.get_version(app_id)
+                if version is not None:
+                    etag = utils.make_etag(version, mimetype)
+                    if request.if_none_match.contains(etag):
+                        return utils.make_not_modified_response(etag)
+            version, value = getter.get_versioned(app_id)
+            resp = func(app_id, value)
+            if version is not None and resp.status_code == 200:
+                resp.set_etag(utils.make_etag(version, mimetype))
+            return resp
+        return wrapper
+    return decorator
+
+
 def _get_request_data():
     """Convert reqeust data from string to python dict.
     If the request data is not json formatted, raises
@@ -72,7 +166,6 @@ def _get_request_data():
         return request.form.to_dict()
     if request.data:
         try:
-            print "DATA:", request.data
             data = json.loads(request.data)
         except Exception:
             raise exception_handler.BadRequest(
@@ -87,16 +180,51 @@ def _get_request_data():
         return {}
 
 
+def _get_request_list_data():
+    """Convert request data from string to python list.
+    If the request data is not json formatted list, raises
+    exception_handler.BadRequest.
+    Usage: It is used to add resources in bulk.
+    """
+    try:
+        data = json.loads(request.data)
+    except Exception:
+        raise exception_handler.BadRequest(
+            'request data is not json formatted: %s' % request.data
+        )
+    if not isinstance(data, list):
+        raise exception_handler.BadRequest(
+            'request data is not json formatted list: %s' % request.data
+        )
+    return data
+
+
 @api.route('/apps', methods=['GET'])
 def list_apps():
+    """List apps.
+
+    With limit, one page of apps is returned, and the cursor of the
+    next page is sent in X-Next-Cursor header to be passed as after.
+    Without limit, all apps are streamed.
+    """
     data = _get_request_args()
-    return utils.make_json_response(
-        200,
-        app_handler.list_apps(
-            **data
+    limit = _pop_request_arg(data, 'limit')
+    after = _pop_request_arg(data, 'after')
+    order_by = _pop_request_arg(data, 'order_by', 'id')
+    if limit is None:
+        return utils.make_json_stream_response(
+            200,
+            app_handler.iter_apps(
+                order_by=order_by, **data
+            )
         )
+    apps, next_cursor = app_handler.list_apps(
+        limit=limit, after=after, order_by=order_by, **data
     )
-    return apps
+    headers = {}
+    if next_cursor:
+        headers['X-Next-Cursor'] = next_cursor
+    return utils.make_json_response(200, apps, headers)
 
 @api.route('/apps/<int:app_id>', methods=['GET'])
 def get_app_by_id(app_id):
@@ -121,12 +249,11 @@ def show_app_config(app_id):
 
 
 @api.route('/apps/<int:app_id>/status', methods=['GET'])
-def show_app_status(app_id):
+@_conditional_get_cached(status_handler.get_status_by_app_id)
+def show_app_status(app_id, status):
     return utils.make_json_response(
         200,
-        status_handler.get_status_by_app_id(
-            app_id
-        )
+        status
     )
 
 
@@ -156,6 +283,15 @@ def create_app():
     )
 
 
+@api.route('/apps:bulk', methods=['POST'])
+def create_apps():
+    data = _get_request_list_data()
+    return utils.make_json_response(
+        200,
+        app_handler.create_apps(data)
+    )
+
+
 @api.route('/apps/<int:app_id>', methods=['DELETE'])
 def delete_app_by_id(app_id):
     data = _get_request_data()
@@ -168,8 +304,8 @@ def delete_app_by_id(app_id):
 
 
 @api.route('/apps/<int:app_id>/blueprint', methods=['GET'])
-def get_blueprint_by_app_id(app_id):
-    blueprint = blueprint_handler.get_blueprint_by_app_id(app_id)
+@_conditional_get_cached(blueprint_handler.get_blueprint_by_app_id)
+def get_blueprint_by_app_id(app_id, blueprint):
     if not blueprint:
         return utils.make_json_response(
             404,
@@ -184,6 +320,9 @@ def get_blueprint_by_app_id(app_id):
 
 
 @api.route('/apps/<int:app_id>/raw_blueprint', methods=['GET'])
+@_conditional_get(
+    blueprint_handler.get_blueprint_version_by_app_id, 'text/plain'
+)
 def get_raw_blueprint_by_app_id(app_id):
     raw_blueprint = blueprint_handler.get_raw_blueprint_by_app_id(app_id)
     if raw_blueprint == None:
@@ -193,9 +332,7 @@ def get_raw_blueprint_by_app_id(app_id):
                 'error': 'Blueprint not found for App: %s' % app_id
             }
         )
-    response = make_response(raw_blueprint, 200)
-    response.headers["content-type"] = "text/plain"
-    return response
+    return utils.make_text_response(200, raw_blueprint)
 
 
 @api.route('/apps/<int:app_id>/blueprint', methods=['PUT'])
@@ -243,12 +380,11 @@ def get_entrypoints(app_id):
 
 
 @api.route('/apps/<int:app_id>/sla', methods=['GET'])
-def get_app_sla(app_id):
+@_conditional_get_cached(sla_handler.get_sla_by_app_id)
+def get_app_sla(app_id, sla):
     return utils.make_json_response(
         200,
-        sla_handler.get_sla_by_app_id(
-            app_id
-        )
+        sla
     )
 
 
@@ -264,13 +400,125 @@ def update_app_sla(app_id):
 
 
 @api.route('/apps/<int:app_id>/status', methods=['GET'])
-def get_app_status(app_id):
+@_conditional_get_cached(status_handler.get_status_by_app_id)
+def get_app_status(app_id, status):
     return utils.make_json_response(
         200,
-        status_handler.get_status_by_app_id(app_id)
+        status
     )
 
 
+STATUS_STREAM_KEEPALIVE = 15
+# status streams open in this process, each holding a server thread.
+STATUS_STREAMS = {'open': 0}
+STATUS_STREAMS_LOCK = threading.Lock()
+
+
+def _acquire_status_stream():
+    """Count a new status stream, False if too many are open."""
+    with STATUS_STREAMS_LOCK:
+        if STATUS_STREAMS['open'] >= setting.STATUS_STREAM_MAX_PER_PROCESS:
+            return False
+        STATUS_STREAMS['open'] += 1
+        return True
+
+
+def _get_status_stream_releaser():
+    """Get a function uncounting a status stream, once however called."""
+    released = []
+
+    def release():
+        with STATUS_STREAMS_LOCK:
+            if not released:
+                released.append(True)
+                STATUS_STREAMS['open'] -= 1
+    return release
+
+
+def _stream_app_status(subscription, statuses):
+    """Generate status events of apps.
+
+    The current statuses are sent first, then every status update
+    committed afterwards, pushed by the status pubsub topics. The stream
+    ends after setting.STATUS_STREAM_MAX_SECONDS, so its thread is freed
+    and the client reconnects.
+    """
+    deadline = time.time() + setting.STATUS_STREAM_MAX_SECONDS
+    try:
+        for status in statuses:
+            yield 'status', status
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            status = subscription.get(
+                timeout=min(STATUS_STREAM_KEEPALIVE, remaining)
+            )
+            if status is None:
+                yield None
+            else:
+                yield 'status', status
+    finally:
+        subscription.close()
+
+
+def _make_status_stream_response(app_ids):
+    """Make the event stream response of app statuses.
+
+    The apps are subscribed before their current statuses are read, so
+    no update is missed in between; a missing app is answered with 404
+    before streaming starts. Above setting.STATUS_STREAM_MAX_PER_PROCESS
+    open streams, 503 is answered so requests keep threads to run on.
+    """
+    if not _acquire_status_stream():
+        return utils.make_json_response(
+            503, {'error': 'Too many status streams, retry later'},
+            headers={'Retry-After': str(STATUS_STREAM_KEEPALIVE)}
+        )
+    release = _get_status_stream_releaser()
+    try:
+        subscription = pubsub.get_hub().subscribe(
+            [status_handler.get_status_topic(app_id) for app_id in app_ids]
+        )
+    except Exception:
+        release()
+        raise
+    try:
+        statuses = [
+            status_handler.get_status_by_app_id(app_id) for app_id in app_ids
+        ]
+    except exception.RecordDoesNotExist as error:
+        subscription.close()
+        release()
+        return utils.make_json_response(404, {'error': str(error)})
+    except Exception:
+        subscription.close()
+        release()
+        raise
+    resp = utils.make_event_stream_response(
+        _stream_app_status(subscription, statuses)
+    )
+    # a stream closed before it started never runs its finally.
+    resp.call_on_close(subscription.close)
+    resp.call_on_close(release)
+    return resp
+
+
+@api.route('/apps/<int:app_id>/status/stream', methods=['GET'])
+def stream_app_status(app_id):
+    return _make_status_stream_response([app_id])
+
+
+@api.route('/apps/status/stream', methods=['GET'])
+def stream_apps_status():
+    app_ids = request.args.getlist('app_id', type=int)
+    if not app_ids:
+        raise exception_handler.BadRequest(
+            'app_id is missing in request args'
+        )
+    return _make_status_stream_response(app_ids)
+
+
 @api.route('/apps/<int:app_id>/status', methods=['PUT'])
 def update_app_status(app_id):
     data = _get_request_data()
@@ -303,12 +551,40 @@ def create_capacity_plan(app_id):
     )
 
 
+@api.route('/apps/<int:app_id>/capacity_plans/search', methods=['POST'])
+def search_capacity_plans(app_id):
+    data = _get_request_data()
+    return utils.make_json_response(
+        200,
+        capacity_plan_handler.search_capacity_plans(
+            app_id, max_plans=data.get('max_plans')
+        )
+    )
+
+
 @api.route('/apps/<int:app_id>/capacity_plans', methods=['GET'])
 def list_capacity_plans(app_id):
     return utils.make_json_response(
         200,
-        capacity_plan_handler.list_capacity_plans(
-            app_id, **kwargs
+        capacity_plan_handler.list_capacity_plans(app_id)
+    )
+
+
+@api.route('/apps/<int:app_id>/capacity_plans/pareto', methods=['GET'])
+def get_pareto_capacity_plans(app_id):
+    """Get capacity plans of app on the pareto front.
+
+    objectives is a comma separated list of the plan metrics to
+    minimize, cost, latency_p99 and error_rate by default.
+    """
+    data = _get_request_args()
+    objectives = _pop_request_arg(data, 'objectives')
+    if objectives is not None:
+        objectives = objectives.split(',')
+    return utils.make_json_response(
+        200,
+        capacity_plan_handler.get_pareto_capacity_plans(
+            app_id, objectives=objectives
         )
     )
 
@@ -323,6 +599,34 @@ def get_capacity_plan(capacity_plan_id):
     )
 
 
+@api.route(
+    '/capacity_plans/<int:capacity_plan_id>/measurement', methods=['PUT']
+)
+def update_capacity_plan_measurement(capacity_plan_id):
+    data = _get_request_data()
+    return utils.make_json_response(
+        200,
+        capacity_plan_handler.update_capacity_plan_measurement(
+            capacity_plan_id, **data
+        )
+    )
+
+
+@api.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return utils.make_json_response(
+        200,
+        cache.get_stats()
+    )
+
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    resp = utils.make_text_response(200, metrics.render())
+    resp.headers['Content-type'] = 'text/plain; version=0.0.4'
+    return resp
+
+
 @api.route('/apps/testapp', methods=['GET'])
 def test_app():
     return utils.make_json_response(
@@ -348,14 +652,22 @@ def start_dry_run(app_id):
 @api.route('/apps/<int:app_id>/dry_run_result', methods=['GET'])
 def get_dry_run_result(app_id):
     logging.info('Getting dry run result for app: %s', app_id)
-    result = {}
-    if app_id == 1:
-        result = requests.get('http://10.145.88.66:30500/api/autoshift/api/v1/apps/6/demand-profiles/11/all-merged')
-    else:
-        result = requests.get('http://10.145.88.66:30500/api/autoshift/api/v1/apps/7/demand-profiles/12/all-merged')
+    url = setting.DRY_RUN_RESULT_URLS.get(
+        app_id, setting.DRY_RUN_RESULT_URL
+    ) % {'app_id': app_id}
+    try:
+        result = http_client.get_client().get_json(url)
+    except (requests.RequestException, ValueError) as error:
+        logging.exception(error)
+        return utils.make_json_response(
+            502,
+            {
+                'error': 'Failed to get dry run result for App: %s' % app_id
+            }
+        )
     return utils.make_json_response(
         200,
-        result.json()
+        result
     )
 
 
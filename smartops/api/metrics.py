@@ -0,0 +1,479 @@
+"""Request metrics exposed in prometheus text format.
+
+Metrics are kept in memory by each process. When several processes
+serve the api, e.g. prefork workers, each also writes a snapshot of its
+metrics to METRICS_MULTIPROCESS_DIR within METRICS_FLUSH_INTERVAL
+seconds of a change. render merges the snapshots of all processes, so
+whichever worker is scraped reports the totals. The snapshot of an
+exiting worker is merged into a single one of all exited workers, so
+counters never go backwards when workers are recycled and the
+snapshots read stay as many as the workers.
+"""
+import bisect
+import contextlib
+import fcntl
+import logging
+import os
+import threading
+import time
+
+from flask import g
+from flask import has_request_context
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import simplejson as json
+
+from smartops.db.handlers import cache
+from smartops.utils import setting_wrapper as setting
+
+
+LATENCY_BUCKETS = [
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+]
+SQL_COUNT_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100, 200]
+SIZE_BUCKETS = [
+    100, 1000, 10000, 100000, 1000000, 10000000
+]
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    return '{%s}' % ','.join([
+        '%s="%s"' % (
+            name,
+            unicode(value).replace('\\', '\\\\').replace(
+                '"', '\\"').replace('\n', '\\n')
+        )
+        for name, value in zip(names, values)
+    ])
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Counter(object):
+    """Prometheus counter with labels."""
+
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, label_values, value=1):
+        with self.lock:
+            self.values[label_values] = (
+                self.values.get(label_values, 0) + value
+            )
+
+    def snapshot(self):
+        """Get values as a json compatible list."""
+        with self.lock:
+            return [
+                [list(label_values), value]
+                for label_values, value in self.values.items()
+            ]
+
+    @staticmethod
+    def merge(snapshots):
+        """Sum snapshots into values."""
+        values = {}
+        for snapshot in snapshots:
+            for label_values, value in snapshot:
+                label_values = tuple(label_values)
+                values[label_values] = values.get(label_values, 0) + value
+        return values
+
+    @staticmethod
+    def dump(values):
+        """Get merged values as a json compatible list, like snapshot."""
+        return [
+            [list(label_values), value]
+            for label_values, value in values.items()
+        ]
+
+    def render(self, values=None):
+        """Render values, by default the ones of this process."""
+        if values is None:
+            values = self.merge([self.snapshot()])
+        lines = [
+            '# HELP %s %s' % (self.name, self.documentation),
+            '# TYPE %s counter' % self.name,
+        ]
+        for label_values, value in sorted(values.items()):
+            lines.append('%s%s %s' % (
+                self.name, _format_labels(self.labels, label_values),
+                _format_value(value)
+            ))
+        return lines
+
+
+class Histogram(object):
+    """Prometheus histogram with labels."""
+
+    def __init__(self, name, documentation, labels, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = list(buckets) + [float('inf')]
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def observe(self, label_values, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            if label_values not in self.values:
+                self.values[label_values] = [[0] * len(self.buckets), 0, 0]
+            counts, _, _ = self.values[label_values]
+            counts[index] += 1
+            self.values[label_values][1] += value
+            self.values[label_values][2] += 1
+
+    def snapshot(self):
+        """Get values as a json compatible list."""
+        with self.lock:
+            return [
+                [list(label_values), list(counts), total, count]
+                for label_values, (counts, total, count)
+                in self.values.items()
+            ]
+
+    @staticmethod
+    def merge(snapshots):
+        """Sum snapshots into values."""
+        values = {}
+        for snapshot in snapshots:
+            for label_values, counts, total, count in snapshot:
+                label_values = tuple(label_values)
+                if label_values not in values:
+                    values[label_values] = [[0] * len(counts), 0, 0]
+                merged = values[label_values]
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += total
+                merged[2] += count
+        return values
+
+    @staticmethod
+    def dump(values):
+        """Get merged values as a json compatible list, like snapshot."""
+        return [
+            [list(label_values), list(counts), total, count]
+            for label_values, (counts, total, count) in values.items()
+        ]
+
+    def render(self, values=None):
+        """Render values, by default the ones of this process."""
+        if values is None:
+            values = self.merge([self.snapshot()])
+        lines = [
+            '# HELP %s %s' % (self.name, self.documentation),
+            '# TYPE %s histogram' % self.name,
+        ]
+        labels = self.labels + ['le']
+        for label_values, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bucket, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append('%s_bucket%s %s' % (
+                    self.name,
+                    _format_labels(
+                        labels, label_values + (_format_value(bucket),)
+                    ),
+                    cumulative
+                ))
+            label_str = _format_labels(self.labels, label_values)
+            lines.append('%s_sum%s %s' % (
+                self.name, label_str, _format_value(total)
+            ))
+            lines.append('%s_count%s %s' % (
+                self.name, label_str, count
+            ))
+        return lines
+
+
+REQUESTS = Counter(
+    'smartops_http_requests_total',
+    'Number of http requests.',
+    ['method', 'route', 'status']
+)
+REQUEST_LATENCY = Histogram(
+    'smartops_http_request_duration_seconds',
+    'Latency of http requests.',
+    ['method', 'route'], LATENCY_BUCKETS
+)
+REQUEST_SQL_STATEMENTS = Histogram(
+    'smartops_http_request_sql_statements',
+    'Number of sql statements run by http requests.',
+    ['method', 'route'], SQL_COUNT_BUCKETS
+)
+REQUEST_SQL_DURATION = Histogram(
+    'smartops_http_request_sql_duration_seconds',
+    'Time spent in sql statements by http requests.',
+    ['method', 'route'], LATENCY_BUCKETS
+)
+RESPONSE_SIZE = Histogram(
+    'smartops_http_response_size_bytes',
+    'Size of http response bodies, streamed ones excluded.',
+    ['method', 'route'], SIZE_BUCKETS
+)
+METRICS = [
+    REQUESTS, REQUEST_LATENCY, REQUEST_SQL_STATEMENTS,
+    REQUEST_SQL_DURATION, RESPONSE_SIZE
+]
+FLUSH_LOCK = threading.Lock()
+# pid of the process running the flusher thread, if metrics changed
+# since the last flush and if they were merged into the exited ones.
+FLUSHER = {'pid': None, 'dirty': False, 'exited': False}
+# snapshot of the merged metrics of exited processes.
+EXITED_FILENAME = 'exited.json'
+# file locked shared to read snapshots, exclusive to merge exited ones.
+LOCK_FILENAME = 'snapshots.lock'
+
+
+class _RequestMetrics(object):
+
+    def __init__(self):
+        self.start = time.time()
+        self.sql_statements = 0
+        self.sql_duration = 0.0
+        self.recorded = False
+
+
+def start_request():
+    """Start collecting metrics of current request."""
+    g.request_metrics = _RequestMetrics()
+
+
+def end_request(status_code, response_size=None):
+    """Record metrics of current request."""
+    request_metrics = getattr(g, 'request_metrics', None)
+    if request_metrics is None or request_metrics.recorded:
+        return
+    request_metrics.recorded = True
+    if request.url_rule is not None:
+        route = request.url_rule.rule
+    else:
+        route = 'unmatched'
+    label_values = (request.method, route)
+    REQUESTS.inc(label_values + (str(status_code),))
+    REQUEST_LATENCY.observe(
+        label_values, time.time() - request_metrics.start
+    )
+    REQUEST_SQL_STATEMENTS.observe(
+        label_values, request_metrics.sql_statements
+    )
+    REQUEST_SQL_DURATION.observe(
+        label_values, request_metrics.sql_duration
+    )
+    if response_size is not None:
+        RESPONSE_SIZE.observe(label_values, response_size)
+    _mark_dirty()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    conn.info.setdefault('query_start_time', []).append(time.time())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    start_times = conn.info.get('query_start_time')
+    if not start_times:
+        return
+    duration = time.time() - start_times.pop()
+    if not has_request_context():
+        return
+    request_metrics = getattr(g, 'request_metrics', None)
+    if request_metrics is not None:
+        request_metrics.sql_statements += 1
+        request_metrics.sql_duration += duration
+
+
+def _snapshot():
+    return {
+        'metrics': dict([
+            (metric.name, metric.snapshot()) for metric in METRICS
+        ]),
+        'cache': cache.get_stats(),
+    }
+
+
+def _merge_cache_stats(snapshots):
+    stats = {}
+    for snapshot in snapshots:
+        for resource, counters in snapshot['cache'].items():
+            merged = stats.setdefault(resource, {'hits': 0, 'misses': 0})
+            for result in ['hits', 'misses']:
+                merged[result] += counters.get(result, 0)
+    return stats
+
+
+def _merge_snapshots(snapshots):
+    """Merge snapshots of processes into one."""
+    return {
+        'metrics': dict([
+            (metric.name, metric.dump(metric.merge([
+                snapshot['metrics'].get(metric.name, [])
+                for snapshot in snapshots
+            ])))
+            for metric in METRICS
+        ]),
+        'cache': _merge_cache_stats(snapshots),
+    }
+
+
+def _write_snapshot(path, snapshot):
+    with open(path + '.tmp', 'w') as snapshot_file:
+        json.dump(snapshot, snapshot_file)
+    # readers see either the previous or the new snapshot.
+    os.rename(path + '.tmp', path)
+
+
+@contextlib.contextmanager
+def _lock_snapshots(directory, operation):
+    with open(os.path.join(directory, LOCK_FILENAME), 'a') as lock_file:
+        fcntl.flock(lock_file, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def flush():
+    """Write the snapshot of this process to the multiprocess dir.
+
+    Nothing is written if METRICS_MULTIPROCESS_DIR is empty, or once
+    the metrics of this process were merged by merge_exited.
+    """
+    directory = setting.METRICS_MULTIPROCESS_DIR
+    if not directory:
+        return
+    with FLUSH_LOCK:
+        if FLUSHER['exited']:
+            return
+        FLUSHER['dirty'] = False
+        _write_snapshot(
+            os.path.join(directory, '%s.json' % os.getpid()), _snapshot()
+        )
+
+
+def merge_exited():
+    """Merge the metrics of this exiting process into the exited ones.
+
+    The snapshot of this process is removed and no longer written.
+    """
+    directory = setting.METRICS_MULTIPROCESS_DIR
+    if not directory:
+        return
+    with FLUSH_LOCK:
+        FLUSHER['exited'] = True
+        with _lock_snapshots(directory, fcntl.LOCK_EX):
+            path = os.path.join(directory, EXITED_FILENAME)
+            snapshots = [_snapshot()]
+            if os.path.exists(path):
+                try:
+                    with open(path) as snapshot_file:
+                        snapshots.append(json.load(snapshot_file))
+                except (IOError, OSError, ValueError) as error:
+                    logging.error(
+                        'failed to read metrics %s: %s', path, error
+                    )
+            _write_snapshot(path, _merge_snapshots(snapshots))
+            own_path = os.path.join(directory, '%s.json' % os.getpid())
+            if os.path.exists(own_path):
+                os.remove(own_path)
+
+
+def _flush_periodically():
+    while True:
+        time.sleep(setting.METRICS_FLUSH_INTERVAL)
+        if not FLUSHER['dirty']:
+            continue
+        try:
+            flush()
+        except (IOError, OSError) as error:
+            logging.error('failed to write metrics: %s', error)
+
+
+def _mark_dirty():
+    """Have the metrics of this process flushed within an interval."""
+    if not setting.METRICS_MULTIPROCESS_DIR:
+        return
+    FLUSHER['dirty'] = True
+    if FLUSHER['pid'] == os.getpid():
+        return
+    with FLUSH_LOCK:
+        # threads do not survive fork, so each worker starts its own.
+        if FLUSHER['pid'] != os.getpid():
+            FLUSHER['pid'] = os.getpid()
+            flusher = threading.Thread(
+                target=_flush_periodically, name='metrics-flusher'
+            )
+            flusher.daemon = True
+            flusher.start()
+
+
+def _get_snapshots():
+    """Get snapshots of all processes, or of this one if it is alone."""
+    directory = setting.METRICS_MULTIPROCESS_DIR
+    if not directory:
+        return [_snapshot()]
+    flush()
+    snapshots = []
+    with _lock_snapshots(directory, fcntl.LOCK_SH):
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(
+                    os.path.join(directory, filename)
+                ) as snapshot_file:
+                    snapshots.append(json.load(snapshot_file))
+            except (IOError, OSError, ValueError) as error:
+                logging.error(
+                    'failed to read metrics %s: %s', filename, error
+                )
+    return snapshots
+
+
+def _render_cache_stats(snapshots):
+    stats = _merge_cache_stats(snapshots)
+    lines = [
+        '# HELP smartops_response_cache_requests_total '
+        'Number of response cache lookups.',
+        '# TYPE smartops_response_cache_requests_total counter',
+    ]
+    for resource, counters in sorted(stats.items()):
+        for result in ['hits', 'misses']:
+            lines.append(
+                'smartops_response_cache_requests_total%s %s' % (
+                    _format_labels(
+                        ['resource', 'result'], (resource, result)
+                    ),
+                    counters[result]
+                )
+            )
+    return lines
+
+
+def render():
+    """Render all metrics in prometheus text format."""
+    snapshots = _get_snapshots()
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render(metric.merge([
+            snapshot['metrics'].get(metric.name, [])
+            for snapshot in snapshots
+        ])))
+    lines.extend(_render_cache_stats(snapshots))
+    return '\n'.join(lines) + '\n'
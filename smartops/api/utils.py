@@ -1,13 +1,227 @@
 """Utils for API usage."""
+import hashlib
 import logging
-from flask import make_response
 import simplejson as json
+import zlib
+
+from flask import has_request_context
+from flask import make_response
+from flask import request
+from flask import Response
+from flask import stream_with_context
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# Responses smaller than this are not worth compressing.
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_LEVEL = 6
+
+
+def _encode_json(data, pretty=False):
+    if pretty:
+        return json.dumps(data, indent=4) + '\r\n'
+    return json.dumps(data, separators=(',', ':'))
+
+
+def _encode_msgpack(data, pretty=False):
+    return msgpack.packb(data, use_bin_type=False)
+
+
+# mapping response mimetype to encoder func(data, pretty).
+# The first one is the default when client accepts any of them.
+ENCODERS = [
+    ('application/json', _encode_json),
+]
+if msgpack:
+    ENCODERS.append(('application/msgpack', _encode_msgpack))
+
+
+# mapping content encoding to zlib wbits of its format.
+COMPRESSORS = [
+    ('gzip', 16 + zlib.MAX_WBITS),
+    ('deflate', zlib.MAX_WBITS),
+]
+
+
+def register_encoder(mimetype, encoder):
+    """Register response encoder for mimetype.
+
+    encoder is called as encoder(data, pretty) and returns str.
+    """
+    for i, (registered_mimetype, _) in enumerate(ENCODERS):
+        if registered_mimetype == mimetype:
+            ENCODERS[i] = (mimetype, encoder)
+            return
+    ENCODERS.append((mimetype, encoder))
+
+
+def _is_pretty():
+    return request.args.get('pretty', '').lower() in ('1', 'true', 'yes')
+
+
+def _negotiate_encoder():
+    """Get (mimetype, encoder) of the current request by Accept header."""
+    mimetype = None
+    if has_request_context():
+        mimetype = request.accept_mimetypes.best_match(
+            [mimetype for mimetype, _ in ENCODERS]
+        )
+    for encoder_mimetype, encoder in ENCODERS:
+        if mimetype in (None, encoder_mimetype):
+            return encoder_mimetype, encoder
+
+
+def _negotiate_compressor():
+    """Get (content encoding, wbits) by Accept-Encoding header or None."""
+    if not has_request_context():
+        return None
+    content_encoding = request.accept_encodings.best_match(
+        [content_encoding for content_encoding, _ in COMPRESSORS]
+    )
+    for compressor in COMPRESSORS:
+        if compressor[0] == content_encoding:
+            return compressor
+    return None
+
+
+def encode_data(data, mimetype='application/json', pretty=False):
+    """Encode data by the encoder registered for mimetype."""
+    for encoder_mimetype, encoder in ENCODERS:
+        if encoder_mimetype == mimetype:
+            return encoder(data, pretty)
+    raise ValueError('no encoder registered for %s' % mimetype)
 
 
-def make_json_response(status_code, data):
-    """Wrap json format to the reponse object."""
+def compress_data(result, content_encoding):
+    """Compress result in gzip or deflate content encoding."""
+    wbits = dict(COMPRESSORS)[content_encoding]
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, wbits)
+    return compressor.compress(result) + compressor.flush()
 
-    result = json.dumps(data, indent=4) + '\r\n'
-    resp = make_response(result, status_code)
+
+def _compress_response(resp):
+    """Compress the response body if client accepts it."""
+    resp.headers['Vary'] = 'Accept, Accept-Encoding'
+    compressor = _negotiate_compressor()
+    if not compressor:
+        return resp
+    result = resp.get_data()
+    if len(result) < COMPRESS_MIN_SIZE:
+        return resp
+    content_encoding, _ = compressor
+    resp.set_data(compress_data(result, content_encoding))
+    resp.headers['Content-Encoding'] = content_encoding
+    return resp
+
+
+def make_etag(version, mimetype=None):
+    """Generate strong etag for the response of the resource version.
+
+    The negotiated mimetype, pretty arg and content encoding change
+    the response body, so they are part of the etag.
+    """
+    if mimetype is None:
+        mimetype, _ = _negotiate_encoder()
+    compressor = _negotiate_compressor()
+    key = u'%s;%s;%s;%s' % (
+        version, mimetype, _is_pretty(),
+        compressor[0] if compressor else ''
+    )
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def make_not_modified_response(etag):
+    """Generate 304 response for a conditional request."""
+    resp = make_response('', 304)
+    resp.set_etag(etag)
+    resp.headers['Vary'] = 'Accept, Accept-Encoding'
+    return resp
+
+
+def make_json_response(status_code, data, headers={}):
+    """Wrap data to the reponse object.
+
+    The data is encoded as compact json by default, pretty json if
+    the request has pretty=1 arg, or msgpack if the client accepts
+    application/msgpack. The result is compressed if the client
+    accepts gzip or deflate.
+    """
+    mimetype, encoder = _negotiate_encoder()
+    pretty = has_request_context() and _is_pretty()
+    resp = make_response(encoder(data, pretty), status_code)
+    resp.headers['Content-type'] = mimetype
+    for key, value in headers.items():
+        resp.headers[key] = value
+    return _compress_response(resp)
+
+
+def make_text_response(status_code, text):
+    """Wrap plain text to the response object."""
+    resp = make_response(text, status_code)
+    resp.headers['Content-type'] = 'text/plain'
+    return _compress_response(resp)
+
+
+def make_json_stream_response(status_code, items, headers={}):
+    """Wrap an iterable of items to a chunked json list response.
+
+    The items are encoded one at a time while the response is sent,
+    so the whole list is never held in memory. The chunks are
+    compressed on the fly if the client accepts gzip or deflate.
+    """
+    pretty = _is_pretty()
+    compressor = _negotiate_compressor()
+
+    def generate():
+        yield '['
+        for i, item in enumerate(items):
+            if i:
+                yield ','
+            yield _encode_json(item, pretty)
+        yield ']\r\n'
+
+    def generate_compressed(wbits):
+        compressobj = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, wbits)
+        for chunk in generate():
+            compressed = compressobj.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressobj.flush()
+
+    if compressor:
+        body = generate_compressed(compressor[1])
+    else:
+        body = generate()
+    resp = Response(stream_with_context(body), status_code)
     resp.headers['Content-type'] = 'application/json'
+    resp.headers['Vary'] = 'Accept, Accept-Encoding'
+    if compressor:
+        resp.headers['Content-Encoding'] = compressor[0]
+    for key, value in headers.items():
+        resp.headers[key] = value
+    return resp
+
+
+def make_event_stream_response(events):
+    """Wrap an iterable of server-sent events to the response object.
+
+    Each event is a tuple (event, data) where data is json encoded,
+    or None to send a keep-alive comment.
+    """
+    def generate():
+        for item in events:
+            if item is None:
+                yield ': keep-alive\n\n'
+                continue
+            event, data = item
+            yield 'event: %s\ndata: %s\n\n' % (event, _encode_json(data))
+
+    resp = Response(stream_with_context(generate()), 200)
+    resp.headers['Content-type'] = 'text/event-stream'
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'
     return resp
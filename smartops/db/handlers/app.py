@@ -1,11 +1,15 @@
 import logging
 
+from sqlalchemy.orm import joinedload
+
 from smartops.db.handlers import app_status as status_handler
+from smartops.db.handlers import cache
 from smartops.db.handlers import database
 from smartops.db.handlers import utils
 from smartops.db import exception
 from smartops.db import models
 from smartops.tasks import client as celery_client
+from smartops.utils import topology
 
 
 APP_SUPPORTED_FIELDS = [
@@ -21,11 +25,23 @@ APP_RESP_FIELDS = [
     'id', 'name', 'entrypoint', 'created_at',
     'updated_at', 'blueprint', 'test_plan',
     'status', 'containers', 'pods', 'services',
-    'error'
+    'cpu_cores', 'memory_bytes', 'error'
 ]
 APP_TEST_FIELDS = [
     'url', 'load'
 ]
+# keyset pagination keys for each supported order_by of app list.
+APP_LIST_ORDER_KEYS = {
+    'id': ['id'],
+    'updated_at': ['updated_at', 'id'],
+    'cpu_cores': ['cpu_cores', 'id'],
+    'memory_bytes': ['memory_bytes', 'id'],
+}
+APP_LIST_MAX_LIMIT = 1000
+APP_LIST_YIELD_PER = 100
+APP_BULK_MAX_SIZE = 1000
+# max number of values in one sql in_ condition.
+APP_BULK_QUERY_SIZE = 500
 
 
 def _get_app(app_id, session=None, **kwargs):
@@ -47,14 +63,108 @@ def _is_app_editable(app):
     return True
 
 
+def _get_app_fields(fields):
+    """Get the app response fields from fields arg.
+
+    fields is a comma separated string or a list of them, or None to
+    get all of APP_RESP_FIELDS.
+    """
+    if fields is None:
+        return APP_RESP_FIELDS
+    if not isinstance(fields, list):
+        fields = [fields]
+    app_fields = []
+    for item in fields:
+        app_fields.extend([
+            field.strip() for field in item.split(',') if field.strip()
+        ])
+    unsupported_fields = set(app_fields) - set(APP_RESP_FIELDS)
+    if unsupported_fields:
+        raise exception.InvalidParameter(
+            'App fields %s are not in %s' % (
+                list(unsupported_fields), APP_RESP_FIELDS
+            )
+        )
+    return app_fields
+
+
+def _get_app_load_options(fields, keys=None):
+    """Get query options to load only what is needed for fields."""
+    if fields == APP_RESP_FIELDS:
+        return [joinedload(models.App.status)]
+    app_columns = models.App.__mapper__.columns
+    return utils.model_load_options(
+        models.App, [
+            field for field in list(fields) + list(keys or [])
+            if field in app_columns or field == 'status'
+        ]
+    )
+
+
+def _get_app_list_keys(order_by):
+    if order_by not in APP_LIST_ORDER_KEYS:
+        raise exception.InvalidParameter(
+            'App list order_by %s is not in %s' % (
+                order_by, APP_LIST_ORDER_KEYS.keys()
+            )
+        )
+    return APP_LIST_ORDER_KEYS[order_by]
+
+
 @database.run_in_session()
-@utils.wrap_to_dict(APP_RESP_FIELDS)
-def list_apps(session=None, **filters):
-    """list apps."""
-    apps = utils.list_db_objects(
-        session, models.App, **filters
+def list_apps(
+    limit=APP_LIST_MAX_LIMIT, after=None, order_by='id', fields=None,
+    session=None, **filters
+):
+    """list one page of apps.
+
+    Returns the apps in the page and the cursor to list the next page
+    with, which is None if it is the last page.
+    If fields is given, only the fields of apps are read and returned.
+    """
+    keys = _get_app_list_keys(order_by)
+    fields = _get_app_fields(fields)
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise exception.InvalidParameter(
+            'App list limit %s is not an integer' % limit
+        )
+    if not 0 < limit <= APP_LIST_MAX_LIMIT:
+        raise exception.InvalidParameter(
+            'App list limit %s is not in range (0, %s]' % (
+                limit, APP_LIST_MAX_LIMIT
+            )
+        )
+    apps, next_cursor = utils.list_db_objects_by_page(
+        session, models.App, keys=keys, limit=limit, after=after,
+        load_options=_get_app_load_options(fields, keys), **filters
+    )
+    return utils._wrapper_dict(apps, fields), next_cursor
+
+
+def _iter_apps(keys, fields, **filters):
+    with database.session() as session:
+        apps = utils.iter_db_objects(
+            session, models.App, order_by=keys,
+            yield_per=APP_LIST_YIELD_PER,
+            load_options=_get_app_load_options(fields, keys), **filters
+        )
+        for app in apps:
+            yield utils._wrapper_dict(app, fields)
+
+
+def iter_apps(order_by='id', fields=None, **filters):
+    """Iterate all apps as dict.
+
+    The apps are read from database APP_LIST_YIELD_PER rows at a time
+    in a session which is held until the iteration ends.
+    If fields is given, only the fields of apps are read and returned.
+    """
+    utils.validate_filters(models.App, **filters)
+    return _iter_apps(
+        _get_app_list_keys(order_by), _get_app_fields(fields), **filters
     )
-    return apps
 
 
 @utils.supported_filters(
@@ -78,13 +188,116 @@ def create_app(exception_when_existing=True,
         return message
 
 
+def _validate_bulk_app(app_data, names):
+    """Get error message of app data in bulk creation or None."""
+    if not isinstance(app_data, dict):
+        return 'app data %s is not dict' % app_data
+    missing_keys = set(APP_CREATING_REQUIRED_FIELDS) - set(app_data)
+    if missing_keys:
+        return 'app keys %s are missing' % list(missing_keys)
+    unsupported_keys = (
+        set(app_data) - set(APP_SUPPORTED_FIELDS) - set(APP_IGNORED_FIELDS)
+    )
+    if unsupported_keys:
+        return 'app keys %s are not supported' % list(unsupported_keys)
+    columns = models.App.__mapper__.columns
+    for key in APP_SUPPORTED_FIELDS:
+        if key in app_data and not models.App.type_compatible(
+            app_data[key], columns[key].type
+        ):
+            return 'app %s value %r type is unexpected' % (key, app_data[key])
+    name = app_data['name']
+    if not isinstance(name, basestring) or not name:
+        return 'app name %r is invalid' % name
+    if name in names:
+        return 'app name %s is duplicated in request' % name
+    return None
+
+
+def _get_app_ids_by_names(session, names):
+    app_ids = {}
+    for i in range(0, len(names), APP_BULK_QUERY_SIZE):
+        app_ids.update(
+            session.query(models.App.name, models.App.id).filter(
+                models.App.name.in_(names[i:i + APP_BULK_QUERY_SIZE])
+            ).all()
+        )
+    return app_ids
+
+
 @database.run_in_session()
-@utils.wrap_to_dict(APP_RESP_FIELDS)
-def get_app_by_id(app_id, session=None, **kwargs):
+def create_apps(apps_data, session=None):
+    """Create apps in bulk.
+
+    All apps are validated in one pass, then the new apps and their
+    status are inserted by bulk inserts in one transaction.
+    Returns the result of each app in the order of apps_data, which
+    is created, duplicate or invalid.
+    """
+    if not isinstance(apps_data, list):
+        raise exception.InvalidParameter(
+            'Bulk apps data %s is not a list' % apps_data
+        )
+    if len(apps_data) > APP_BULK_MAX_SIZE:
+        raise exception.InvalidParameter(
+            'Bulk apps size %s exceeds %s' % (
+                len(apps_data), APP_BULK_MAX_SIZE
+            )
+        )
+    results = []
+    names = set()
+    for app_data in apps_data:
+        error = _validate_bulk_app(app_data, names)
+        if error:
+            results.append({'result': 'invalid', 'error': error})
+            continue
+        names.add(app_data['name'])
+        results.append({'name': app_data['name']})
+    names = list(names)
+    existing_app_ids = _get_app_ids_by_names(session, names)
+    app_rows = [
+        dict([
+            (key, value) for key, value in app_data.items()
+            if key in APP_SUPPORTED_FIELDS
+        ])
+        for app_data, result in zip(apps_data, results)
+        if 'name' in result and result['name'] not in existing_app_ids
+    ]
+    utils.bulk_add_db_objects(session, models.App, app_rows)
+    app_ids = _get_app_ids_by_names(
+        session, [app_row['name'] for app_row in app_rows]
+    )
+    utils.bulk_add_db_objects(
+        session, models.AppStatus,
+        [{'id': app_id} for app_id in app_ids.values()]
+    )
+    for result in results:
+        if 'name' not in result:
+            continue
+        name = result['name']
+        if name in existing_app_ids:
+            result['result'] = 'duplicate'
+            result['id'] = existing_app_ids[name]
+            result['error'] = 'App name %s already exists.' % name
+        else:
+            result['result'] = 'created'
+            result['id'] = app_ids[name]
+    return results
+
+
+@cache.cached('app')
+@database.run_in_session()
+def get_app_by_id(app_id, fields=None, session=None, **kwargs):
+    """Get app as dict.
+
+    If fields is given, only the fields of app are read and returned.
+    """
+    fields = _get_app_fields(fields)
     app = _get_app(
-        app_id, session=session, **kwargs
+        app_id, session=session,
+        load_options=_get_app_load_options(fields), **kwargs
     )
-    return app
+    return utils._wrapper_dict(app, fields)
 
 
 @database.run_in_session()
@@ -96,6 +309,7 @@ def get_app_setconfigs(app_id, session=None, **kwargs):
 
 
 @database.run_in_session()
+@cache.invalidates
 @utils.wrap_to_dict(APP_RESP_FIELDS)
 def update_app_by_id(app_id, session=None, **kwargs):
     app = _get_app(
@@ -151,6 +365,7 @@ def update_app_status_by_id(app_id, status, message):
 
 
 @database.run_in_session()
+@cache.invalidates
 def delete_app_by_id(
     app_id, also_delete_containers=False,
     session=None, **kwargs
@@ -183,51 +398,48 @@ def get_entrypoints(app, session=None):
     return list(e) if not isinstance(e, list) else e
 
 
+@cache.cached('dryrun_base_plan')
 @database.run_in_session()
 def get_dryrun_base_plan(app_id, session=None):
-    app = _get_app(app_id, session=session)
-    try:
-        content = app.blueprint.content
-    except:
+    blueprint = utils.get_db_object(
+        session, models.AppBlueprint, exception_when_missing=False,
+        load_options=utils.model_load_options(
+            models.AppBlueprint, ['base_plan', 'topology_graph']
+        ),
+        app_id=app_id
+    )
+    if not blueprint:
         raise exception.RecordDoesNotExist(
             'App: %s does not have a valid blueprint, '
             'try submitting valid blueprint first?' % app_id
         )
-    resource_controllers = filter(
-        lambda x: (
-            'spec' in x.keys()
-            and 'template' in x['spec'].keys()
-            and 'containers' in x['spec']['template']['spec'].keys()
-            and all('resources' in c.keys() for c in x['spec']['template']['spec']['containers'])
-        ),
-        content
+    if blueprint.base_plan is not None:
+        return blueprint.base_plan
+    # blueprints stored before base plan was materialized.
+    return topology.get_base_plan(
+        blueprint.topology_graph or topology.build_graph(blueprint.content)
     )
-    print resource_controllers
-    plans = []
-    for controller in resource_controllers:
-        plan = {}
-        plan['name'] = controller['metadata']['name'].replace('rc', '')
-        plan['pod_replicas'] = controller['spec']['replicas']
-        plan['containers'] = []
-        for container in controller['spec']['template']['spec']['containers']:
-            c = {}
-            c['name'] = container['name']
-            c['cpu'] = float(
-                container['resources']['limits']['cpu'].replace('m', '')
-            )/1000
-            c['memory'] = float(
-                container['resources']['limits']['memory'].replace('Mi', '')
-            )
-            plan['containers'].append(c)
-        plans.append(plan)
-    return plans
+
+
+def _get_task_blueprint(app, session=None):
+    """Get the blueprint sent to deploy tasks.
+
+    It is the content hash which tasks resolve through blueprint_cache,
+    or the parsed content for blueprints stored without a hash.
+    """
+    content_hash = utils.get_db_object_version(
+        session, models.AppBlueprint, ['content_hash'], app_id=app.id
+    )
+    if content_hash:
+        return content_hash
+    return app.blueprint.content
 
 
 @database.run_in_session()
 def deploy_app(app_id, session=None, **data):
     app = _get_app(app_id, session=session)
     entrypoint = app.entrypoint
-    app_blueprint = app.blueprint.content
+    app_blueprint = _get_task_blueprint(app, session=session)
     test_plan = app.test_plan
     logging.info(
         'Sending deploy app task to deployment manager for app %s',
@@ -250,7 +462,7 @@ def deploy_app(app_id, session=None, **data):
 def dry_run(app_id, session=None):
     app = _get_app(app_id, session=session)
     entrypoint = app.entrypoint
-    app_blueprint = app.blueprint.content
+    app_blueprint = _get_task_blueprint(app, session=session)
     test_plan = app.test_plan
     logging.info(
         'Sending deploy capacity planner task to deploy manager for app %s',
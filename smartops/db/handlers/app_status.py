@@ -1,14 +1,25 @@
+import functools
 import logging
 
+from smartops.db.handlers import cache
 from smartops.db.handlers import database
 from smartops.db.handlers import utils
 from smartops.db import exception
 from smartops.db import models
+from smartops.utils import pubsub
 
 
 STATUS_RESP_FIELDS = [
     'id', 'status', 'message', 'severity'
 ]
+STATUS_VERSION_FIELDS = [
+    'status', 'message', 'severity', 'updated_at'
+]
+
+
+def get_status_topic(app_id):
+    """Get the pubsub topic of app status updates."""
+    return 'app_status:%s' % app_id
 
 
 def _get_status(status_id, session=None, **kwargs):
@@ -19,6 +30,14 @@ def _get_status(status_id, session=None, **kwargs):
     )
 
 
+@database.run_in_session()
+def get_status_version_by_app_id(app_id, session=None):
+    return utils.get_db_object_version(
+        session, models.AppStatus, STATUS_VERSION_FIELDS, id=app_id
+    )
+
+
+@cache.cached('status', get_status_version_by_app_id)
 @database.run_in_session()
 @utils.wrap_to_dict(STATUS_RESP_FIELDS)
 def get_status_by_app_id(app_id, session=None):
@@ -35,6 +54,7 @@ def get_status_by_app_id(app_id, session=None):
 
 
 @database.run_in_session()
+@cache.invalidates
 def update_status_by_app_id(app_id, session=None, **kwargs):
     app = utils.get_db_object(
         session, models.App, id=app_id
@@ -45,4 +65,11 @@ def update_status_by_app_id(app_id, session=None, **kwargs):
         raise exception.RecordDoesNotExist(
             'App %s does not exist or have attribute: status' % app_id
         )
-    return utils.update_db_object(session, status, **kwargs)
+    status = utils.update_db_object(session, status, **kwargs)
+    database.after_commit(
+        session, functools.partial(
+            pubsub.get_hub().publish, get_status_topic(app_id),
+            utils._wrapper_dict(status, STATUS_RESP_FIELDS)
+        )
+    )
+    return status
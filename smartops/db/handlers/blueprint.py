@@ -1,17 +1,31 @@
+import hashlib
 import logging
-import yaml
 
 from smartops.api import exception_handler as api_exception
 from smartops.db.handlers import app as app_handler
 from smartops.db.handlers import app_status as status_handler
+from smartops.db.handlers import blueprint_cache
+from smartops.db.handlers import cache
 from smartops.db.handlers import database
 from smartops.db.handlers import utils
 from smartops.db import exception as db_exception
 from smartops.db import models
+from smartops.utils import blueprint_diff
+from smartops.utils import manifest
+from smartops.utils import manifest_schema
+from smartops.utils import quantity
+from smartops.utils import setting_wrapper as setting
+from smartops.utils import topology
 
 
 BLUEPRINT_RESP_FIELDS = [
-    'id', 'entrypoints', 'content', 'app_id', 'topology'
+    'id', 'entrypoints', 'content', 'app_id', 'topology', 'revision', 'diff'
+]
+BLUEPRINT_DEPLOY_FIELDS = [
+    'revision', 'deployed_revision', 'content_hash', 'diff'
+]
+BLUEPRINT_VERSION_FIELDS = [
+    'id', 'content_hash', 'updated_at'
 ]
 
 
@@ -37,42 +51,124 @@ def _get_blueprint_by_app_id(app_id, session=None, **kwargs):
     )
 
 
-def _generate_topology_from_blueprint(service_list):
-    topology = {}
-    services = filter(lambda x: x['kind'] == 'Service', service_list)
-    rp_controllers = filter(
-        lambda x: x['kind'] in ['ReplicationController', 'Deployment'],
-        service_list
-    )
-    statefulsets = filter(lambda x: x['kind'] == 'StatefulSet', service_list)
-
-    for service in services:
-        topology.update(
-            {
-                service['spec']['selector']['name']
-                    if 'selector' in service['spec'].keys() and
-                        'name' in service['spec']['selector'].keys()
-                    else service['metadata']['name']: {
-                        'service_name': service['metadata']['name']
-                    }
-            }
+def _hash_blueprint_content(content):
+    if isinstance(content, unicode):
+        content = content.encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+
+def _parse_blueprint_content(content):
+    """Parse and validate yaml documents of blueprint content.
+
+    Returns the documents and names of the services in them.
+    """
+    size = len(content)
+    if isinstance(content, unicode):
+        size = len(content.encode('utf-8'))
+    if size > setting.BLUEPRINT_MAX_SIZE:
+        raise db_exception.NotAcceptable(
+            'Blueprint content is larger than %s bytes' %
+            setting.BLUEPRINT_MAX_SIZE
+        )
+    service_list = []
+    entrypoints = []
+    errors = []
+    try:
+        for index, line, service in manifest.iter_documents(
+            content, max_documents=setting.BLUEPRINT_MAX_DOCUMENTS
+        ):
+            service_list.append(service)
+            service_errors = manifest_schema.validate_document(service)
+            if service_errors:
+                errors.extend([
+                    (index, line, '%s %s' % (path or '/', message))
+                    for path, message in service_errors
+                ])
+                continue
+            if service['kind'] == 'Service':
+                entrypoints.append(service['metadata']['name'])
+    except manifest.ManifestError as error:
+        raise db_exception.NotAcceptable(
+            'Failed to parse yaml content: %s' % error
         )
+    if errors:
+        raise db_exception.NotAcceptable(
+            'Validation failed: %s' % manifest.ManifestError(errors)
+        )
+    return service_list, entrypoints
 
-    for statefulset in statefulsets:
-        topology[statefulset['spec']['serviceName']]['replica'] = (
-            statefulset['spec']['replicas'])
 
+@database.run_in_session()
+def get_blueprint_version_by_app_id(app_id, session=None):
+    return utils.get_db_object_version(
+        session, models.AppBlueprint, BLUEPRINT_VERSION_FIELDS,
+        app_id=app_id
+    )
 
-    for rp_controller in rp_controllers:
-        try:
-            topology[rp_controller['spec']['selector']['name']]['replica'] = (
-                rp_controller['spec']['replicas']
-            )
-        except KeyError:
-            topology[rp_controller['spec']['template']['metadata']['labels']['name']]['replica'] = (
-                rp_controller['spec']['replicas']
-            )
-    return topology
+
+@database.run_in_session()
+def get_topology_graph_by_app_id(app_id, session=None):
+    """Get topology graph stored with the blueprint of app."""
+    blueprint = utils.get_db_object(
+        session, models.AppBlueprint,
+        load_options=utils.model_load_options(
+            models.AppBlueprint, ['topology_graph']
+        ),
+        app_id=app_id
+    )
+    if not blueprint.topology_graph:
+        # blueprints stored before topology graph was introduced.
+        return topology.build_graph(blueprint.content)
+    return blueprint.topology_graph
+
+
+@database.run_in_session()
+def get_blueprint_changes_by_app_id(app_id, session=None):
+    """Get revision, content hash and changes to deploy of app blueprint.
+
+    The changes are the diff from the deployed revision if it is the
+    previous one, otherwise None which means everything is deployed.
+    """
+    blueprint = utils.get_db_object(
+        session, models.AppBlueprint,
+        load_options=utils.model_load_options(
+            models.AppBlueprint, BLUEPRINT_DEPLOY_FIELDS
+        ),
+        app_id=app_id
+    )
+    changes = None
+    if (
+        blueprint.deployed_revision is not None and
+        blueprint.deployed_revision == blueprint.revision - 1
+    ):
+        changes = blueprint.diff
+    return blueprint.revision, blueprint.content_hash, changes
+
+
+@database.run_in_session()
+def update_deployed_revision_by_app_id(app_id, revision, session=None):
+    """Record revision of app blueprint as deployed."""
+    blueprint = utils.get_db_object(
+        session, models.AppBlueprint,
+        load_options=utils.model_load_options(
+            models.AppBlueprint, BLUEPRINT_DEPLOY_FIELDS
+        ),
+        app_id=app_id
+    )
+    utils.update_db_object(session, blueprint, deployed_revision=revision)
+
+
+@database.run_in_session()
+def get_deployed_revision_by_app_id(app_id, session=None):
+    """Get revision of app blueprint last recorded as deployed."""
+    blueprint = utils.get_db_object(
+        session, models.AppBlueprint,
+        load_options=utils.model_load_options(
+            models.AppBlueprint, BLUEPRINT_DEPLOY_FIELDS
+        ),
+        app_id=app_id
+    )
+    return blueprint.deployed_revision
 
 
 @database.run_in_session()
@@ -91,6 +187,7 @@ def get_blueprint_by_id(blueprint_id, session=None, **kwargs):
     )
 
 
+@cache.cached('blueprint', get_blueprint_version_by_app_id)
 @database.run_in_session()
 @utils.wrap_to_dict(BLUEPRINT_RESP_FIELDS)
 def get_blueprint_by_app_id(app_id, session=None):
@@ -100,6 +197,7 @@ def get_blueprint_by_app_id(app_id, session=None):
 
 
 @database.run_in_session()
+@cache.invalidates
 @utils.wrap_to_dict(BLUEPRINT_RESP_FIELDS)
 def validate_and_upsert_blueprint(
     app_id, exception_when_existing=True,
@@ -109,45 +207,35 @@ def validate_and_upsert_blueprint(
     app = app_handler._get_app(app_id, session=session)
     blueprint_content = content
     content_string = content
-    service_list = filter(lambda x: x!='', blueprint_content.split('---'))
-    try:
-        service_list = map(lambda x: yaml.load(x), service_list)
-    except yaml.parser.ParserError as parser_error:
-        raise db_exception.NotAcceptable(
-            'Failed to parse yaml content:%s' % parser_error
+    content_hash = _hash_blueprint_content(content)
+    if content_hash == utils.get_db_object_version(
+        session, models.AppBlueprint, ['content_hash'], app_id=app_id
+    ):
+        logging.info(
+            'Blueprint of app %s is not changed, skip updating', app_id
+        )
+        return app.blueprint
+    parsed = blueprint_cache.get_parsed(content_hash)
+    if parsed is None:
+        service_list, entrypoints = _parse_blueprint_content(
+            blueprint_content
+        )
+        blueprint_cache.set_parsed(content_hash, service_list, entrypoints)
+    else:
+        service_list = parsed['documents']
+        entrypoints = parsed['entrypoints']
+    topology_graph = topology.build_graph(service_list)
+    service_topology = topology.get_service_topology(topology_graph)
+    pods = topology.count_pods(topology_graph)
+    services = len(topology_graph['services'])
+    containers = topology.count_containers(topology_graph)
+    base_plan = topology.get_base_plan(topology_graph)
+    resource_totals = topology.get_resource_totals(topology_graph)
+    if resource_totals['memory_bytes'] > quantity.MAX_MILLI:
+        raise db_exception.InvalidParameter(
+            'Memory limits of all pods, %s bytes, are too large.' %
+            resource_totals['memory_bytes']
         )
-    # Start: Validate each blueprint content and extract entrypoints
-    entrypoints = []
-    primitive_key_sets = set(['apiVersion', 'kind', 'metadata'])
-    for service in service_list:
-        if any([
-            primitive_key_sets >= set(service.keys()),
-            service['kind'] != 'Secret' and 'spec' not in service.keys(),
-        ]):
-            raise db_exception.NotAcceptable(
-                'Validation failed: Not all requirements met.'
-            )
-        try:
-            if service['kind'] == 'Service':
-                entrypoints.append(service['metadata']['name'])
-        except KeyError:
-            raise db_exception.NotAcceptable(
-                'Service kind not found or name is missing in metadata. '
-            )
-    topology = _generate_topology_from_blueprint(service_list)
-    pods = reduce(
-        lambda x,y: x+y,
-        [topology[i]['replica'] for i in topology.keys()]
-    )
-    services = len(topology)
-    containers = reduce(
-        lambda x,y: x+y,
-        [
-            len(i['spec']['template']['spec']['containers'])
-            if 'spec' in i.keys() and 'template' in i['spec'].keys() else 0
-            for i in service_list
-        ]
-    )
     # Start: Upsert Blueprint table
     if app.blueprint:
         logging.info(
@@ -161,7 +249,14 @@ def validate_and_upsert_blueprint(
             content=service_list,
             content_string=content_string,
             entrypoints=entrypoints,
-            topology=topology
+            topology=service_topology,
+            topology_graph=topology_graph,
+            base_plan=base_plan,
+            content_hash=content_hash,
+            revision=(blueprint.revision or 0) + 1,
+            diff=blueprint_diff.diff_documents(
+                blueprint.content, service_list
+            )
         )
     else:
         logging.info(
@@ -171,7 +266,9 @@ def validate_and_upsert_blueprint(
         blueprint = utils.add_db_object(
             session, models.AppBlueprint, exception_when_existing,
             service_list, content_string, entrypoints, app_id,
-            topology=topology, **kwargs
+            topology=service_topology, topology_graph=topology_graph,
+            base_plan=base_plan, content_hash=content_hash, revision=1,
+            diff=blueprint_diff.diff_documents([], service_list), **kwargs
         )
     utils.update_db_object(
         session,
@@ -179,6 +276,8 @@ def validate_and_upsert_blueprint(
         containers=containers,
         services=services,
         pods=pods,
+        cpu_cores=resource_totals['cpu_cores'],
+        memory_bytes=resource_totals['memory_bytes'],
     )
     status_handler.update_status_by_app_id(
         app_id,
@@ -0,0 +1,106 @@
+"""Cache of parsed blueprints keyed by the sha256 of their content.
+
+The api stores the documents it parsed and validated from a blueprint
+here, so the same content is never parsed twice. Deploy tasks receive
+the content hash instead of the documents and resolve it here, falling
+back to the parsed content stored with the blueprint.
+
+Only documents valid for the current manifest_schema.SCHEMA_VERSION
+are cached, under keys including it, so a hit never skips validation.
+"""
+import logging
+
+from smartops.db.handlers import cache
+from smartops.db.handlers import database
+from smartops.db.handlers import utils
+from smartops.db import exception
+from smartops.db import models
+from smartops.utils import manifest_schema
+from smartops.utils import setting_wrapper as setting
+
+
+BACKEND = None
+
+
+def _create_backend():
+    backend_type = setting.BLUEPRINT_CACHE_BACKEND
+    ttl = setting.BLUEPRINT_CACHE_TTL
+    prefix = 'smartops:blueprint:'
+    if backend_type == 'lru':
+        return cache.LRUCacheBackend(setting.BLUEPRINT_CACHE_SIZE, ttl)
+    if backend_type == 'redis':
+        import redis
+        return cache.RedisCacheBackend(
+            redis.StrictRedis.from_url(setting.BLUEPRINT_CACHE_REDIS_URL),
+            ttl, prefix=prefix
+        )
+    if backend_type == 'fake_redis':
+        return cache.RedisCacheBackend(cache.FakeRedis(), ttl, prefix=prefix)
+    raise ValueError('unknown blueprint cache backend %s' % backend_type)
+
+
+def init(backend=None):
+    """Init cache with backend or the one configured in setting."""
+    global BACKEND
+    BACKEND = backend or _create_backend()
+
+
+def get_backend():
+    if BACKEND is None:
+        init()
+    return BACKEND
+
+
+def _get_key(content_hash):
+    return '%s:%s' % (manifest_schema.SCHEMA_VERSION, content_hash)
+
+
+def get_parsed(content_hash):
+    """Get parsed blueprint of content hash or None if not cached.
+
+    The parsed blueprint is a dict of documents and entrypoints.
+    """
+    try:
+        return get_backend().get(_get_key(content_hash))
+    except Exception as error:
+        logging.error(
+            'failed to get parsed blueprint %s: %s', content_hash, error
+        )
+        return None
+
+
+def set_parsed(content_hash, documents, entrypoints):
+    """Cache parsed and validated blueprint of content hash."""
+    try:
+        get_backend().set(_get_key(content_hash), {
+            'documents': documents,
+            'entrypoints': entrypoints
+        })
+    except Exception as error:
+        logging.error(
+            'failed to cache parsed blueprint %s: %s', content_hash, error
+        )
+
+
+@database.run_in_session()
+def get_documents(content_hash, session=None):
+    """Get documents of the blueprint whose content has content hash."""
+    parsed = get_parsed(content_hash)
+    if parsed is not None:
+        return parsed['documents']
+    logging.info('parsed blueprint %s is not cached', content_hash)
+    blueprint = utils.get_db_object(
+        session, models.AppBlueprint, exception_when_missing=False,
+        content_hash=content_hash
+    )
+    if not blueprint:
+        raise exception.RecordDoesNotExist(
+            'Blueprint with content hash %s does not exist' % content_hash
+        )
+    # it may have been stored before validation or its last change.
+    if not any([
+        manifest_schema.validate_document(document)
+        for document in blueprint.content
+    ]):
+        set_parsed(content_hash, blueprint.content, blueprint.entrypoints)
+    return blueprint.content
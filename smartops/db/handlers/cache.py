@@ -0,0 +1,361 @@
+"""Read-through cache of per app resources returned by handlers.
+
+Writes invalidate the cached resources of their app after commit, in
+the backend of the writing process. Processes only see each other's
+writes, e.g. of celery workers or other api workers, through a shared
+backend such as redis; the lru backend is for a single process.
+
+Entries are keyed by a generation of their app which invalidation
+increments, so a value loaded before a write and stored after its
+invalidation is never read. The version of a resource is cached under
+its own key, so checking an etag does not load the value.
+"""
+import collections
+import copy
+import functools
+import logging
+import threading
+import time
+
+import simplejson as json
+
+from smartops.db.handlers import database
+from smartops.utils import setting_wrapper as setting
+
+
+# names of the resources cached by cached decorator.
+RESOURCES = []
+BACKEND = None
+STATS = {}
+STATS_LOCK = threading.Lock()
+
+
+class LRUCacheBackend(object):
+    """In-process lru cache backend.
+
+    Values are copied in and out, so callers may modify them. It does
+    not see writes of other processes.
+    """
+
+    def __init__(self, max_size=1000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        # counters are never evicted, unlike entries.
+        self.counters = {}
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.time():
+                return None
+            self.entries[key] = entry
+            return copy.deepcopy(value)
+
+    def set(self, key, value):
+        value = copy.deepcopy(value)
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (value, time.time() + self.ttl)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def get_counter(self, key):
+        with self.lock:
+            return self.counters.get(key, 0)
+
+    def incr(self, key):
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+            return self.counters[key]
+
+
+class NullCacheBackend(object):
+    """Backend caching nothing."""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, keys):
+        pass
+
+    def get_counter(self, key):
+        return 0
+
+    def incr(self, key):
+        return 0
+
+
+class RedisCacheBackend(object):
+    """Cache backend shared by processes through redis.
+
+    client is a redis client or FakeRedis in tests.
+    """
+
+    def __init__(self, client, ttl=60, prefix='smartops:cache:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            return None
+        return json.loads(value)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+
+    def delete(self, keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def get_counter(self, key):
+        return int(self.client.get(self.prefix + key) or 0)
+
+    def incr(self, key):
+        return int(self.client.incr(self.prefix + key))
+
+
+class FakeRedis(object):
+    """Local stand-in of the redis client used by RedisCacheBackend."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def get(self, name):
+        with self.lock:
+            value, expires = self.values.get(name, (None, None))
+            if expires is not None and expires <= time.time():
+                del self.values[name]
+                return None
+            return value
+
+    def set(self, name, value, ex=None):
+        with self.lock:
+            self.values[name] = (
+                value, time.time() + ex if ex is not None else None
+            )
+        return True
+
+    def delete(self, *names):
+        with self.lock:
+            deleted = 0
+            for name in names:
+                if self.values.pop(name, None) is not None:
+                    deleted += 1
+            return deleted
+
+    def incr(self, name):
+        with self.lock:
+            value = int(self.values.get(name, (0, None))[0]) + 1
+            self.values[name] = (str(value), None)
+            return value
+
+
+def _create_backend():
+    backend_type = setting.RESPONSE_CACHE_BACKEND
+    ttl = setting.RESPONSE_CACHE_TTL
+    if backend_type == 'lru':
+        return LRUCacheBackend(setting.RESPONSE_CACHE_SIZE, ttl)
+    if backend_type == 'redis':
+        import redis
+        return RedisCacheBackend(
+            redis.StrictRedis.from_url(setting.RESPONSE_CACHE_REDIS_URL),
+            ttl
+        )
+    if backend_type == 'fake_redis':
+        return RedisCacheBackend(FakeRedis(), ttl)
+    if backend_type == 'none':
+        return NullCacheBackend()
+    raise ValueError('unknown response cache backend %s' % backend_type)
+
+
+def init(backend=None):
+    """Init cache with backend or the one configured in setting."""
+    global BACKEND
+    BACKEND = backend or _create_backend()
+    with STATS_LOCK:
+        STATS.clear()
+
+
+def get_backend():
+    if BACKEND is None:
+        init()
+    return BACKEND
+
+
+def get_stats():
+    """Get hit and miss counters of each cached resource."""
+    with STATS_LOCK:
+        return dict([
+            (resource, dict(counters))
+            for resource, counters in STATS.items()
+        ])
+
+
+def _count(resource, counter):
+    with STATS_LOCK:
+        counters = STATS.setdefault(resource, {'hits': 0, 'misses': 0})
+        counters[counter] += 1
+
+
+def _get_generation_key(app_id):
+    return 'app:%s:generation' % app_id
+
+
+def _get_key(app_id, resource, generation):
+    return 'app:%s:%s:%s' % (app_id, resource, generation)
+
+
+def _get_version_key(app_id, resource, generation):
+    return _get_key(app_id, resource, generation) + ':version'
+
+
+def _get_generation(app_id):
+    """Get the generation of cached resources of app, None on error."""
+    try:
+        return get_backend().get_counter(_get_generation_key(app_id))
+    except Exception as error:
+        logging.error(
+            'failed to get cache generation of app %s: %s', app_id, error
+        )
+        return None
+
+
+def _get_cached(key):
+    try:
+        return get_backend().get(key)
+    except Exception as error:
+        logging.error('failed to get cached %s: %s', key, error)
+        return None
+
+
+def _set_cached(app_id, generation, key, value):
+    """Cache value unless app was invalidated since generation."""
+    if _get_generation(app_id) != generation:
+        logging.debug('skip caching %s of an old generation', key)
+        return
+    try:
+        get_backend().set(key, value)
+    except Exception as error:
+        logging.error('failed to cache %s: %s', key, error)
+
+
+def invalidate(app_id):
+    """Drop all cached resources of app."""
+    logging.debug('invalidate cached resources of app %s', app_id)
+    try:
+        generation = get_backend().incr(_get_generation_key(app_id))
+        keys = []
+        for resource in RESOURCES:
+            keys.append(_get_key(app_id, resource, generation - 1))
+            keys.append(_get_version_key(app_id, resource, generation - 1))
+        get_backend().delete(keys)
+    except Exception as error:
+        logging.error(
+            'failed to invalidate cached resources of app %s: %s',
+            app_id, error
+        )
+
+
+def cached(resource, get_version=None):
+    """Decorator to cache result of per app getter func(app_id).
+
+    Calls with any other argument, e.g. a session of an ongoing
+    transaction, bypass the cache. get_version(app_id, session=session)
+    gets the version of the resource, see _conditional_get of the api.
+    It is read in the same transaction as the value and cached with it.
+    The decorated getter gets a get_versioned(app_id) attribute
+    returning (version, value) of one cache entry, and a
+    get_version(app_id) one returning the version alone, cached apart
+    from the value.
+    """
+    RESOURCES.append(resource)
+
+    def decorator(func):
+        def _load(app_id):
+            with database.session(
+                exception_when_in_session=False
+            ) as session:
+                version = None
+                if get_version is not None:
+                    version = get_version(app_id, session=session)
+                return {
+                    'version': version,
+                    'value': func(app_id, session=session)
+                }
+
+        def get_versioned(app_id):
+            generation = _get_generation(app_id)
+            if generation is None:
+                entry = _load(app_id)
+                return entry['version'], entry['value']
+            key = _get_key(app_id, resource, generation)
+            entry = _get_cached(key)
+            if entry is not None:
+                _count(resource, 'hits')
+                return entry['version'], entry['value']
+            _count(resource, 'misses')
+            entry = _load(app_id)
+            _set_cached(app_id, generation, key, entry)
+            _set_cached(
+                app_id, generation,
+                _get_version_key(app_id, resource, generation),
+                {'version': entry['version']}
+            )
+            return entry['version'], entry['value']
+
+        def get_cached_version(app_id):
+            if get_version is None:
+                return None
+            generation = _get_generation(app_id)
+            if generation is None:
+                return get_version(app_id)
+            key = _get_version_key(app_id, resource, generation)
+            entry = _get_cached(key)
+            if entry is not None:
+                return entry['version']
+            version = get_version(app_id)
+            _set_cached(app_id, generation, key, {'version': version})
+            return version
+
+        @functools.wraps(func)
+        def wrapper(app_id, *args, **kwargs):
+            if args or kwargs:
+                return func(app_id, *args, **kwargs)
+            return get_versioned(app_id)[1]
+
+        wrapper.get_versioned = get_versioned
+        wrapper.get_version = get_cached_version
+        return wrapper
+    return decorator
+
+
+def invalidates(func):
+    """Decorator to invalidate cached resources of app written by func.
+
+    The decorated func(app_id, ..., session=session) should be called
+    in session. The cache is invalidated after the session commits.
+    """
+    @functools.wraps(func)
+    def wrapper(app_id, *args, **kwargs):
+        result = func(app_id, *args, **kwargs)
+        database.after_commit(
+            kwargs['session'], functools.partial(invalidate, app_id)
+        )
+        return result
+    return wrapper
@@ -1,10 +1,27 @@
+import datetime
 import logging
 
 from smartops.db.handlers import app as app_handler
+from smartops.db.handlers import blueprint as blueprint_handler
 from smartops.db.handlers import database
 from smartops.db.handlers import utils
 from smartops.db import exception
 from smartops.db import models
+from smartops.utils import planner
+from smartops.utils import setting_wrapper as setting
+from smartops.utils import topology
+
+
+CAPACITY_PLAN_RESP_FIELDS = [
+    'id', 'name', 'is_auto', 'config', 'app_id', 'status',
+    'status_message', 'created_at', 'cost', 'latency', 'latency_p50',
+    'latency_p99', 'error_rate', 'is_measured'
+]
+# metrics plans can be compared by, all to minimize.
+CAPACITY_PLAN_OBJECTIVES = [
+    'cost', 'latency', 'latency_p50', 'latency_p99', 'error_rate'
+]
+PARETO_OBJECTIVES = ['cost', 'latency_p99', 'error_rate']
 
 
 def _get_capacity_plan(capacity_plan_id, session=None, **kwargs):
@@ -18,6 +35,7 @@ def _get_capacity_plan(capacity_plan_id, session=None, **kwargs):
 
 
 @database.run_in_session()
+@utils.wrap_to_dict(CAPACITY_PLAN_RESP_FIELDS)
 def get_capacity_plan(capacity_plan_id, session=None):
     return _get_capacity_plan(
         capacity_plan_id, session=session
@@ -32,8 +50,165 @@ def create_capacity_plan(app_id, session=None, **kwargs):
 
 
 @database.run_in_session()
+@utils.wrap_to_dict(CAPACITY_PLAN_RESP_FIELDS)
 def list_capacity_plans(app_id, session=None, **kwargs):
-    return utils.list_db_objects(session, models.CapacityPlan, **kwargs)
+    return utils.list_db_objects(
+        session, models.CapacityPlan, app_id=app_id, **kwargs
+    )
+
+
+@database.run_in_session()
+@utils.wrap_to_dict(CAPACITY_PLAN_RESP_FIELDS)
+def get_pareto_capacity_plans(app_id, session=None, objectives=None):
+    """Get the capacity plans of app no other plan beats in objectives.
+
+    Only the objective columns of the plans are read to find them,
+    plans missing any objective are left out.
+    """
+    if objectives is None:
+        objectives = PARETO_OBJECTIVES
+    unknown_objectives = set(objectives) - set(CAPACITY_PLAN_OBJECTIVES)
+    if not objectives or unknown_objectives:
+        raise exception.InvalidParameter(
+            'Objectives %s are not in %s' % (
+                list(unknown_objectives), CAPACITY_PLAN_OBJECTIVES
+            )
+        )
+    plan_ids = []
+    metrics = []
+    for capacity_plan in utils.iter_db_objects(
+        session, models.CapacityPlan, order_by=objectives,
+        load_options=utils.model_load_options(
+            models.CapacityPlan, objectives
+        ),
+        app_id=app_id
+    ):
+        values = [getattr(capacity_plan, key) for key in objectives]
+        if None in values:
+            continue
+        plan_ids.append(capacity_plan.id)
+        metrics.append(values)
+    front_ids = [
+        plan_ids[index] for index in planner.get_pareto_front(metrics)
+    ]
+    if not front_ids:
+        return []
+    return utils.list_db_objects(
+        session, models.CapacityPlan, order_by=objectives + ['id'],
+        id={'in': front_ids}
+    )
+
+
+@database.run_in_session()
+@utils.wrap_to_dict(CAPACITY_PLAN_RESP_FIELDS)
+def search_capacity_plans(app_id, session=None, max_plans=None):
+    """Search the cheapest capacity plans of app meeting its sla.
+
+    Plans are scored in process at the load of the app test plan, with
+    the queue model calibrated from the measured plans of app, and
+    stored as generated capacity plans, cheapest first.
+    """
+    app = app_handler._get_app(app_id, session=session)
+    if not app.sla:
+        raise exception.RecordDoesNotExist(
+            'App %s does not have sla, try posting sla first?' % app_id
+        )
+    try:
+        load = float((app.test_plan or {})['load'])
+    except (KeyError, TypeError, ValueError):
+        raise exception.InvalidParameter(
+            'App %s test plan does not have a valid load' % app_id
+        )
+    if max_plans is None:
+        max_plans = setting.PLANNER_MAX_PLANS
+    try:
+        max_plans = int(max_plans)
+    except (TypeError, ValueError):
+        raise exception.InvalidParameter(
+            'max_plans %s is not an integer' % max_plans
+        )
+    base_plan = app_handler.get_dryrun_base_plan(app_id, session=session)
+    graph = blueprint_handler.get_topology_graph_by_app_id(
+        app_id, session=session
+    )
+    sla = {
+        'latency': app.sla.latency,
+        'error_rate': app.sla.error_rate,
+        'cost': app.sla.cost,
+    }
+    # only the config of measured plans is read, the generated ones
+    # grow with each search.
+    model = planner.calibrate([
+        capacity_plan.config for capacity_plan in utils.iter_db_objects(
+            session, models.CapacityPlan,
+            load_options=utils.model_load_options(
+                models.CapacityPlan, ['config']
+            ),
+            app_id=app_id, is_measured=True
+        )
+    ])
+    plans = planner.search_plans(
+        base_plan, topology.get_plan_visits(graph, app.entrypoint), sla,
+        load, max_plans, model=model
+    )
+    logging.debug(
+        'app %s got %s capacity plans at load %s with model %s',
+        app_id, len(plans), load, model
+    )
+    searched_at = datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')
+    return [
+        utils.add_db_object(
+            session, models.CapacityPlan,
+            name='app_%s_plan_%s_%s' % (app_id, searched_at, rank),
+            is_auto=True, config=plan, app_id=app_id,
+            cost=plan['cost'], latency=plan['latency'],
+            latency_p50=plan['latency_p50'],
+            latency_p99=plan['latency_p99'],
+            error_rate=plan['error_rate'],
+            status=models.CapacityPlanStatus(
+                status='PLAN_GENERATED',
+                message='Predicted cost %.2f latency %.1fms' % (
+                    plan['cost'], plan['latency']
+                )
+            )
+        )
+        for rank, plan in enumerate(plans)
+    ]
+
+
+@database.run_in_session()
+@utils.wrap_to_dict(CAPACITY_PLAN_RESP_FIELDS)
+def update_capacity_plan_measurement(
+    capacity_plan_id, session=None, **kwargs
+):
+    """Record load, latency (ms) and error rate (%) measured by dry run.
+
+    The metrics of the plan become the measured ones, latency
+    percentiles not measured keep their predicted value.
+    """
+    capacity_plan = _get_capacity_plan(capacity_plan_id, session=session)
+    try:
+        measurement = dict([
+            (key, float(kwargs[key]))
+            for key in ['load', 'latency', 'error_rate']
+        ])
+        measurement.update([
+            (key, float(kwargs[key]))
+            for key in ['latency_p50', 'latency_p99'] if key in kwargs
+        ])
+    except (KeyError, TypeError, ValueError):
+        raise exception.InvalidParameter(
+            'Measurement needs numeric load, latency and error_rate'
+        )
+    metrics = dict([
+        (key, value) for key, value in measurement.items()
+        if key in CAPACITY_PLAN_OBJECTIVES
+    ])
+    return utils.update_db_object(
+        session, capacity_plan,
+        config=dict(capacity_plan.config or {}, measurement=measurement),
+        is_measured=True, **metrics
+    )
 
 
 @database.run_in_session()
@@ -4,6 +4,7 @@ import logging
 
 from contextlib import contextmanager
 from sqlalchemy import create_engine
+from sqlalchemy import event
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import scoped_session
@@ -155,6 +156,31 @@ def current_session():
             raise exception.DatabaseException(str(error))
 
 
+def after_commit(session, callback):
+    """Register callback to run after the session commits.
+
+    It is used to notify other parts of the changes only once they
+    are visible to others. The callback is discarded if the session
+    rolls back.
+    """
+    session.info.setdefault('after_commit_callbacks', []).append(callback)
+
+
+@event.listens_for(SESSION, 'after_commit')
+def _run_after_commit_callbacks(session):
+    for callback in session.info.pop('after_commit_callbacks', []):
+        try:
+            callback()
+        except Exception as error:
+            logging.error('after commit callback %s failed', callback)
+            logging.exception(error)
+
+
+@event.listens_for(SESSION, 'after_rollback')
+def _discard_after_commit_callbacks(session):
+    session.info.pop('after_commit_callbacks', None)
+
+
 def run_in_session(exception_when_in_session=True):
     """Decorator to make sure the decorated function run in session.
 
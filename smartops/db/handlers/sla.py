@@ -2,6 +2,7 @@ import logging
 
 from smartops.db.handlers import app as app_handler
 from smartops.db.handlers import app_status as status_handler
+from smartops.db.handlers import cache
 from smartops.db.handlers import database
 from smartops.db.handlers import utils
 from smartops.db import exception
@@ -11,6 +12,9 @@ from smartops.db import models
 SLA_RESP_FIELDS = [
     'id', 'latency', 'error_rate', 'app_id'
 ]
+SLA_VERSION_FIELDS = [
+    'id', 'latency', 'error_rate', 'updated_at'
+]
 
 
 def _get_sla(sla_id, session=None, **kwargs):
@@ -21,6 +25,14 @@ def _get_sla(sla_id, session=None, **kwargs):
     )
 
 
+@database.run_in_session()
+def get_sla_version_by_app_id(app_id, session=None):
+    return utils.get_db_object_version(
+        session, models.AppSla, SLA_VERSION_FIELDS, app_id=app_id
+    )
+
+
+@cache.cached('sla', get_sla_version_by_app_id)
 @database.run_in_session()
 @utils.wrap_to_dict(SLA_RESP_FIELDS)
 def get_sla_by_app_id(app_id, session=None):
@@ -35,6 +47,7 @@ def get_sla_by_app_id(app_id, session=None):
 
 
 @database.run_in_session()
+@cache.invalidates
 @utils.wrap_to_dict(SLA_RESP_FIELDS)
 def update_sla_by_app_id(
     app_id, exception_when_existing=True,
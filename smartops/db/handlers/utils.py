@@ -1,13 +1,23 @@
 """Utils for database usage."""
 
+import base64
+import datetime
 import functools
 import inspect
 import logging
 import re
+import simplejson as json
 
 from inspect import isfunction
 from sqlalchemy import and_
+from sqlalchemy import DateTime
+from sqlalchemy import func
+from sqlalchemy import Integer
+from sqlalchemy import Numeric
 from sqlalchemy import or_
+from sqlalchemy import String
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import load_only
 
 from smartops.db import exception
 from smartops.db import models
@@ -119,6 +129,135 @@ def model_order_by(query, model, order_by):
     return query.order_by(*order_by_cols)
 
 
+def model_load_options(model, keys):
+    """Get query options to load only the keys of model.
+
+    The columns not in keys are deferred, so they are never read or
+    decoded, and the relationships in keys are joined loaded.
+    The primary key is always loaded.
+    """
+    mapper = model.__mapper__
+    columns = [
+        getattr(model, key) for key in keys
+        if key in mapper.columns
+    ]
+    columns.extend([
+        getattr(model, column.key) for column in mapper.primary_key
+    ])
+    load_options = [load_only(*columns)]
+    for key in keys:
+        if key in mapper.relationships:
+            load_options.append(joinedload(getattr(model, key)))
+    return load_options
+
+
+# the values NULL is sorted as in keyset pagination by column type.
+KEYSET_NULL_VALUES = [
+    (DateTime, datetime.datetime(1970, 1, 1)),
+    (Numeric, 0),
+    (Integer, 0),
+    (String, ''),
+]
+
+
+def _keyset_column(model, key):
+    """Get the sql expression to sort and compare key by in keyset.
+
+    NULL is neither greater nor less than any value, so nullable
+    columns are coalesced to the value of their type in
+    KEYSET_NULL_VALUES, and nullable columns of other types can not be
+    keyset columns.
+    Returns the expression and the value NULL is replaced with.
+    """
+    if key not in model.__mapper__.columns:
+        raise exception.InvalidParameter(
+            'keyset key %s is not a column of %s' % (key, model.__name__)
+        )
+    column = model.__mapper__.columns[key]
+    col_attr = getattr(model, key)
+    if not column.nullable:
+        return col_attr, None
+    for column_type, null_value in KEYSET_NULL_VALUES:
+        if isinstance(column.type, column_type):
+            return func.coalesce(col_attr, null_value), null_value
+    raise exception.InvalidParameter(
+        'keyset key %s of %s is nullable' % (key, model.__name__)
+    )
+
+
+def model_keyset_order_by(query, model, keys):
+    """append the order by of keyset pagination into sql query model."""
+    return model_order_by(
+        query, model, [_keyset_column(model, key)[0] for key in keys]
+    )
+
+
+def model_keyset(query, model, keys, values):
+    """append keyset pagination condition into sql query model.
+
+    The condition selects the records sorted strictly after values
+    when the records are sorted by keys with model_keyset_order_by.
+
+    Example for keys is ['updated_at', 'id'] and values is [t, 5]:
+        updated_at > t or (updated_at == t and id > 5)
+    """
+    columns = []
+    for key, value in zip(keys, values):
+        col_expr, null_value = _keyset_column(model, key)
+        if value is None:
+            value = null_value
+        columns.append((col_expr, value))
+    conditions = []
+    for i, (col_expr, value) in enumerate(columns):
+        condition = [
+            prev_col_expr == prev_value
+            for prev_col_expr, prev_value in columns[:i]
+        ]
+        condition.append(col_expr > value)
+        conditions.append(and_(*condition))
+    return query.filter(or_(*conditions))
+
+
+CURSOR_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def encode_cursor(db_object, keys):
+    """Generate opaque pagination cursor pointing after db_object."""
+    values = []
+    for key in keys:
+        value = getattr(db_object, key)
+        if isinstance(value, datetime.datetime):
+            value = value.strftime(CURSOR_DATETIME_FORMAT)
+        values.append(value)
+    return base64.urlsafe_b64encode(json.dumps(values))
+
+
+def decode_cursor(model, keys, cursor):
+    """Get the key values from cursor generated by encode_cursor."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(str(cursor)))
+    except Exception:
+        raise exception.InvalidParameter(
+            'cursor %s is not valid' % cursor
+        )
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise exception.InvalidParameter(
+            'cursor %s does not match keys %s' % (cursor, keys)
+        )
+    for i, key in enumerate(keys):
+        column = model.__mapper__.columns[key]
+        if isinstance(column.type, DateTime) and values[i] is not None:
+            try:
+                values[i] = datetime.datetime.strptime(
+                    values[i], CURSOR_DATETIME_FORMAT
+                )
+            except (TypeError, ValueError):
+                raise exception.InvalidParameter(
+                    'cursor %s is not valid' % cursor
+                )
+    return values
+
+
 def _model_condition(col_attr, value):
     """Generate condition for one column.
 
@@ -249,6 +388,21 @@ def _model_condition(col_attr, value):
         return condition
 
 
+def validate_filters(model, **filters):
+    """Check each key in filters is a column of model."""
+    columns = model.__mapper__.columns
+    unsupported_keys = [
+        key for key in filters
+        if isinstance(key, basestring) and key not in columns
+    ]
+    if unsupported_keys:
+        raise exception.InvalidParameter(
+            'filters %s are not columns of %s' % (
+                unsupported_keys, model.__name__
+            )
+        )
+
+
 def model_filter(query, model, **filters):
     """Append conditons to query for each possible column."""
     for key, value in filters.items():
@@ -402,7 +556,7 @@ def _wrapper_dict(data, support_keys, **filters):
             for item in data
         ]
     if isinstance(data, models.HelperMixin):
-        data = data.to_dict()
+        data = data.to_dict(support_keys)
     if not isinstance(data, dict):
         raise exception.InvalidResponse(
             'response %s type is not dict' % data
@@ -962,7 +1116,10 @@ def output_validates(**kwargs_validators):
     return decorator
 
 
-def get_db_object(session, table, exception_when_missing=True, **kwargs):
+def get_db_object(
+    session, table, exception_when_missing=True, load_options=None,
+    **kwargs
+):
     """Get db object.
 
     If not exception_when_missing and the db object can not be found,
@@ -974,9 +1131,12 @@ def get_db_object(session, table, exception_when_missing=True, **kwargs):
         logging.debug(
             'session %s get db object %s from table %s',
             id(session), kwargs, table.__name__)
-        db_object = model_filter(
+        query = model_filter(
             model_query(session, table), table, **kwargs
-        ).first()
+        )
+        if load_options:
+            query = query.options(*load_options)
+        db_object = query.first()
         logging.debug(
             'session %s got db object %s', id(session), db_object
         )
@@ -993,6 +1153,29 @@ def get_db_object(session, table, exception_when_missing=True, **kwargs):
         )
 
 
+def get_db_object_version(session, table, keys, **kwargs):
+    """Get the version of db object.
+
+    Only the columns in keys are read, so the large columns of the
+    db object are never loaded or decoded. The version is the values
+    of the columns joined by ':', or None if the db object is missing.
+    """
+    if not session:
+        raise exception.DatabaseException('session param is None')
+    with session.begin(subtransactions=True):
+        row = model_filter(
+            session.query(*[getattr(table, key) for key in keys]),
+            table, **kwargs
+        ).first()
+        logging.debug(
+            'session %s got db object %s version %s from table %s',
+            id(session), kwargs, row, table.__name__
+        )
+        if row is None:
+            return None
+        return u':'.join([unicode(value) for value in row])
+
+
 def add_db_object(session, table, exception_when_existing=True,
                   *args, **kwargs):
     """Create db object.
@@ -1051,7 +1234,32 @@ def add_db_object(session, table, exception_when_existing=True,
         return db_object
 
 
-def list_db_objects(session, table, order_by=[], **filters):
+def bulk_add_db_objects(session, table, rows):
+    """Create db objects with bulk inserts.
+
+    Unlike add_db_object, the rows are inserted by executemany without
+    building orm objects, so the __init__, initialize and validate of
+    table are not called and the caller should have validated rows.
+    Rows with the same keys are inserted in one statement.
+    """
+    if not session:
+        raise exception.DatabaseException('session param is None')
+    rows_by_keys = {}
+    for row in rows:
+        rows_by_keys.setdefault(tuple(sorted(row.keys())), []).append(row)
+    with session.begin(subtransactions=True):
+        logging.debug(
+            'session %s bulk add %s objects to table %s',
+            id(session), len(rows), table.__name__
+        )
+        for keyed_rows in rows_by_keys.values():
+            session.execute(table.__table__.insert(), keyed_rows)
+        logging.debug(
+            'session %s %s db objects added', id(session), len(rows)
+        )
+
+
+def list_db_objects(session, table, order_by=None, **filters):
     """List db objects.
 
     If order by given, the db objects should be sorted by the ordered keys.
@@ -1079,6 +1287,82 @@ def list_db_objects(session, table, order_by=[], **filters):
         return db_objects
 
 
+def iter_db_objects(
+    session, table, order_by=None, yield_per=100, load_options=None,
+    **filters
+):
+    """Iterate db objects.
+
+    Unlike list_db_objects, the db objects are fetched from database
+    yield_per rows at a time instead of all at once, so the memory
+    usage stays flat however big the table is.
+    The session should be kept open until the iteration ends.
+    """
+    if not session:
+        raise exception.DatabaseException('session param is None')
+    logging.debug(
+        'session %s iterate db objects by filters %s in table %s',
+        id(session), filters, table.__name__
+    )
+    query = model_order_by(
+        model_filter(
+            model_query(session, table),
+            table,
+            **filters
+        ),
+        table,
+        order_by
+    )
+    if load_options:
+        query = query.options(*load_options)
+    for db_object in query.yield_per(yield_per):
+        yield db_object
+
+
+def list_db_objects_by_page(
+    session, table, keys=None, limit=100, after=None,
+    load_options=None, **filters
+):
+    """List one page of db objects with keyset pagination.
+
+    The db objects are sorted by keys, which are ['id'] by default,
+    and the last key should be unique.
+    after is the cursor returned by the previous page.
+    Returns the db objects in the page and the cursor of next page,
+    which is None if it is the last page.
+    """
+    if not session:
+        raise exception.DatabaseException('session param is None')
+    with session.begin(subtransactions=True):
+        logging.debug(
+            'session %s list db objects by filters %s in table %s '
+            'after %s limit %s',
+            id(session), filters, table.__name__, after, limit
+        )
+        keys = keys or ['id']
+        validate_filters(table, **filters)
+        query = model_filter(
+            model_query(session, table), table, **filters
+        )
+        if after:
+            query = model_keyset(
+                query, table, keys, decode_cursor(table, keys, after)
+            )
+        query = model_keyset_order_by(query, table, keys)
+        if load_options:
+            query = query.options(*load_options)
+        db_objects = query.limit(limit + 1).all()
+        next_cursor = None
+        if len(db_objects) > limit:
+            db_objects = db_objects[:limit]
+            next_cursor = encode_cursor(db_objects[-1], keys)
+        logging.debug(
+            'session %s got listed db objects: %s, next cursor: %s',
+            id(session), db_objects, next_cursor
+        )
+        return db_objects, next_cursor
+
+
 def del_db_objects(session, table, **filters):
     """delete db objects."""
     if not session:
@@ -1099,7 +1383,7 @@ def del_db_objects(session, table, **filters):
         return db_objects
 
 
-def update_db_objects(session, table, updates={}, **filters):
+def update_db_objects(session, table, updates=None, **filters):
     """Update db objects."""
     if not session:
         raise exception.DatabaseException('session param is None')
@@ -1112,7 +1396,7 @@ def update_db_objects(session, table, updates={}, **filters):
         ).all()
         for db_object in db_objects:
             logging.debug('update db object %s: %s', db_object, updates)
-            update_db_object(session, db_object, **updates)
+            update_db_object(session, db_object, **(updates or {}))
         logging.debug(
             'session %s db objects %s updated',
             id(session), db_objects
@@ -4,6 +4,7 @@ import logging
 import simplejson as json
 import yaml
 
+from sqlalchemy import BigInteger
 from sqlalchemy import Boolean
 from sqlalchemy import Column
 from sqlalchemy import ColumnDefault
@@ -24,6 +25,13 @@ from sqlalchemy import UniqueConstraint
 from smartops.db import exception
 from smartops.utils import util
 
+try:
+    from yaml import CDumper as YAMLDumper
+    from yaml import CFullLoader as YAMLLoader
+except ImportError:
+    from yaml import Dumper as YAMLDumper
+    from yaml import FullLoader as YAMLLoader
+
 
 BASE = declarative_base()
 
@@ -51,12 +59,12 @@ class YAMLEncoded(TypeDecorator):
 
     def process_bind_param(self, value, dialect):
         if value is not None:
-            value = yaml.dump(value)
+            value = yaml.dump(value, Dumper=YAMLDumper)
         return value
 
     def process_result_value(self, value, dialect):
         if value is not None:
-            value = yaml.load(value)
+            value = yaml.load(value, Loader=YAMLLoader)
         return value
 
 
@@ -110,16 +118,20 @@ class HelperMixin(object):
                 )
 
 
-    def to_dict(self):
+    def to_dict(self, keys=None):
         """General function to convert record to dict.
         Convert all columns not starting with '_' to
         {<column_name>: <column_value>}
+        If keys is given, only the columns in keys are converted, so
+        the other columns are not accessed and can be left unloaded.
         """
-        keys = self.__mapper__.columns.keys()
+        columns = self.__mapper__.columns.keys()
         dict_info = {}
-        for key in keys:
+        for key in columns:
             if key.startswith('_'):
                 continue
+            if keys is not None and key not in keys:
+                continue
             value = getattr(self, key)
             if value is not None:
                 if isinstance(value, datetime.datetime):
@@ -157,7 +169,14 @@ class AppBlueprint(BASE, TimeStampMixin, HelperMixin):
     entrypoints = Column(JSONEncoded, default=[])
     content = Column(JSONEncoded, default=[])
     content_string = Column(YAMLEncoded, default='')
+    content_hash = Column(String(64))
     topology = Column(JSONEncoded, default={})
+    topology_graph = Column(JSONEncoded, default={})
+    revision = Column(Integer, default=1)
+    deployed_revision = Column(Integer)
+    # diff of the documents from the previous revision.
+    diff = Column(JSONEncoded, default=[])
+    base_plan = Column(JSONEncoded, default=[])
     app_id = Column(
         Integer,
         ForeignKey('app.id', onupdate='CASCADE', ondelete='CASCADE')
@@ -236,8 +255,16 @@ class CapacityPlan(BASE, TimeStampMixin, HelperMixin):
     start_time = Column(DateTime, default=lambda: datetime.datetime.now())
     app_id = Column(
         Integer,
-        ForeignKey('app.id', onupdate='CASCADE', ondelete='CASCADE')
+        ForeignKey('app.id', onupdate='CASCADE', ondelete='CASCADE'),
+        index=True
     )
+    # predicted metrics of the plan, measured ones once is_measured.
+    cost = Column(Float, index=True)
+    latency = Column(Float)
+    latency_p50 = Column(Float, index=True)
+    latency_p99 = Column(Float, index=True)
+    error_rate = Column(Float, index=True)
+    is_measured = Column(Boolean, default=False)
     status = relationship(
         CapacityPlanStatus,
         uselist=False,
@@ -256,10 +283,11 @@ class CapacityPlan(BASE, TimeStampMixin, HelperMixin):
 #            'app_id': self.app_id
 #        }
 
-    def to_dict(self):
-        dict_info = super(App, self).to_dict()
-        dict_info['status'] = status.status
-        dict_info['status_message'] = status.message
+    def to_dict(self, keys=None):
+        dict_info = super(CapacityPlan, self).to_dict(keys)
+        if self.status is not None and (keys is None or 'status' in keys):
+            dict_info['status'] = self.status.status
+            dict_info['status_message'] = self.status.message
         return dict_info
 
 
@@ -274,6 +302,9 @@ class App(BASE, TimeStampMixin, HelperMixin):
     containers = Column(Integer, default=0)
     pods = Column(Integer, default=0)
     services = Column(Integer, default=0)
+    # cpu and memory limits of all pods of the app.
+    cpu_cores = Column(Float, default=0.0)
+    memory_bytes = Column(BigInteger, default=0)
     status = relationship(
         AppStatus,
         uselist=False,
@@ -318,7 +349,8 @@ class App(BASE, TimeStampMixin, HelperMixin):
     def status_dict(self):
         return self.status.to_dict()
 
-    def to_dict(self):
-        dict_info = super(App, self).to_dict()
-        dict_info['status'] = self.status_dict()
+    def to_dict(self, keys=None):
+        dict_info = super(App, self).to_dict(keys)
+        if keys is None or 'status' in keys:
+            dict_info['status'] = self.status_dict()
         return dict_info
@@ -1,36 +1,46 @@
-from kubernetes import client, config
-from smartops.utils import setting_wrapper as setting
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+from smartops.deployment import informer
+from smartops.deployment import k8s_clients
+from smartops.deployment import readiness
 import logging
-from time import sleep
 
 
 class DemoComponent(object):
     def __init__(self):
-        config.load_kube_config(setting.K8S_CONFIG_FILE)
-        self.api_instance = client.CoreV1Api()
+        self.api_instance = k8s_clients.get_api(client.CoreV1Api)
         self.pod_name = "capacityplanner"
         self.helper_ns_name = "helper-app7"
         #self.app_ns_name = "app6planner20dryrun0"
         return
 
     def check_pod_existence(self):
-        pod_list = self.api_instance.list_namespaced_pod(self.helper_ns_name)
-        return self.pod_name in map(lambda x:x.metadata.name, pod_list.items)
+        return informer.get_store('Pod').get(
+            self.helper_ns_name, self.pod_name
+        ) is not None
 
     def check_ns_existence(self, ns_name):
-        ns_list = self.api_instance.list_namespace()
-        return ns_name in map(lambda x:x.metadata.name, ns_list.items)
+        return informer.get_store('Namespace').get(None, ns_name) is not None
 
     def deploy_capacity_planner(self):
-        config.load_kube_config(setting.K8S_CONFIG_FILE)
         delete_pod_body = client.V1DeleteOptions()
         if self.check_pod_existence():
-            self.api_instance.delete_namespaced_pod(
-                self.pod_name,
-                self.helper_ns_name,
-                delete_pod_body,
-                grace_period_seconds=0
-            )
+            try:
+                self.api_instance.delete_namespaced_pod(
+                    self.pod_name,
+                    self.helper_ns_name,
+                    body=delete_pod_body,
+                    grace_period_seconds=0
+                )
+            except ApiException as e:
+                if e.status != 404:
+                    raise
+            # the pod is deleted asynchronously, creating it before is
+            # a conflict.
+            if not readiness.wait_until_deleted(
+                'Pod', self.helper_ns_name, self.pod_name
+            ):
+                raise RuntimeError('pod %s was not deleted' % self.pod_name)
         #for ns_name in [self.helper_ns_name, self.app_ns_name]:
         if not self.check_ns_existence(self.helper_ns_name):
             self.api_instance.create_namespace(
@@ -74,16 +84,14 @@ class DemoComponent(object):
         )
 
         # api_instance.create_namespace(namespace_body, pretty='true')
-        while True:
-            try:
-                api_response = self.api_instance.create_namespaced_pod(
-                    body=pod_body, namespace=self.helper_ns_name, pretty='true'
-                )
-            except:
-                logging.info("Namespace not ready, sleeping...")
-                sleep(1)
-                continue
-            logging.info("Namespace ready, woke up and successfully created pod")
-            break
-
-        return api_response
+        not_ready = readiness.wait_until_ready(
+            [('Namespace', None, self.helper_ns_name)]
+        )
+        if not_ready:
+            raise RuntimeError(
+                'namespace %s is not ready' % self.helper_ns_name
+            )
+        logging.info("Namespace ready, creating pod")
+        return self.api_instance.create_namespaced_pod(
+            body=pod_body, namespace=self.helper_ns_name, pretty='true'
+        )
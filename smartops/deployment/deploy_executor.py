@@ -0,0 +1,109 @@
+"""Apply components of a deployment level by level in parallel.
+
+Components depend on every component of the levels before theirs:
+namespace, then secrets and config maps, then services, then
+controllers, then bare pods. The components of a level are applied
+concurrently on a bounded thread pool, so a deployment takes about as
+long as its slowest component of each level. When any component of a
+level fails, including components of kinds not supported, which raise
+NotImplementedError, the levels after it are skipped.
+"""
+import logging
+import time
+
+from concurrent import futures
+
+from smartops.utils import setting_wrapper as setting
+
+
+LEVELS = [
+    ['Namespace'],
+    ['Secret', 'ConfigMap'],
+    ['Service'],
+    [
+        'Deployment', 'ReplicationController', 'ReplicaSet', 'StatefulSet',
+        'DaemonSet', 'Job'
+    ],
+    ['Pod'],
+]
+LEVEL_BY_KIND = dict([
+    (kind, level) for level, kinds in enumerate(LEVELS) for kind in kinds
+])
+# other kinds, e.g. volume claims or service accounts, come before
+# anything running pods.
+DEFAULT_LEVEL = 1
+
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+def get_level(kind):
+    return LEVEL_BY_KIND.get(kind, DEFAULT_LEVEL)
+
+
+def _apply(apply_component):
+    """Run apply_component, returning its status, result and seconds."""
+    start = time.time()
+    try:
+        return SUCCEEDED, apply_component(), time.time() - start
+    except NotImplementedError as error:
+        logging.error('failed component: %s', error)
+        return FAILED, error, time.time() - start
+    except Exception as error:
+        logging.exception(error)
+        return FAILED, error, time.time() - start
+
+
+class DeployExecutor(object):
+    """Executor of the components of a deployment."""
+
+    def __init__(self, max_workers=None):
+        if max_workers is None:
+            max_workers = setting.DEPLOY_MAX_WORKERS
+        self.max_workers = max_workers
+
+    def run(self, components):
+        """Apply components given as (kind, name, apply_component).
+
+        Returns a result per component in the order given:
+            {'kind': ..., 'name': ..., 'level': ..., 'status': ...,
+             'result': ..., 'seconds': ...}
+        where result is what apply_component returned, or the error it
+        raised unless status is SUCCEEDED.
+        """
+        results = [
+            {
+                'kind': kind, 'name': name, 'level': get_level(kind),
+                'status': SKIPPED, 'result': None, 'seconds': 0.0
+            }
+            for kind, name, _ in components
+        ]
+        levels = sorted(set([result['level'] for result in results]))
+        with futures.ThreadPoolExecutor(self.max_workers) as executor:
+            for level in levels:
+                indexes = [
+                    index for index, result in enumerate(results)
+                    if result['level'] == level
+                ]
+                start = time.time()
+                applies = [
+                    executor.submit(_apply, components[index][2])
+                    for index in indexes
+                ]
+                for index, apply_future in zip(indexes, applies):
+                    status, result, seconds = apply_future.result()
+                    results[index].update(
+                        status=status, result=result, seconds=seconds
+                    )
+                failed = [
+                    index for index in indexes
+                    if results[index]['status'] == FAILED
+                ]
+                logging.info(
+                    'applied %s components of level %s in %.3fs, %s failed',
+                    len(indexes), level, time.time() - start, len(failed)
+                )
+                if failed:
+                    break
+        return results
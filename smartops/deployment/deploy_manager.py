@@ -1,19 +1,47 @@
+import functools
 import jinja2
 import logging
 import os
 
+from smartops.deployment import deploy_executor
 from smartops.deployment import k8s_components
+from smartops.deployment import readiness
+from smartops.utils import blueprint_diff
 from smartops.utils import setting_wrapper as setting
 
 
+# component class applying each kind of blueprint document, other kinds
+# fail to deploy.
+COMPONENT_CLASSES = {
+    'Pod': k8s_components.K8sPodComponent,
+    'Service': k8s_components.K8sServiceComponent,
+    'ReplicationController': (
+        k8s_components.K8sReplicationControllerComponent
+    ),
+    'StatefulSet': k8s_components.K8sStatefulSetComponent,
+    'Deployment': k8s_components.K8sDeploymentComponent,
+    'Secret': k8s_components.K8sSecretComponent,
+    'ConfigMap': k8s_components.K8sConfigMapComponent,
+}
+# kinds of blueprint documents not applied: apps run in their own
+# namespace.
+IGNORED_KINDS = ['Namespace']
+
+
 class DeployManager(object):
     """Deployment manager module."""
-    def __init__(self, app_id, blueprint, test_plan, entrypoint):
+    def __init__(
+        self, app_id, blueprint, test_plan, entrypoint, changes=None
+    ):
         self.app_id = app_id
         self.blueprint = blueprint
         self.test_plan = test_plan
         self.entrypoint = entrypoint
-        self.namespace = 'smartops:app_' + str(app_id)
+        # diff from the deployed blueprint, None to deploy everything.
+        self.changes = changes
+        self.namespace = 'smartops-app-' + str(app_id)
+        # (kind, name) of applied components to their uid and generation.
+        self.applied = {}
 
     @staticmethod
     def render_jmeter_config(app_id, test_plan):
@@ -32,21 +60,87 @@ class DeployManager(object):
     def get_app_details():
         return
 
-    def deploy(self):
-        deploy_messages = []
-        for component in self.blueprint:
-            if component['kind'] == 'Secret':
-                pass
-            name = self.app_id + component['metadata']['name']
-            component_class_ = getattr(
-                k8s_components,
-                'K8s' + component['kind'] + 'Component'
+    def _get_components(self):
+        if self.changes is None:
+            return self.blueprint
+        for kind, name in blueprint_diff.get_keys(
+            self.changes, [blueprint_diff.REMOVED]
+        ):
+            logging.info(
+                'component %s %s is removed from blueprint of app %s',
+                kind, name, self.app_id
             )
-            component_obj = component_class_(
-                component, name, self.namespace
+        keys = blueprint_diff.get_keys(
+            self.changes, [blueprint_diff.ADDED, blueprint_diff.CHANGED]
+        )
+        return [
+            component for component in self.blueprint
+            if blueprint_diff.get_document_key(component) in keys
+        ]
+
+    def _apply_namespace(self):
+        namespace_component = k8s_components.K8sNamespaceComponent(
+            self.namespace
+        )
+        if not namespace_component.check_existence():
+            return namespace_component.create_namespace()
+
+    def _apply_component(self, component):
+        component_class_ = COMPONENT_CLASSES.get(component['kind'])
+        if component_class_ is None:
+            raise NotImplementedError(
+                'kind %s of %s is not supported' % (
+                    component['kind'], component['metadata']['name']
+                )
             )
-            deploy_messages.append(component_obj.run())
-        return deploy_messages
+        component_obj = component_class_(
+            component, component['metadata']['name'], self.namespace
+        )
+        result = component_obj.run()
+        self.applied[
+            (component['kind'], component['metadata']['name'])
+        ] = component_obj.applied
+        return result
+
+    def deploy(self):
+        """Apply the namespace and components of app.
+
+        Returns the results of deploy_executor.DeployExecutor.run.
+        """
+        components = [('Namespace', self.namespace, self._apply_namespace)]
+        for component in self._get_components():
+            if component['kind'] in IGNORED_KINDS:
+                logging.info(
+                    'ignored %s %s of app %s', component['kind'],
+                    component['metadata']['name'], self.app_id
+                )
+                continue
+            components.append((
+                component['kind'], component['metadata']['name'],
+                functools.partial(self._apply_component, component)
+            ))
+        return deploy_executor.DeployExecutor().run(components)
+
+    def wait_until_ready(self, timeout=None):
+        """Wait for the pods and controllers of app to be ready.
+
+        Every workload of the blueprint is waited for, deployed now or
+        before; the ones deployed now are only checked once the cache
+        has them as applied. Returns the (kind, namespace, name) not
+        ready to the reason, see readiness.ReadinessWaiter.wait.
+        """
+        keys = [
+            (component['kind'], self.namespace, component['metadata']['name'])
+            for component in self.blueprint
+            if component['kind'] in readiness.READY_CHECKS and
+            component['kind'] not in IGNORED_KINDS
+        ]
+        applied = dict([
+            ((kind, self.namespace, name), version)
+            for (kind, name), version in self.applied.items()
+            if version is not None
+        ])
+        return readiness.wait_until_ready(keys, timeout, applied=applied)
 
 
 class CapacityPlannerDeployManager(DeployManager):
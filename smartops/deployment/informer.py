@@ -0,0 +1,274 @@
+"""Local cache of cluster objects kept up to date by watches.
+
+An informer lists the objects of a kind in all namespaces once, then
+follows a watch from the listed resource version, relisting when the
+watch falls too far behind. Objects are kept as the json dicts the api
+server sends, in a store indexed by namespace, name and labels, so
+existence and readiness checks need no api call.
+
+Informers are shared by the process, one per kind and cluster, and
+started on first use. Handlers added to an informer are called with
+the type and object of each event after the store is updated, with
+the store locked, so they should be quick.
+"""
+import collections
+import logging
+import threading
+
+from kubernetes import client as k8s_client
+from kubernetes.watch.watch import iter_resp_lines
+import simplejson as json
+
+from smartops.deployment import k8s_clients
+from smartops.utils import setting_wrapper as setting
+
+
+# api class and method listing all objects of each kind.
+LIST_METHODS = {
+    'Namespace': (k8s_client.CoreV1Api, 'list_namespace'),
+    'Pod': (k8s_client.CoreV1Api, 'list_pod_for_all_namespaces'),
+    'Service': (k8s_client.CoreV1Api, 'list_service_for_all_namespaces'),
+    'ReplicationController': (
+        k8s_client.CoreV1Api,
+        'list_replication_controller_for_all_namespaces'
+    ),
+    'StatefulSet': (
+        k8s_client.AppsV1beta1Api, 'list_stateful_set_for_all_namespaces'
+    ),
+    'Deployment': (
+        k8s_client.AppsV1Api, 'list_deployment_for_all_namespaces'
+    ),
+}
+ADDED = 'ADDED'
+MODIFIED = 'MODIFIED'
+DELETED = 'DELETED'
+# event types sent when the store is relisted.
+SYNCED = 'SYNCED'
+
+# (kind, context, config file) to the running Informer.
+INFORMERS = {}
+INFORMERS_LOCK = threading.Lock()
+
+
+def get_key(obj):
+    """Get (namespace, name) of obj, namespace is None if not namespaced."""
+    metadata = obj.get('metadata') or {}
+    return metadata.get('namespace'), metadata.get('name')
+
+
+def is_pod_ready(pod):
+    return any([
+        condition.get('type') == 'Ready' and
+        condition.get('status') == 'True'
+        for condition in (pod.get('status') or {}).get('conditions') or []
+    ])
+
+
+def is_controller_ready(controller):
+    """Check if all replicas of the latest spec of a controller are ready."""
+    replicas = (controller.get('spec') or {}).get('replicas', 1)
+    generation = (controller.get('metadata') or {}).get('generation', 0)
+    status = controller.get('status') or {}
+    return (
+        status.get('observedGeneration', 0) >= generation and
+        status.get('readyReplicas', 0) >= replicas
+    )
+
+
+class Store(object):
+    """Objects by (namespace, name), indexed by namespace and labels."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.objects = {}
+        self.namespace_index = collections.defaultdict(set)
+        self.label_index = collections.defaultdict(set)
+
+    def _index(self, key, obj):
+        namespace = key[0]
+        self.namespace_index[namespace].add(key)
+        labels = (obj.get('metadata') or {}).get('labels') or {}
+        for item in labels.items():
+            self.label_index[(namespace,) + item].add(key)
+
+    def _unindex(self, key, obj):
+        namespace = key[0]
+        self.namespace_index[namespace].discard(key)
+        labels = (obj.get('metadata') or {}).get('labels') or {}
+        for item in labels.items():
+            self.label_index[(namespace,) + item].discard(key)
+
+    def upsert(self, obj):
+        key = get_key(obj)
+        with self.lock:
+            if key in self.objects:
+                self._unindex(key, self.objects[key])
+            self.objects[key] = obj
+            self._index(key, obj)
+
+    def delete(self, obj):
+        key = get_key(obj)
+        with self.lock:
+            if key in self.objects:
+                self._unindex(key, self.objects.pop(key))
+
+    def replace(self, objs):
+        with self.lock:
+            self.objects = {}
+            self.namespace_index = collections.defaultdict(set)
+            self.label_index = collections.defaultdict(set)
+            for obj in objs:
+                self.upsert(obj)
+
+    def get(self, namespace, name):
+        return self.objects.get((namespace, name))
+
+    def list(self, namespace=None):
+        with self.lock:
+            if namespace is None:
+                return self.objects.values()
+            return [
+                self.objects[key] for key in self.namespace_index[namespace]
+            ]
+
+    def select(self, namespace, labels):
+        """Get objects in namespace having all labels."""
+        with self.lock:
+            if not labels:
+                return self.list(namespace)
+            keys = set.intersection(*[
+                self.label_index[(namespace,) + item]
+                for item in labels.items()
+            ])
+            return [self.objects[key] for key in keys]
+
+
+class Informer(threading.Thread):
+    """Thread keeping the store of a kind in sync with the cluster."""
+
+    def __init__(self, kind, context=None, config_file=None):
+        super(Informer, self).__init__(name='informer-%s' % kind)
+        self.daemon = True
+        self.kind = kind
+        self.context = context
+        self.config_file = config_file
+        self.store = Store()
+        self.synced = threading.Event()
+        self.stopped = threading.Event()
+        self.handlers = []
+        self.resource_version = None
+
+    def add_handler(self, handler):
+        """Call handler(event type, object) on each event."""
+        with self.store.lock:
+            self.handlers.append(handler)
+
+    def remove_handler(self, handler):
+        with self.store.lock:
+            self.handlers.remove(handler)
+
+    def _notify(self, event_type, obj):
+        for handler in list(self.handlers):
+            try:
+                handler(event_type, obj)
+            except Exception as error:
+                logging.exception(error)
+
+    def _call_list(self, **kwargs):
+        api_class, method = LIST_METHODS[self.kind]
+        api = k8s_clients.get_api(api_class, self.context, self.config_file)
+        return getattr(api, method)(_preload_content=False, **kwargs)
+
+    def _list(self):
+        resp = self._call_list()
+        object_list = json.loads(resp.data)
+        with self.store.lock:
+            self.store.replace(object_list.get('items') or [])
+            self.resource_version = object_list['metadata'].get(
+                'resourceVersion'
+            )
+            self._notify(SYNCED, None)
+        self.synced.set()
+        logging.debug(
+            'listed %s %s at %s', len(self.store.objects), self.kind,
+            self.resource_version
+        )
+
+    def _watch(self):
+        """Follow a watch until it times out; False if it needs a relist."""
+        resp = self._call_list(
+            watch=True, resource_version=self.resource_version,
+            timeout_seconds=setting.K8S_WATCH_TIMEOUT,
+            _request_timeout=setting.K8S_WATCH_TIMEOUT + 10
+        )
+        try:
+            for line in iter_resp_lines(resp):
+                if self.stopped.is_set():
+                    return True
+                event = json.loads(line)
+                event_type = event.get('type')
+                obj = event.get('object') or {}
+                if event_type == 'ERROR':
+                    logging.info(
+                        'watch of %s failed: %s', self.kind,
+                        obj.get('message')
+                    )
+                    return False
+                if event_type not in [ADDED, MODIFIED, DELETED]:
+                    continue
+                with self.store.lock:
+                    if event_type == DELETED:
+                        self.store.delete(obj)
+                    else:
+                        self.store.upsert(obj)
+                    self.resource_version = obj['metadata'].get(
+                        'resourceVersion'
+                    )
+                    self._notify(event_type, obj)
+            return True
+        finally:
+            resp.close()
+            resp.release_conn()
+
+    def run(self):
+        relist = True
+        while not self.stopped.is_set():
+            try:
+                if relist:
+                    self._list()
+                relist = not self._watch()
+            except Exception as error:
+                logging.exception(error)
+                relist = True
+                self.stopped.wait(setting.K8S_INFORMER_RETRY_INTERVAL)
+
+    def stop(self):
+        self.stopped.set()
+
+    def wait_for_sync(self, timeout=None):
+        if timeout is None:
+            timeout = setting.K8S_INFORMER_SYNC_TIMEOUT
+        if not self.synced.wait(timeout):
+            raise RuntimeError(
+                'informer of %s not synced in %ss' % (self.kind, timeout)
+            )
+
+
+def get_informer(kind, context=None, config_file=None):
+    """Get the synced informer of kind, starting it on first use."""
+    if config_file is None:
+        config_file = setting.K8S_CONFIG_FILE
+    key = (kind, context, config_file)
+    with INFORMERS_LOCK:
+        informer = INFORMERS.get(key)
+        if informer is None or not informer.is_alive():
+            informer = Informer(kind, context, config_file)
+            informer.start()
+            INFORMERS[key] = informer
+    informer.wait_for_sync()
+    return informer
+
+
+def get_store(kind, context=None, config_file=None):
+    """Get the synced store of kind."""
+    return get_informer(kind, context, config_file).store
@@ -0,0 +1,63 @@
+"""Process wide registry of kubernetes api clients.
+
+One ApiClient is kept per kubeconfig file and context, so the config is
+loaded once and the connections in its pool are kept alive and reused
+by every component. A client is rebuilt when its config file changes.
+ApiClient is safe to share between threads.
+"""
+import logging
+import os
+import threading
+
+from kubernetes import client as k8s_client
+from kubernetes import config as k8s_config
+
+from smartops.utils import setting_wrapper as setting
+
+
+# (config file, context) to (config file mtime, ApiClient).
+CLIENTS = {}
+CLIENTS_LOCK = threading.Lock()
+
+
+def _get_config_mtime(config_file):
+    try:
+        return os.stat(config_file).st_mtime
+    except OSError:
+        return None
+
+
+def _create_api_client(config_file, context):
+    configuration = k8s_client.Configuration()
+    k8s_config.load_kube_config(
+        config_file=config_file, context=context,
+        client_configuration=configuration
+    )
+    configuration.connection_pool_maxsize = setting.K8S_CONNECTION_POOL_SIZE
+    return k8s_client.ApiClient(configuration)
+
+
+def get_api_client(context=None, config_file=None):
+    """Get the shared ApiClient of context in config_file.
+
+    context defaults to the current context of the config file and
+    config_file to setting.K8S_CONFIG_FILE.
+    """
+    if config_file is None:
+        config_file = setting.K8S_CONFIG_FILE
+    key = (config_file, context)
+    mtime = _get_config_mtime(config_file)
+    with CLIENTS_LOCK:
+        if key in CLIENTS and CLIENTS[key][0] == mtime:
+            return CLIENTS[key][1]
+        logging.info(
+            'loading kubernetes config %s context %s', config_file, context
+        )
+        api_client = _create_api_client(config_file, context)
+        CLIENTS[key] = (mtime, api_client)
+        return api_client
+
+
+def get_api(api_class, context=None, config_file=None):
+    """Get an api_class instance, e.g. CoreV1Api, on the shared client."""
+    return api_class(get_api_client(context, config_file))
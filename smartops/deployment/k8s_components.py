@@ -1,14 +1,117 @@
-from kubernetes import config as k8s_config, client as k8s_client
+from kubernetes import client as k8s_client
 from kubernetes.client.rest import ApiException
-from smartops.utils import setting_wrapper as setting
+from smartops.deployment import informer
+from smartops.deployment import k8s_clients
+from smartops.utils import quantity
+import base64
 import logging
+import simplejson as json
+
+
+# keys of the quantity maps of containers, e.g. resources.limits.
+QUANTITY_MAP_KEYS = ['limits', 'requests']
+# keys identifying the items of lists of objects, e.g. containers by
+# name or ports by containerPort, in order of preference.
+MERGE_KEYS = ['name', 'containerPort', 'port', 'mountPath']
+
+
+def _is_same_scalar(desired, live, path):
+    """Compare scalars the way the api server normalizes them.
+
+    Quantities, e.g. cpu 0.5, come back as 500m and numbers sent for
+    strings, e.g. env values, as their string.
+    """
+    if desired == live:
+        return True
+    if len(path) >= 2 and path[-2] in QUANTITY_MAP_KEYS:
+        try:
+            return quantity.parse_milli(desired) == quantity.parse_milli(live)
+        except ValueError:
+            return False
+    if (
+        isinstance(desired, (int, long, float)) and
+        not isinstance(desired, bool) and isinstance(live, basestring)
+    ):
+        return str(desired) == live
+    return False
+
+
+def _get_merge_key(items):
+    """Get the key identifying every item of a list, None if none does."""
+    for key in MERGE_KEYS:
+        if items and all([
+            isinstance(item, dict) and key in item for item in items
+        ]):
+            return key
+    return None
+
+
+def is_subset(desired, live, path=()):
+    """Check if live has every value of desired.
+
+    Values live has but desired does not, e.g. defaulted or status
+    fields, are ignored, and so are empty lists, which the api server
+    omits. Items of lists of objects are matched by their merge key,
+    so live may have more, e.g. the service account token volume;
+    other lists should match item by item. path is the keys leading to
+    desired.
+    """
+    if isinstance(desired, dict):
+        return isinstance(live, dict) and all([
+            is_subset(value, live[key], path + (key,)) if key in live
+            else value == []
+            for key, value in desired.items()
+        ])
+    if isinstance(desired, list):
+        if not isinstance(live, list):
+            return False
+        merge_key = _get_merge_key(desired)
+        if merge_key is None:
+            return len(desired) == len(live) and all([
+                is_subset(item, live_item, path)
+                for item, live_item in zip(desired, live)
+            ])
+        live_items = dict([
+            (item[merge_key], item) for item in live
+            if isinstance(item, dict) and merge_key in item
+        ])
+        return all([
+            item[merge_key] in live_items and
+            is_subset(item, live_items[item[merge_key]], path)
+            for item in desired
+        ])
+    return _is_same_scalar(desired, live, path)
+
+
+def get_patch(live, desired, path=()):
+    """Get the minimal patch making live have desired values.
+
+    It is sent as a strategic merge patch, which the kubernetes client
+    uses for dict bodies, so lists such as containers are merged by
+    their key, e.g. name, not replaced. Removing items from such lists
+    is not supported. An empty patch means live is already as desired.
+    """
+    patch = {}
+    for key, value in desired.items():
+        if is_subset({key: value}, live, path):
+            continue
+        if isinstance(value, dict) and isinstance(live.get(key), dict):
+            patch[key] = get_patch(live[key], value, path + (key,))
+        else:
+            patch[key] = value
+    return patch
 
 
 class K8sComponent(object):
+    # the api methods are <verb>_<resource>, e.g. read_namespaced_pod.
+    resource = None
+
     def __init__(self, component, name, namespace):
-        k8s_config.load_kube_config(setting.K8S_CONFIG_FILE)
+        self.name = name
         self.namespace = namespace
-        self.api_instance = k8s_client.CoreV1Api()
+        self.api_instance = k8s_clients.get_api(k8s_client.CoreV1Api)
+        # uid and generation of the object once applied by run.
+        self.applied = None
         self.api_version = component['apiVersion']
         self.kind = component['kind']
         if 'containers' in component.keys():
@@ -33,6 +136,7 @@ class K8sComponent(object):
                     for port in container['ports']
                 ] if 'ports' in container.keys() else None,
                 image_pull_policy='Always',
+                resources=container.get('resources'),
                 volume_mounts=[
                     k8s_client.V1VolumeMount(
                         mount_path=mount['mountPath'],
@@ -43,30 +147,24 @@ class K8sComponent(object):
                 env=[
                     k8s_client.V1EnvVar(
                         name=env['name'],
-                        value=env['value']
+                        value=env.get('value'),
+                        value_from=env.get('valueFrom')
                     )
                     for env in container['env']
                 ] if 'env' in container.keys() else None,
+                command=container.get('command'),
                 args=container['args'] if 'args' in container.keys() else None,
-                readiness_probe=k8s_client.V1Probe(
-                    _exec=k8s_client.V1ExecAction(
-                        command=container['readinessProbe']['exec']['command']
-                    ),
-                    initial_delay_seconds=(
-                        container['readinessProbe']['initialDelaySeconds']
-                    ),
-                    timeout_seconds=(
-                        container['readinessProbe']['timeoutSeconds']
-                    ),
-                    success_threshold=(
-                        container['readinessProbe']['successThreshold']
-                    )
-                ) if 'readinessProbe' in container.keys() else None,
+                # probes are sent as given, whatever their handler.
+                readiness_probe=container.get('readinessProbe'),
+                liveness_probe=container.get('livenessProbe'),
             )
             container_objs.append(container_obj)
         return container_objs
 
     def _parse_volumes(self, volumes):
+        if not volumes:
+            # the api server omits empty lists.
+            return None
         volume_objs = []
         for volume in volumes:
             volume_obj = k8s_client.V1Volume(
@@ -79,19 +177,73 @@ class K8sComponent(object):
             volume_objs.append(volume_obj)
         return volume_objs
 
+    def _get_body(self):
+        raise NotImplementedError(
+            'kind %s of %s is not supported' % (self.kind, self.name)
+        )
+
+    def _call(self, verb, *args, **kwargs):
+        return getattr(self.api_instance, '%s_%s' % (verb, self.resource))(
+            *args, **kwargs
+        )
+
+    def _set_applied(self, obj):
+        metadata = self.api_instance.api_client.sanitize_for_serialization(
+            obj
+        ).get('metadata') or {}
+        self.applied = {
+            'uid': metadata.get('uid'),
+            'generation': metadata.get('generation', 0),
+        }
+
+    def run(self):
+        """Apply the component.
+
+        It is created if missing, otherwise the live object is patched,
+        with a strategic merge patch of the values differing from the
+        component, or left alone if none differ. The uid and generation
+        of the applied object are kept in applied.
+        """
+        body = self.api_instance.api_client.sanitize_for_serialization(
+            self._get_body()
+        )
+        try:
+            live = json.loads(self._call(
+                'read', self.name, self.namespace, _preload_content=False
+            ).data)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            logging.info('creating %s %s', self.kind, self.name)
+            result = self._call('create', body=body, namespace=self.namespace)
+            self._set_applied(result)
+            return result
+        patch = get_patch(live, body)
+        if not patch:
+            logging.info('%s %s is unchanged', self.kind, self.name)
+            self._set_applied(live)
+            return None
+        logging.info('patching %s %s: %s', self.kind, self.name, patch)
+        result = self._call('patch', self.name, self.namespace, body=patch)
+        self._set_applied(result)
+        return result
+
 
 class K8sPodComponent(K8sComponent):
+    resource = 'namespaced_pod'
+
     def __init__(self, component, name, namespace):
         super(K8sPodComponent, self).__init__(component, name, namespace)
         self.pod_name = name
         self.containers = (
             self._parse_containers(component['spec']['containers'])
         )
-        self.node_selector = component['spec']['nodeSelector']
-        self.restart_policy = component['spec']['restartPolicy']
-        self.volumes = self._parse_volumes(component['spec']['volumes'])
-    def run(self):
-        pod_body = k8s_client.V1Pod(
+        self.node_selector = component['spec'].get('nodeSelector')
+        self.restart_policy = component['spec'].get('restartPolicy')
+        self.volumes = self._parse_volumes(component['spec'].get('volumes'))
+
+    def _get_body(self):
+        return k8s_client.V1Pod(
             api_version=self.api_version,
             kind=self.kind,
             metadata=k8s_client.V1ObjectMeta(name=self.pod_name),
@@ -102,23 +254,19 @@ class K8sPodComponent(K8sComponent):
                 volumes=self.volumes
             )
         )
-        try:
-            api_response = self.api_instance.create_namespaced_pod(
-                body=pod_body,
-                namespace=self.namespace
-            )
-        except ApiException as e:
-            logging.error('Exception caught when creating pod: %s\n', e)
-        return api_response
 
 
 class K8sServiceComponent(K8sComponent):
+    resource = 'namespaced_service'
+
     def __init__(self, component, name, namespace):
-        super(K8sComponent, self).__init__(component, name, namespace)
+        super(K8sServiceComponent, self).__init__(component, name, namespace)
         self.pod_name = name
         self.selector = component['spec']['selector']
-    def run(self):
-        service_body = k8s_client.k8s_client.V1Service(
+        self.ports = component['spec'].get('ports', [])
+
+    def _get_body(self):
+        return k8s_client.V1Service(
             api_version=self.api_version,
             kind=self.kind,
             metadata=k8s_client.V1ObjectMeta(name=self.pod_name),
@@ -127,25 +275,19 @@ class K8sServiceComponent(K8sComponent):
                 ports=[
                     k8s_client.V1ServicePort(
                         port=port['port'],
-                        target_port=port['target_port'],
-                        protocol=port['protocol'],
-                        name=port['name']
+                        target_port=port.get('targetPort'),
+                        protocol=port.get('protocol'),
+                        name=port.get('name')
                     )
-                    for port in component['spec']['ports']
-                ]
+                    for port in self.ports
+                ] or None
             )
         )
-        try:
-            api_response = self.api_instance.create_namespaced_service(
-                body=service_body,
-                namespace=self.namespace
-            )
-        except ApiException as e:
-            logging.error('Exception caught when creating service: %s\n', e)
-        return api_response
 
 
 class K8sReplicationControllerComponent(K8sComponent):
+    resource = 'namespaced_replication_controller'
+
     def __init__(self, component, name, namespace):
         super(K8sReplicationControllerComponent, self).__init__(
             component, name, namespace
@@ -153,22 +295,14 @@ class K8sReplicationControllerComponent(K8sComponent):
         self.replication_controller_name = name
         self.replicas = component['spec']['replicas']
         self.template_meta = component['spec']['template']['metadata']
-        self.restart_policy = (
-            component['spec']['template']['spec']['restartPolicy']
-        ) if 'restartPolicy' in component['spec']['template']['spec'].keys() else None
-        self.node_selector = (
-            component['spec']['template']['spec']['nodeSelector']
-        )
-        contianer_component = (
-            component['spec']['template']['spec']['containers']
-        )
-        volume_component = (
-            component['spec']['template']['spec']['volumes']
-        )
-        self.containers = self._parse_containers(container_component)
-        self.volumes = self._parse_volumes(volume_component)
-    def run(self):
-        replication_controller_body = k8s_client.V1ReplicationController(
+        pod_spec = component['spec']['template']['spec']
+        self.restart_policy = pod_spec.get('restartPolicy')
+        self.node_selector = pod_spec.get('nodeSelector')
+        self.containers = self._parse_containers(pod_spec['containers'])
+        self.volumes = self._parse_volumes(pod_spec.get('volumes'))
+
+    def _get_body(self):
+        return k8s_client.V1ReplicationController(
             api_version=self.api_version,
             kind=self.kind,
             metadata=k8s_client.V1ObjectMeta(
@@ -189,36 +323,28 @@ class K8sReplicationControllerComponent(K8sComponent):
                 )
             )
         )
-        try:
-            api_response = (
-                self.api_instance
-                .create_namespaced_replication_controller(
-                    body=replication_controller_body,
-                    namespace=self.namespace
-                )
-            )
-        except ApiException as e:
-            logging.error(
-                'Exception caught when creating replication controller: %s\n',
-                e
-            )
-        return api_response
 
 
 class K8sStatefulSetComponent(K8sReplicationControllerComponent):
+    resource = 'namespaced_stateful_set'
+
     def __init__(self, component, name, namespace):
         super(K8sStatefulSetComponent, self).__init__(
             component, name, namespace
         )
         self.stateful_set_name = name
-        self.api_instance = k8s_client.AppsV1beta1Api()
-    def run(self):
-        stateful_set_body = k8s_client.V1betaStatefulSet(
+        self.service_name = component['spec']['serviceName']
+        self.api_instance = k8s_clients.get_api(
+            k8s_client.AppsV1beta1Api
+        )
+
+    def _get_body(self):
+        return k8s_client.V1beta1StatefulSet(
             api_version=self.api_version,
             kind=self.kind,
             metadata=k8s_client.V1ObjectMeta(
                 name=self.stateful_set_name,
-                namespace=self.namesace
+                namespace=self.namespace
             ),
             spec=k8s_client.V1beta1StatefulSetSpec(
                 service_name=self.service_name,
@@ -226,7 +352,7 @@ class K8sStatefulSetComponent(K8sReplicationControllerComponent):
                 template=k8s_client.V1PodTemplateSpec(
                     metadata=k8s_client.V1ObjectMeta(
                         labels=self.template_meta['labels'],
-                        annotations=self.template_meta['annotations']
+                        annotations=self.template_meta.get('annotations')
                     ),
                     spec=k8s_client.V1PodSpec(
                         node_selector=self.node_selector,
@@ -236,34 +362,118 @@ class K8sStatefulSetComponent(K8sReplicationControllerComponent):
                 )
             )
         )
-        try:
-            api_response = (
-                self.api_instance.create_namespaced_stateful_set(
-                    body=stateful_set_body,
-                    namespace=self.namespace
+
+
+class K8sDeploymentComponent(K8sReplicationControllerComponent):
+    """Deployment, applied through apps/v1 whatever its apiVersion.
+
+    The selector defaults to the labels of the template, as it did
+    before apps/v1 required it.
+    """
+    resource = 'namespaced_deployment'
+
+    def __init__(self, component, name, namespace):
+        super(K8sDeploymentComponent, self).__init__(
+            component, name, namespace
+        )
+        self.deployment_name = name
+        selector = component['spec'].get('selector')
+        if selector is None:
+            selector = {'matchLabels': self.template_meta['labels']}
+        elif not (
+            'matchLabels' in selector or 'matchExpressions' in selector
+        ):
+            selector = {'matchLabels': selector}
+        self.selector = selector
+        self.api_instance = k8s_clients.get_api(k8s_client.AppsV1Api)
+
+    def _get_body(self):
+        return k8s_client.V1Deployment(
+            api_version='apps/v1',
+            kind=self.kind,
+            metadata=k8s_client.V1ObjectMeta(
+                name=self.deployment_name,
+                namespace=self.namespace
+            ),
+            spec=k8s_client.V1DeploymentSpec(
+                replicas=self.replicas,
+                selector=self.selector,
+                template=k8s_client.V1PodTemplateSpec(
+                    metadata=k8s_client.V1ObjectMeta(
+                        labels=self.template_meta['labels'],
+                        annotations=self.template_meta.get('annotations')
+                    ),
+                    spec=k8s_client.V1PodSpec(
+                        restart_policy=self.restart_policy,
+                        node_selector=self.node_selector,
+                        containers=self.containers,
+                        volumes=self.volumes
+                    )
                 )
             )
-        except ApiException as e:
-            logging.error(
-                'Exception caught when creating stateful set: %s\n',
-                e
+        )
+
+
+class K8sSecretComponent(K8sComponent):
+    """Secret, with stringData sent base64 encoded in data.
+
+    The api server only returns data, so sending stringData would patch
+    the secret on every deploy.
+    """
+    resource = 'namespaced_secret'
+
+    def __init__(self, component, name, namespace):
+        super(K8sSecretComponent, self).__init__(component, name, namespace)
+        self.secret_name = name
+        self.type = component.get('type')
+        self.data = dict(component.get('data') or {})
+        for key, value in (component.get('stringData') or {}).items():
+            self.data[key] = base64.b64encode(
+                value.encode('utf-8') if isinstance(value, unicode)
+                else str(value)
             )
-        return api_response
+
+    def _get_body(self):
+        return k8s_client.V1Secret(
+            api_version=self.api_version,
+            kind=self.kind,
+            metadata=k8s_client.V1ObjectMeta(name=self.secret_name),
+            type=self.type,
+            data=self.data or None
+        )
+
+
+class K8sConfigMapComponent(K8sComponent):
+    resource = 'namespaced_config_map'
+
+    def __init__(self, component, name, namespace):
+        super(K8sConfigMapComponent, self).__init__(
+            component, name, namespace
+        )
+        self.config_map_name = name
+        self.data = component.get('data')
+        self.binary_data = component.get('binaryData')
+
+    def _get_body(self):
+        return k8s_client.V1ConfigMap(
+            api_version=self.api_version,
+            kind=self.kind,
+            metadata=k8s_client.V1ObjectMeta(name=self.config_map_name),
+            data=self.data,
+            binary_data=self.binary_data
+        )
 
 
 class K8sNamespaceComponent(object):
     def __init__(self, namespace):
-        k8s_config.load_kube_config(setting.K8S_CONFIG_FILE)
         self.namespace = namespace
-        self.api_instance = k8s_client.CoreV1Api()
+        self.api_instance = k8s_clients.get_api(k8s_client.CoreV1Api)
         self.api_version = 'v1'
 
     def check_existence(self):
-        namespace_list = self.api_instance.list_namespace().items
-        return self.namespace in map(
-            lambda x:x.metadata.name,
-            namespace_list
-        )
+        return informer.get_store('Namespace').get(
+            None, self.namespace
+        ) is not None
 
     def create_namespace(self):
         namespace_body = k8s_client.V1Namespace(
@@ -273,10 +483,13 @@ class K8sNamespaceComponent(object):
             )
         )
         try:
-            api_response = self.api_instance.create_namespace(namespace_body)
+            return self.api_instance.create_namespace(namespace_body)
         except ApiException as e:
+            if e.status == 409:
+                # created since the cache was last updated.
+                return None
             logging.error(
                 'Exception caught when creating namespace: %s\n',
                 e
             )
-        return api_response
+            raise
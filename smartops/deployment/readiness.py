@@ -0,0 +1,194 @@
+"""Wait for cluster objects to be ready, driven by watch events.
+
+A waiter subscribes to the informers of the kinds it waits for and
+checks an object again only when an event about it arrives, so it
+returns as soon as the last object is ready, without polling the api
+server. Pods are ready when their Ready condition is true, controllers
+when they observed their latest spec and all its replicas are ready,
+namespaces when they exist and are not terminating. A pod which failed
+ends the wait early. Objects just applied are only checked once the
+cache has their applied uid and generation, as it may still hold them
+as they were before.
+"""
+import logging
+import threading
+import time
+
+from smartops.deployment import informer
+from smartops.utils import setting_wrapper as setting
+
+
+NOT_READY = 'not ready'
+FAILED = 'failed'
+
+
+def is_namespace_ready(namespace):
+    return (namespace.get('status') or {}).get('phase') != 'Terminating'
+
+
+def is_pod_failed(pod):
+    return (pod.get('status') or {}).get('phase') == 'Failed'
+
+
+# kind to the check an object of the kind is ready.
+READY_CHECKS = {
+    'Namespace': is_namespace_ready,
+    'Pod': informer.is_pod_ready,
+    'ReplicationController': informer.is_controller_ready,
+    'StatefulSet': informer.is_controller_ready,
+    'Deployment': informer.is_controller_ready,
+}
+# kind to the check an object of the kind will never be ready.
+FAILED_CHECKS = {
+    'Pod': is_pod_failed,
+}
+
+
+class ReadinessWaiter(object):
+    """Waiter for objects given as (kind, namespace, name).
+
+    applied maps keys of objects just applied to the uid and generation
+    returned by the api server; older cached objects are not ready.
+    """
+
+    def __init__(self, keys, context=None, config_file=None, applied=None):
+        for kind, _, _ in keys:
+            if kind not in READY_CHECKS:
+                raise ValueError('readiness of %s is not supported' % kind)
+        self.keys = set(keys)
+        self.context = context
+        self.config_file = config_file
+        self.applied = applied or {}
+        self.condition = threading.Condition()
+        # keys not ready yet to the reason.
+        self.pending = dict([(key, NOT_READY) for key in self.keys])
+
+    def _check(self, kind, obj):
+        """Update the pending reason of the key of obj."""
+        if obj is None:
+            return
+        namespace, name = informer.get_key(obj)
+        key = (kind, namespace, name)
+        if key not in self.keys:
+            return
+        if self._is_stale(key, obj):
+            self.pending[key] = NOT_READY
+        elif READY_CHECKS[kind](obj):
+            self.pending.pop(key, None)
+        elif FAILED_CHECKS.get(kind, lambda obj: False)(obj):
+            self.pending[key] = FAILED
+        else:
+            self.pending[key] = NOT_READY
+
+    def _is_stale(self, key, obj):
+        """Check if obj is older than the object applied for key."""
+        applied = self.applied.get(key)
+        if not applied:
+            return False
+        metadata = obj.get('metadata') or {}
+        return (
+            metadata.get('uid') != applied['uid'] or
+            metadata.get('generation', 0) < applied['generation']
+        )
+
+    def _check_store(self, kind, store):
+        for key in self.keys:
+            if key[0] != kind:
+                continue
+            obj = store.get(key[1], key[2])
+            if obj is None:
+                self.pending[key] = NOT_READY
+            else:
+                self._check(kind, obj)
+
+    def _get_handler(self, kind, store):
+        def _handle(event_type, obj):
+            with self.condition:
+                if event_type == informer.SYNCED:
+                    self._check_store(kind, store)
+                elif event_type == informer.DELETED:
+                    key = (kind,) + informer.get_key(obj)
+                    if key in self.keys:
+                        self.pending[key] = NOT_READY
+                else:
+                    self._check(kind, obj)
+                self.condition.notify_all()
+        return _handle
+
+    def _is_done(self):
+        return not self.pending or FAILED in self.pending.values()
+
+    def wait(self, timeout=None):
+        """Wait until every object is ready, one failed or timeout.
+
+        timeout defaults to setting.DEPLOY_READY_TIMEOUT seconds. Returns
+        the keys not ready to the reason, empty when all are ready.
+        """
+        if timeout is None:
+            timeout = setting.DEPLOY_READY_TIMEOUT
+        deadline = time.time() + timeout
+        handlers = []
+        try:
+            for kind in sorted(set([key[0] for key in self.keys])):
+                kind_informer = informer.get_informer(
+                    kind, self.context, self.config_file
+                )
+                handler = self._get_handler(kind, kind_informer.store)
+                # events after the check below are sent to the handler.
+                with kind_informer.store.lock:
+                    kind_informer.add_handler(handler)
+                    handlers.append((kind_informer, handler))
+                    with self.condition:
+                        self._check_store(kind, kind_informer.store)
+            with self.condition:
+                while not self._is_done():
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                pending = dict(self.pending)
+        finally:
+            for kind_informer, handler in handlers:
+                kind_informer.remove_handler(handler)
+        if pending:
+            logging.info('objects not ready: %s', pending)
+        return pending
+
+
+def wait_until_ready(keys, timeout=None, context=None, config_file=None,
+                     applied=None):
+    """Wait for objects given as (kind, namespace, name) to be ready.
+
+    Returns the keys not ready to the reason, see ReadinessWaiter.wait.
+    """
+    return ReadinessWaiter(keys, context, config_file, applied).wait(timeout)
+
+
+def wait_until_deleted(kind, namespace, name, timeout=None, context=None,
+                       config_file=None):
+    """Wait for an object to be deleted from the informer cache.
+
+    timeout defaults to setting.DEPLOY_READY_TIMEOUT seconds. Returns
+    True once the object is gone, False on timeout.
+    """
+    if timeout is None:
+        timeout = setting.DEPLOY_READY_TIMEOUT
+    deleted = threading.Event()
+    kind_informer = informer.get_informer(kind, context, config_file)
+    store = kind_informer.store
+
+    # called with store.lock held, once the store has the event.
+    def _handle(event_type, obj):
+        if store.get(namespace, name) is None:
+            deleted.set()
+
+    with store.lock:
+        kind_informer.add_handler(_handle)
+        _handle(None, None)
+    try:
+        deleted.wait(timeout)
+    finally:
+        kind_informer.remove_handler(_handle)
+    if not deleted.is_set():
+        logging.info('%s %s/%s not deleted', kind, namespace, name)
+    return deleted.is_set()
@@ -7,16 +7,43 @@ from celery.signals import setup_logging
 from smartops.actions import deploy
 from smartops.db.handlers import database
 from smartops.db.handlers import app as app_handler
+from smartops.db.handlers import blueprint as blueprint_handler
+from smartops.db.handlers import blueprint_cache
 from smartops.tasks.client import celery
 #from smartops.utils import flags
 from smartops.utils import logsetting
 from smartops.utils import setting_wrapper as setting
 
 
+def _resolve_blueprint(blueprint):
+    # the api sends the content hash of blueprints stored with one.
+    if isinstance(blueprint, basestring):
+        return blueprint_cache.get_documents(blueprint)
+    return blueprint
+
+
+def _get_blueprint_changes(app_id, blueprint):
+    # only the blueprint the task was sent for can be deployed
+    # incrementally and recorded as deployed.
+    if not isinstance(blueprint, basestring):
+        return None, None
+    revision, content_hash, changes = (
+        blueprint_handler.get_blueprint_changes_by_app_id(app_id)
+    )
+    if content_hash != blueprint:
+        return None, None
+    return revision, changes
+
+
 @celery.task(name='smartops.tasks.deploy_app')
 def deploy_app(app_id, entrypoint, blueprint, test_plan):
     try:
-        deploy.deploy(app_id, entrypoint, blueprint, test_plan)
+        revision, changes = _get_blueprint_changes(app_id, blueprint)
+        blueprint = _resolve_blueprint(blueprint)
+        deploy.deploy(
+            app_id, entrypoint, blueprint, test_plan,
+            changes=changes, revision=revision
+        )
     except Exception as error:
         logging.exception(error)
 
@@ -24,6 +51,7 @@ def deploy_app(app_id, entrypoint, blueprint, test_plan):
 @celery.task(name='smartops.tasks.deploy_capacity_planner')
 def deploy_capacity_planner(app_id, entrypoint, blueprint, test_plan):
     try:
+        blueprint = _resolve_blueprint(blueprint)
         deploy.deploy_capacity_planner(app_id, entrypoint, blueprint, test_plan)
     except Exception as error:
         logging.exception(error)
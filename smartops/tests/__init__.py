@@ -0,0 +1,13 @@
+"""Unit tests of smartops.
+
+Run from the top of the repository with:
+    python -m unittest discover -s smartops/tests -t .
+"""
+import os
+
+
+# the settings are loaded on import, so point them at the test setting
+# before any smartops module is imported.
+os.environ.setdefault(
+    'SMARTOPS_SETTING', os.path.join(os.path.dirname(__file__), 'setting')
+)
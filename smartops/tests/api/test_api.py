@@ -0,0 +1,90 @@
+import simplejson as json
+import unittest
+
+from smartops.db.handlers import cache
+from smartops.db.handlers import database
+from smartops.db.handlers import sla as sla_handler
+
+
+class TestConditionalGet(unittest.TestCase):
+    def setUp(self):
+        database.init('sqlite://')
+        database.create_db()
+        cache.init()
+        from smartops.app import app
+        self.client = app.test_client()
+        resp = self.client.post(
+            '/apps', data=json.dumps({'name': 'app1'}),
+            content_type='application/json'
+        )
+        self.app_id = json.loads(resp.data)['id']
+        self._update_sla(200)
+
+    def tearDown(self):
+        database.drop_db()
+
+    def _update_sla(self, latency):
+        resp = self.client.put(
+            '/apps/%s/sla' % self.app_id,
+            data=json.dumps({'sla': {'latency': latency, 'error_rate': 1}}),
+            content_type='application/json'
+        )
+        self.assertEqual(resp.status_code, 200)
+
+    def _get_sla(self, etag=None, query=''):
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = '"%s"' % etag
+        return self.client.get(
+            '/apps/%s/sla%s' % (self.app_id, query), headers=headers
+        )
+
+    def test_not_modified(self):
+        resp = self._get_sla()
+        self.assertEqual(resp.status_code, 200)
+        etag, _ = resp.get_etag()
+        self.assertTrue(etag)
+        resp = self._get_sla(etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.data, '')
+        self.assertEqual(resp.get_etag()[0], etag)
+
+    def test_not_modified_without_loading(self):
+        etag, _ = self._get_sla().get_etag()
+        getter = sla_handler.get_sla_by_app_id
+        get_versioned = getter.get_versioned
+        loads = []
+
+        def _get_versioned(app_id):
+            loads.append(app_id)
+            return get_versioned(app_id)
+
+        getter.get_versioned = _get_versioned
+        try:
+            self.assertEqual(self._get_sla(etag).status_code, 304)
+            self.assertEqual(loads, [])
+            self.assertEqual(self._get_sla('other').status_code, 200)
+            self.assertEqual(loads, [self.app_id])
+        finally:
+            getter.get_versioned = get_versioned
+
+    def test_modified(self):
+        etag, _ = self._get_sla().get_etag()
+        self._update_sla(300)
+        resp = self._get_sla(etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(json.loads(resp.data)['latency'], 300)
+        self.assertNotEqual(resp.get_etag()[0], etag)
+        self.assertEqual(
+            self._get_sla(resp.get_etag()[0]).status_code, 304
+        )
+
+    def test_etag_of_representation(self):
+        etag, _ = self._get_sla().get_etag()
+        resp = self._get_sla(etag, '?pretty=1')
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp.get_etag()[0], etag)
+
+
+if __name__ == '__main__':
+    unittest.main()
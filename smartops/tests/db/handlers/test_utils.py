@@ -0,0 +1,95 @@
+import datetime
+import unittest
+
+from smartops.db import exception
+from smartops.db import models
+from smartops.db.handlers import database
+from smartops.db.handlers import utils
+
+
+class TestListDbObjectsByPage(unittest.TestCase):
+    def setUp(self):
+        database.init('sqlite://')
+        database.create_db()
+        updated_at = datetime.datetime(2020, 1, 1)
+        with database.session() as session:
+            for index in range(7):
+                app = models.App(name='app%s' % index)
+                session.add(app)
+                session.flush()
+                # some apps are never updated and some at once.
+                app.updated_at = None if index % 3 == 0 else updated_at
+                app.cpu_cores = None if index % 2 == 0 else index % 3
+
+    def tearDown(self):
+        database.drop_db()
+
+    def _list_all(self, keys, limit, after=None, **filters):
+        ids = []
+        with database.session() as session:
+            while True:
+                apps, after = utils.list_db_objects_by_page(
+                    session, models.App, keys=keys, limit=limit,
+                    after=after, **filters
+                )
+                ids.extend([app.id for app in apps])
+                if after is None:
+                    return ids
+
+    def _list_sorted(self, key, null_value):
+        with database.session() as session:
+            apps = session.query(models.App).all()
+            return [app.id for app in sorted(apps, key=lambda app: (
+                null_value if getattr(app, key) is None
+                else getattr(app, key),
+                app.id
+            ))]
+
+    def test_by_id(self):
+        self.assertEqual(self._list_all(None, 3), range(1, 8))
+        self.assertEqual(self._list_all(['id'], 7), range(1, 8))
+        self.assertEqual(self._list_all(['id'], 10), range(1, 8))
+
+    def test_nullable_datetime(self):
+        expected = self._list_sorted(
+            'updated_at', datetime.datetime(1970, 1, 1)
+        )
+        for limit in range(1, 8):
+            self.assertEqual(
+                self._list_all(['updated_at', 'id'], limit), expected
+            )
+
+    def test_nullable_number(self):
+        expected = self._list_sorted('cpu_cores', 0)
+        for limit in range(1, 8):
+            self.assertEqual(
+                self._list_all(['cpu_cores', 'id'], limit), expected
+            )
+
+    def test_filters(self):
+        self.assertEqual(
+            self._list_all(['id'], 1, name=['app1', 'app4']), [2, 5]
+        )
+
+    def test_unknown_filter(self):
+        self.assertRaises(
+            exception.InvalidParameter, self._list_all, ['id'], 1, nme='app1'
+        )
+
+    def test_unknown_key(self):
+        self.assertRaises(
+            exception.InvalidParameter, self._list_all, ['status'], 1
+        )
+
+    def test_invalid_cursor(self):
+        self.assertRaises(
+            exception.InvalidParameter, self._list_all, ['id'], 1, 'abc'
+        )
+        self.assertRaises(
+            exception.InvalidParameter, self._list_all, ['id'], 1,
+            utils.encode_cursor(models.App('app0'), ['name', 'id'])
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import copy
+import unittest
+
+from smartops.deployment import k8s_components
+
+
+class TestIsSubset(unittest.TestCase):
+    def test_dict(self):
+        self.assertTrue(k8s_components.is_subset(
+            {'a': 1}, {'a': 1, 'b': 2}
+        ))
+        self.assertFalse(k8s_components.is_subset(
+            {'a': 1, 'c': 3}, {'a': 1, 'b': 2}
+        ))
+        self.assertFalse(k8s_components.is_subset({'a': 1}, {'a': 2}))
+        self.assertFalse(k8s_components.is_subset({'a': 1}, [1]))
+
+    def test_empty_list_missing(self):
+        self.assertTrue(k8s_components.is_subset(
+            {'a': 1, 'volumes': []}, {'a': 1}
+        ))
+        self.assertFalse(k8s_components.is_subset(
+            {'volumes': [{'name': 'v'}]}, {}
+        ))
+
+    def test_list_by_merge_key(self):
+        live = [
+            {'name': 'token', 'secret': {}},
+            {'name': 'data', 'emptyDir': {}},
+        ]
+        self.assertTrue(k8s_components.is_subset(
+            [{'name': 'data', 'emptyDir': {}}], live
+        ))
+        self.assertFalse(k8s_components.is_subset(
+            [{'name': 'cache', 'emptyDir': {}}], live
+        ))
+        self.assertFalse(k8s_components.is_subset(
+            [{'name': 'data', 'hostPath': {'path': '/'}}], live
+        ))
+        self.assertTrue(k8s_components.is_subset(
+            [{'containerPort': 80}],
+            [{'containerPort': 80, 'protocol': 'TCP'}]
+        ))
+
+    def test_list_by_index(self):
+        self.assertTrue(k8s_components.is_subset(['a', 'b'], ['a', 'b']))
+        self.assertFalse(k8s_components.is_subset(['b', 'a'], ['a', 'b']))
+        self.assertFalse(k8s_components.is_subset(['a'], ['a', 'b']))
+
+    def test_quantities(self):
+        self.assertTrue(k8s_components.is_subset(
+            {'limits': {'cpu': 0.5, 'memory': '1Gi'}},
+            {'limits': {'cpu': '500m', 'memory': '1024Mi'}},
+            ('resources',)
+        ))
+        self.assertFalse(k8s_components.is_subset(
+            {'limits': {'cpu': 1}}, {'limits': {'cpu': '500m'}}
+        ))
+        self.assertFalse(k8s_components.is_subset(
+            {'limits': {'cpu': 'x'}}, {'limits': {'cpu': '500m'}}
+        ))
+
+    def test_numbers_as_strings(self):
+        self.assertTrue(k8s_components.is_subset(
+            {'value': 8080}, {'value': '8080'}
+        ))
+        self.assertFalse(k8s_components.is_subset(
+            {'value': True}, {'value': 'True'}
+        ))
+
+
+class TestGetPatch(unittest.TestCase):
+    def test_unchanged(self):
+        live = {'spec': {'replicas': 1, 'paused': False}, 'status': {}}
+        self.assertEqual(
+            k8s_components.get_patch(live, {'spec': {'replicas': 1}}), {}
+        )
+
+    def test_changed(self):
+        live = {
+            'metadata': {'name': 'a', 'uid': 'u'},
+            'spec': {'replicas': 1, 'paused': False},
+        }
+        desired = {'metadata': {'name': 'a'}, 'spec': {'replicas': 2}}
+        self.assertEqual(
+            k8s_components.get_patch(live, desired),
+            {'spec': {'replicas': 2}}
+        )
+
+    def test_list_sent_whole(self):
+        live = {'containers': [{'name': 'c', 'image': 'a:1'}]}
+        desired = {'containers': [{'name': 'c', 'image': 'a:2'}]}
+        self.assertEqual(
+            k8s_components.get_patch(live, desired), desired
+        )
+
+    def test_missing_key(self):
+        self.assertEqual(
+            k8s_components.get_patch({}, {'data': {'a': 'b'}}),
+            {'data': {'a': 'b'}}
+        )
+
+
+class TestComponentPatch(unittest.TestCase):
+    """The body of a component against the object the api returns."""
+
+    def _get_body(self, component):
+        return component.api_instance.api_client.sanitize_for_serialization(
+            component._get_body()
+        )
+
+    def test_deployment_unchanged(self):
+        component = k8s_components.K8sDeploymentComponent({
+            'apiVersion': 'apps/v1',
+            'kind': 'Deployment',
+            'spec': {
+                'replicas': 2,
+                'template': {
+                    'metadata': {'labels': {'app': 'web'}},
+                    'spec': {
+                        'containers': [{
+                            'name': 'web',
+                            'image': 'web:1',
+                            'ports': [{'containerPort': 80}],
+                            'resources': {'limits': {'cpu': 1}},
+                        }],
+                        'volumes': [],
+                    },
+                },
+            },
+        }, 'web', 'default')
+        body = self._get_body(component)
+        # what the api server returns: defaulted fields, normalized
+        # quantities, no empty lists and the token volume mounted.
+        live = copy.deepcopy(body)
+        live['metadata'].update({'uid': 'u', 'generation': 3})
+        live['spec']['template']['spec'].pop('volumes', None)
+        container = live['spec']['template']['spec']['containers'][0]
+        container['resources']['limits']['cpu'] = '1000m'
+        container['ports'][0]['protocol'] = 'TCP'
+        container['volumeMounts'] = [{
+            'name': 'token',
+            'mountPath': '/var/run/secrets/kubernetes.io/serviceaccount',
+        }]
+        live['spec']['template']['spec']['volumes'] = [
+            {'name': 'token', 'secret': {'secretName': 'token'}}
+        ]
+        live['status'] = {'observedGeneration': 3}
+        self.assertEqual(k8s_components.get_patch(live, body), {})
+
+        component.replicas = 3
+        self.assertEqual(
+            k8s_components.get_patch(live, self._get_body(component)),
+            {'spec': {'replicas': 3}}
+        )
+
+    def test_secret_encoded(self):
+        component = k8s_components.K8sSecretComponent({
+            'apiVersion': 'v1',
+            'kind': 'Secret',
+            'stringData': {'password': 'secret'},
+        }, 'db', 'default')
+        self.assertEqual(
+            self._get_body(component)['data'], {'password': 'c2VjcmV0'}
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
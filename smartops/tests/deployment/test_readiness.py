@@ -0,0 +1,205 @@
+import threading
+import unittest
+
+from smartops.deployment import informer
+from smartops.deployment import readiness
+
+
+def _make_pod(name, phase='Running', ready=False, uid='pod-uid'):
+    return {
+        'metadata': {'namespace': 'default', 'name': name, 'uid': uid},
+        'status': {
+            'phase': phase,
+            'conditions': [
+                {'type': 'Ready', 'status': 'True' if ready else 'False'}
+            ],
+        },
+    }
+
+
+def _make_deployment(name, generation, observed_generation, ready_replicas,
+                     uid='deployment-uid'):
+    return {
+        'metadata': {
+            'namespace': 'default', 'name': name, 'uid': uid,
+            'generation': generation,
+        },
+        'spec': {'replicas': 2},
+        'status': {
+            'observedGeneration': observed_generation,
+            'readyReplicas': ready_replicas,
+        },
+    }
+
+
+class FakeInformer(informer.Informer):
+    """Informer whose events are sent by the test, never started."""
+
+    def send(self, event_type, obj):
+        with self.store.lock:
+            if event_type == informer.DELETED:
+                self.store.delete(obj)
+            else:
+                self.store.upsert(obj)
+            self._notify(event_type, obj)
+
+    def send_later(self, event_type, obj, delay=0.05):
+        timer = threading.Timer(delay, self.send, (event_type, obj))
+        timer.start()
+        return timer
+
+
+class TestReadinessWaiter(unittest.TestCase):
+    def setUp(self):
+        self.informers = {}
+        self.get_informer = informer.get_informer
+        informer.get_informer = self._get_informer
+
+    def tearDown(self):
+        informer.get_informer = self.get_informer
+
+    def _get_informer(self, kind, context=None, config_file=None):
+        if kind not in self.informers:
+            self.informers[kind] = FakeInformer(kind, context, config_file)
+        return self.informers[kind]
+
+    def test_unsupported_kind(self):
+        self.assertRaises(
+            ValueError, readiness.ReadinessWaiter,
+            [('Job', 'default', 'job')]
+        )
+
+    def test_ready_in_store(self):
+        self._get_informer('Pod').send(
+            informer.ADDED, _make_pod('web', ready=True)
+        )
+        self.assertEqual(
+            readiness.wait_until_ready([('Pod', 'default', 'web')], 1), {}
+        )
+
+    def test_ready_on_event(self):
+        pods = self._get_informer('Pod')
+        pods.send(informer.ADDED, _make_pod('web'))
+        timer = pods.send_later(
+            informer.MODIFIED, _make_pod('web', ready=True)
+        )
+        self.assertEqual(
+            readiness.wait_until_ready([('Pod', 'default', 'web')], 5), {}
+        )
+        timer.join()
+        self.assertEqual(pods.handlers, [])
+
+    def test_failed(self):
+        pods = self._get_informer('Pod')
+        pods.send(informer.ADDED, _make_pod('web'))
+        timer = pods.send_later(
+            informer.MODIFIED, _make_pod('web', phase='Failed')
+        )
+        keys = [('Pod', 'default', 'web'), ('Pod', 'default', 'db')]
+        self.assertEqual(
+            readiness.wait_until_ready(keys, 5),
+            {
+                ('Pod', 'default', 'web'): readiness.FAILED,
+                ('Pod', 'default', 'db'): readiness.NOT_READY,
+            }
+        )
+        timer.join()
+
+    def test_timeout(self):
+        self._get_informer('Pod').send(informer.ADDED, _make_pod('web'))
+        self.assertEqual(
+            readiness.wait_until_ready([('Pod', 'default', 'web')], 0.1),
+            {('Pod', 'default', 'web'): readiness.NOT_READY}
+        )
+
+    def test_deleted(self):
+        pods = self._get_informer('Pod')
+        pods.send(informer.ADDED, _make_pod('web', ready=True))
+        waiter = readiness.ReadinessWaiter([('Pod', 'default', 'web')])
+        handler = waiter._get_handler('Pod', pods.store)
+        handler(informer.DELETED, _make_pod('web', ready=True))
+        self.assertEqual(
+            waiter.pending, {('Pod', 'default', 'web'): readiness.NOT_READY}
+        )
+
+    def test_controller_observed_generation(self):
+        deployments = self._get_informer('Deployment')
+        deployments.send(informer.ADDED, _make_deployment('web', 2, 1, 2))
+        timer = deployments.send_later(
+            informer.MODIFIED, _make_deployment('web', 2, 2, 2)
+        )
+        key = ('Deployment', 'default', 'web')
+        self.assertEqual(readiness.wait_until_ready([key], 5), {})
+        timer.join()
+
+    def test_stale_generation(self):
+        # the cache still has the ready object as it was before the
+        # patch, which bumped its generation to 3.
+        deployments = self._get_informer('Deployment')
+        deployments.send(informer.ADDED, _make_deployment('web', 2, 2, 2))
+        key = ('Deployment', 'default', 'web')
+        applied = {key: {'uid': 'deployment-uid', 'generation': 3}}
+        self.assertEqual(
+            readiness.wait_until_ready([key], 0.1, applied=applied),
+            {key: readiness.NOT_READY}
+        )
+        timer = deployments.send_later(
+            informer.MODIFIED, _make_deployment('web', 3, 3, 2)
+        )
+        self.assertEqual(
+            readiness.wait_until_ready([key], 5, applied=applied), {}
+        )
+        timer.join()
+
+    def test_stale_uid(self):
+        # the cache still has the object deleted before it was created
+        # again.
+        pods = self._get_informer('Pod')
+        pods.send(informer.ADDED, _make_pod('web', ready=True, uid='old'))
+        key = ('Pod', 'default', 'web')
+        applied = {key: {'uid': 'new', 'generation': 0}}
+        self.assertEqual(
+            readiness.wait_until_ready([key], 0.1, applied=applied),
+            {key: readiness.NOT_READY}
+        )
+
+    def test_wait_until_deleted(self):
+        pods = self._get_informer('Pod')
+        pods.send(informer.ADDED, _make_pod('web'))
+        self.assertFalse(
+            readiness.wait_until_deleted('Pod', 'default', 'web', 0.1)
+        )
+        timer = pods.send_later(informer.DELETED, _make_pod('web'))
+        self.assertTrue(
+            readiness.wait_until_deleted('Pod', 'default', 'web', 5)
+        )
+        timer.join()
+        self.assertEqual(pods.handlers, [])
+
+
+class TestReadyChecks(unittest.TestCase):
+    def test_pod(self):
+        self.assertTrue(informer.is_pod_ready(_make_pod('web', ready=True)))
+        self.assertFalse(informer.is_pod_ready(_make_pod('web')))
+        self.assertFalse(informer.is_pod_ready({}))
+
+    def test_controller(self):
+        self.assertTrue(informer.is_controller_ready(
+            _make_deployment('web', 2, 2, 2)
+        ))
+        self.assertFalse(informer.is_controller_ready(
+            _make_deployment('web', 2, 1, 2)
+        ))
+        self.assertFalse(informer.is_controller_ready(
+            _make_deployment('web', 2, 2, 1)
+        ))
+
+    def test_namespace(self):
+        self.assertTrue(readiness.is_namespace_ready({'status': {}}))
+        self.assertFalse(readiness.is_namespace_ready(
+            {'status': {'phase': 'Terminating'}}
+        ))
+
+
+if __name__ == '__main__':
+    unittest.main()
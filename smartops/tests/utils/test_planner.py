@@ -0,0 +1,43 @@
+import random
+import unittest
+
+from smartops.utils import planner
+
+
+def _dominates(row, other):
+    return all([
+        value <= other_value for value, other_value in zip(row, other)
+    ]) and any([
+        value < other_value for value, other_value in zip(row, other)
+    ])
+
+
+class TestGetParetoFront(unittest.TestCase):
+    def test_empty(self):
+        self.assertEqual(planner.get_pareto_front([]), [])
+
+    def test_front(self):
+        objectives = [[1, 2], [2, 1], [2, 2], [1, 2], [0, 3]]
+        self.assertEqual(
+            planner.get_pareto_front(objectives), [4, 0, 3, 1]
+        )
+
+    def test_single_objective(self):
+        self.assertEqual(planner.get_pareto_front([[3], [1], [2]]), [1])
+
+    def test_matches_pairwise_dominance(self):
+        rng = random.Random(0)
+        objectives = [
+            [rng.randint(0, 9) for _ in range(3)] for _ in range(200)
+        ]
+        expected = set([
+            index for index, row in enumerate(objectives)
+            if not any([_dominates(other, row) for other in objectives])
+        ])
+        front = planner.get_pareto_front(objectives)
+        self.assertEqual(len(front), len(set(front)))
+        self.assertEqual(set(front), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
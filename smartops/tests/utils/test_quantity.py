@@ -0,0 +1,94 @@
+import decimal
+import unittest
+
+import numpy
+
+from smartops.utils import quantity
+
+
+class TestParseQuantity(unittest.TestCase):
+    def test_suffixes(self):
+        self.assertEqual(
+            quantity.parse_quantity('500m'), decimal.Decimal('0.5')
+        )
+        self.assertEqual(quantity.parse_quantity('2k'), 2000)
+        self.assertEqual(quantity.parse_quantity('1Ki'), 1024)
+        self.assertEqual(quantity.parse_quantity('2Gi'), 2 * 2 ** 30)
+        self.assertEqual(quantity.parse_quantity('1E'), 10 ** 18)
+        self.assertEqual(quantity.parse_quantity('1Ei'), 2 ** 60)
+
+    def test_exponent(self):
+        self.assertEqual(quantity.parse_quantity('1e3'), 1000)
+        self.assertEqual(
+            quantity.parse_quantity('12E-1'), decimal.Decimal('1.2')
+        )
+
+    def test_numbers(self):
+        self.assertEqual(
+            quantity.parse_quantity(0.5), decimal.Decimal('0.5')
+        )
+        self.assertEqual(quantity.parse_quantity(2), 2)
+        self.assertEqual(
+            quantity.parse_quantity(' .5 '), decimal.Decimal('0.5')
+        )
+
+    def test_invalid(self):
+        for value in ['', 'abc', '1x', '1KiB', '--1', None, True, []]:
+            self.assertRaises(ValueError, quantity.parse_quantity, value)
+
+
+class TestParseMilli(unittest.TestCase):
+    def test_milli(self):
+        self.assertEqual(quantity.parse_milli('500m'), 500)
+        self.assertEqual(quantity.parse_milli('1'), 1000)
+        self.assertEqual(quantity.parse_milli('1Ki'), 1024000)
+
+    def test_round_up(self):
+        self.assertEqual(quantity.parse_milli('1n'), 1)
+        self.assertEqual(quantity.parse_milli('1500u'), 2)
+        self.assertEqual(quantity.parse_milli('-1500u'), -1)
+
+    def test_memoized(self):
+        quantity.parse_milli('300m')
+        self.assertEqual(quantity.MEMO['300m'], 300)
+
+    def test_cpu_and_memory(self):
+        self.assertEqual(quantity.parse_cpu('250m'), 0.25)
+        self.assertEqual(quantity.parse_memory('1Mi'), 2 ** 20)
+        self.assertEqual(quantity.parse_memory('1500m'), 2)
+
+
+class TestQuantityArrays(unittest.TestCase):
+    def test_parse_array(self):
+        milli = quantity.parse_array(['1', '500m', '1'])
+        self.assertEqual(milli.dtype, numpy.int64)
+        self.assertEqual(milli.tolist(), [1000, 500, 1000])
+
+    def test_parse_array_out_of_int64(self):
+        milli = quantity.parse_array(['16Ei', '1'])
+        self.assertEqual(milli.dtype, object)
+        self.assertEqual(milli.tolist(), [16 * 2 ** 60 * 1000, 1000])
+
+    def test_sum_quantities(self):
+        self.assertEqual(quantity.sum_quantities(['1', '500m']), 1500)
+        self.assertEqual(
+            quantity.sum_quantities(['1', '500m'], [2, 3]), 3500
+        )
+        self.assertEqual(quantity.sum_quantities([]), 0)
+
+    def test_sum_quantities_overflow(self):
+        self.assertEqual(
+            quantity.sum_quantities(['8Ei', '8Ei']), 16 * 2 ** 60 * 1000
+        )
+
+    def test_compare_quantities(self):
+        self.assertEqual(
+            quantity.compare_quantities(
+                ['1', '1000m', '2Gi'], ['999m', '1', '3Gi']
+            ).tolist(),
+            [1, 0, -1]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
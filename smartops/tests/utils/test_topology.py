@@ -0,0 +1,82 @@
+import unittest
+
+from smartops.utils import topology
+
+
+def _make_graph(calls, workloads=None):
+    """Make a graph of services named by calls, one workload each."""
+    names = sorted(calls)
+    workloads = workloads or {}
+    graph = {'workloads': [], 'services': []}
+    for name in names:
+        workload_indexes = []
+        for workload_name in workloads.get(name, [name]):
+            workload_indexes.append(len(graph['workloads']))
+            graph['workloads'].append({'name': workload_name})
+        graph['services'].append({
+            'name': name,
+            'workloads': workload_indexes,
+            'calls': [names.index(callee) for callee in calls[name]]
+        })
+    return graph
+
+
+class TestGetPlanVisits(unittest.TestCase):
+    def test_chain(self):
+        graph = _make_graph({'a': ['b'], 'b': ['c'], 'c': []})
+        self.assertEqual(
+            topology.get_plan_visits(graph),
+            {'a': 1.0, 'b': 1.0, 'c': 1.0}
+        )
+
+    def test_diamond(self):
+        graph = _make_graph({
+            'a': ['b', 'c'], 'b': ['d'], 'c': ['d'], 'd': []
+        })
+        self.assertEqual(
+            topology.get_plan_visits(graph),
+            {'a': 1.0, 'b': 1.0, 'c': 1.0, 'd': 2.0}
+        )
+
+    def test_cycle(self):
+        graph = _make_graph({'a': ['b'], 'b': ['c'], 'c': ['a', 'b']})
+        self.assertEqual(
+            topology.get_plan_visits(graph, 'a'),
+            {'a': 1.0, 'b': 1.0, 'c': 1.0}
+        )
+
+    def test_entrypoint(self):
+        graph = _make_graph({'a': ['b'], 'b': ['c'], 'c': []})
+        self.assertEqual(
+            topology.get_plan_visits(graph, 'b'),
+            {'a': 0.0, 'b': 1.0, 'c': 1.0}
+        )
+
+    def test_unknown_entrypoint(self):
+        graph = _make_graph({'a': ['c'], 'b': ['c'], 'c': []})
+        self.assertEqual(
+            topology.get_plan_visits(graph, 'x'),
+            {'a': 1.0, 'b': 1.0, 'c': 2.0}
+        )
+
+    def test_workloads_share_visits(self):
+        graph = _make_graph(
+            {'a': ['b'], 'b': []}, workloads={'b': ['b1rc', 'b2rc']}
+        )
+        self.assertEqual(
+            topology.get_plan_visits(graph),
+            {'a': 1.0, 'b1': 0.5, 'b2': 0.5}
+        )
+
+    def test_long_chain(self):
+        names = ['s%04d' % index for index in range(2000)]
+        calls = dict([
+            (name, names[index + 1:index + 2])
+            for index, name in enumerate(names)
+        ])
+        visits = topology.get_plan_visits(_make_graph(calls))
+        self.assertEqual(visits, dict([(name, 1.0) for name in names]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+"""Structural diff between two revisions of blueprint documents.
+
+Documents are matched by kind and metadata name. The diff is a json
+compatible list with an entry per document:
+    {'kind': ..., 'name': ..., 'change': ..., 'paths': [...]}
+where change is one of ADDED, REMOVED, CHANGED and UNCHANGED, and paths
+are the json pointers, relative to the document, of the values changed.
+"""
+
+
+ADDED = 'added'
+REMOVED = 'removed'
+CHANGED = 'changed'
+UNCHANGED = 'unchanged'
+
+
+def get_document_key(document):
+    """Get the (kind, name) identifying document in a blueprint."""
+    return (
+        document.get('kind'), (document.get('metadata') or {}).get('name')
+    )
+
+
+def _escape_pointer_token(token):
+    return unicode(token).replace('~', '~0').replace('/', '~1')
+
+
+def diff_values(old, new, path=''):
+    """Get json pointers of the values differing between old and new."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        paths = []
+        for key in sorted(set(old) | set(new)):
+            key_path = '%s/%s' % (path, _escape_pointer_token(key))
+            if key not in old or key not in new:
+                paths.append(key_path)
+            else:
+                paths.extend(diff_values(old[key], new[key], key_path))
+        return paths
+    if isinstance(old, list) and isinstance(new, list):
+        paths = []
+        for index in range(max(len(old), len(new))):
+            index_path = '%s/%s' % (path, index)
+            if index >= len(old) or index >= len(new):
+                paths.append(index_path)
+            else:
+                paths.extend(diff_values(old[index], new[index], index_path))
+        return paths
+    if old != new:
+        return [path]
+    return []
+
+
+def diff_documents(old_documents, new_documents):
+    """Diff documents of two revisions of a blueprint.
+
+    Entries of the new documents come first in their order, followed
+    by the removed documents in their old order.
+    """
+    old_by_key = dict([
+        (get_document_key(document), document)
+        for document in old_documents
+    ])
+    new_keys = set()
+    diff = []
+    for document in new_documents:
+        key = get_document_key(document)
+        new_keys.add(key)
+        kind, name = key
+        if key not in old_by_key:
+            diff.append({
+                'kind': kind, 'name': name, 'change': ADDED, 'paths': []
+            })
+            continue
+        paths = diff_values(old_by_key[key], document)
+        diff.append({
+            'kind': kind, 'name': name,
+            'change': CHANGED if paths else UNCHANGED,
+            'paths': paths
+        })
+    for document in old_documents:
+        key = get_document_key(document)
+        if key in new_keys:
+            continue
+        new_keys.add(key)
+        kind, name = key
+        diff.append({
+            'kind': kind, 'name': name, 'change': REMOVED, 'paths': []
+        })
+    return diff
+
+
+def get_keys(diff, changes):
+    """Get (kind, name) of the documents in diff with change in changes."""
+    return set([
+        (entry['kind'], entry['name'])
+        for entry in diff if entry['change'] in changes
+    ])
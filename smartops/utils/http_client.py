@@ -0,0 +1,144 @@
+"""Outbound http client shared by the api handlers."""
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from smartops.utils import setting_wrapper as setting
+
+
+class _Call(object):
+    """An upstream fetch which concurrent callers of one url wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class _CacheEntry(object):
+
+    def __init__(self, value, fresh_until, stale_until):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class CachedHttpClient(object):
+    """Http client with keep-alive connection pool and ttl cache.
+
+    Json responses are cached by url for ttl seconds. After that they
+    are still served for stale_ttl seconds while one background fetch
+    revalidates them. Concurrent callers missing the cache for the same
+    url share one upstream fetch.
+    """
+
+    def __init__(
+        self, pool_size=10, timeout=10, ttl=30, stale_ttl=300,
+        max_entries=1000
+    ):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.timeout = timeout
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.cache = {}
+        self.calls = {}
+
+    def get_json(self, url, timeout=None):
+        """Get the json response of url from cache or upstream."""
+        now = time.time()
+        with self.lock:
+            entry = self.cache.get(url)
+            revalidating = url in self.calls
+        if entry and now < entry.fresh_until:
+            return entry.value
+        if entry and now < entry.stale_until:
+            if not revalidating:
+                thread = threading.Thread(
+                    target=self._revalidate, args=(url, timeout)
+                )
+                thread.daemon = True
+                thread.start()
+            return entry.value
+        return self._fetch(url, timeout)
+
+    def invalidate(self, url=None):
+        """Drop the cached response of url, or all if url is None."""
+        with self.lock:
+            if url is None:
+                self.cache.clear()
+            else:
+                self.cache.pop(url, None)
+
+    def _revalidate(self, url, timeout):
+        try:
+            self._fetch(url, timeout)
+        except Exception as error:
+            logging.error('failed to revalidate %s: %s', url, error)
+
+    def _fetch(self, url, timeout):
+        with self.lock:
+            call = self.calls.get(url)
+            leader = call is None
+            if leader:
+                call = self.calls[url] = _Call()
+        if not leader:
+            call.event.wait()
+            if call.error:
+                raise call.error
+            return call.value
+        try:
+            logging.debug('fetching %s', url)
+            resp = self.session.get(url, timeout=timeout or self.timeout)
+            resp.raise_for_status()
+            call.value = resp.json()
+            self._store(url, call.value)
+            return call.value
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.calls[url]
+            call.event.set()
+
+    def _store(self, url, value):
+        now = time.time()
+        with self.lock:
+            if len(self.cache) >= self.max_entries:
+                for cached_url, entry in self.cache.items():
+                    if entry.stale_until <= now:
+                        del self.cache[cached_url]
+                if len(self.cache) >= self.max_entries:
+                    self.cache.clear()
+            self.cache[url] = _CacheEntry(
+                value, now + self.ttl, now + self.ttl + self.stale_ttl
+            )
+
+
+CLIENT = None
+CLIENT_LOCK = threading.Lock()
+
+
+def get_client():
+    """Get the process wide http client configured by settings."""
+    global CLIENT
+    if CLIENT is None:
+        with CLIENT_LOCK:
+            if CLIENT is None:
+                CLIENT = CachedHttpClient(
+                    pool_size=setting.HTTP_CLIENT_POOL_SIZE,
+                    timeout=setting.HTTP_CLIENT_TIMEOUT,
+                    ttl=setting.HTTP_CLIENT_CACHE_TTL,
+                    stale_ttl=setting.HTTP_CLIENT_CACHE_STALE_TTL
+                )
+    return CLIENT
@@ -0,0 +1,67 @@
+"""Parser of multi-document yaml manifests."""
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+class ManifestError(Exception):
+    """Errors found in documents of a manifest.
+
+    errors is a list of (document index, line, message) where index
+    and line count from 1 and line may be None.
+    """
+
+    def __init__(self, errors):
+        super(ManifestError, self).__init__('; '.join([
+            _format_error(index, line, message)
+            for index, line, message in errors
+        ]))
+        self.errors = errors
+
+
+def _format_error(index, line, message):
+    if line is None:
+        return 'document %s: %s' % (index, message)
+    return 'document %s (line %s): %s' % (index, line, message)
+
+
+def iter_documents(stream, max_documents=None):
+    """Parse yaml documents of stream one at a time.
+
+    stream is a string or a file like object. Yields
+    (index, line, document) for each non empty document, where line is
+    the line the document starts at. Raises ManifestError when a
+    document is not valid yaml or there are more than max_documents
+    documents.
+    """
+    loader = SafeLoader(stream)
+    index = 0
+    try:
+        while True:
+            index += 1
+            try:
+                if not loader.check_node():
+                    return
+                if max_documents is not None and index > max_documents:
+                    raise ManifestError([(
+                        index, None,
+                        'more than %s documents' % max_documents
+                    )])
+                node = loader.get_node()
+                document = loader.construct_document(node)
+            except yaml.YAMLError as error:
+                mark = (
+                    getattr(error, 'problem_mark', None) or
+                    getattr(error, 'context_mark', None)
+                )
+                raise ManifestError([(
+                    index, mark.line + 1 if mark else None,
+                    getattr(error, 'problem', None) or str(error)
+                )])
+            if document is not None:
+                yield index, node.start_mark.line + 1, document
+    finally:
+        loader.dispose()
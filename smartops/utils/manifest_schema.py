@@ -0,0 +1,251 @@
+"""Schemas of the kubernetes manifest kinds accepted in blueprints.
+
+Schemas are plain dicts compiled once at import into check functions.
+A schema has a 'type', one of 'object', 'array', 'string', 'integer',
+'quantity', 'map' (of strings) or 'any', and optionally:
+    properties: schemas of the keys of an object.
+    required: keys an object must have.
+    items: schema of the items of an array.
+    min_items: minimum length of an array.
+    enum: values allowed.
+    minimum: minimum of an integer.
+"""
+from smartops.utils import quantity
+
+
+# version of the validation, which parsed blueprints are cached valid
+# for; increment it when schemas or checks change.
+SCHEMA_VERSION = 1
+
+def _escape_pointer_token(token):
+    return unicode(token).replace('~', '~0').replace('/', '~1')
+
+
+def _is_integer(value):
+    return isinstance(value, (int, long)) and not isinstance(value, bool)
+
+
+def _check_string(value):
+    return isinstance(value, basestring)
+
+
+def _check_quantity(value):
+    if _is_integer(value) or isinstance(value, float):
+        if value < 0:
+            return False
+    elif (
+        not isinstance(value, basestring) or
+        quantity.QUANTITY_PATTERN.match(value) is None
+    ):
+        return False
+    # larger ones could not be summed in int64 milli-units or stored.
+    return quantity.parse_milli(value) <= quantity.MAX_MILLI
+
+
+def _check_map(value):
+    return isinstance(value, dict) and all([
+        isinstance(key, basestring) and isinstance(item, basestring)
+        for key, item in value.items()
+    ])
+
+
+TYPE_CHECKS = {
+    'object': (lambda value: isinstance(value, dict), 'an object'),
+    'array': (lambda value: isinstance(value, list), 'an array'),
+    'string': (_check_string, 'a string'),
+    'integer': (_is_integer, 'an integer'),
+    'quantity': (_check_quantity, 'a quantity'),
+    'map': (_check_map, 'a map of strings'),
+    'any': (lambda value: True, 'anything'),
+}
+
+
+def compile_schema(schema):
+    """Compile schema into check(value, path, errors).
+
+    check appends (json pointer, message) to errors for each value not
+    matching schema.
+    """
+    type_check, type_name = TYPE_CHECKS[schema['type']]
+    enum = schema.get('enum')
+    minimum = schema.get('minimum')
+    required = schema.get('required', [])
+    properties = [
+        (key, compile_schema(property_schema))
+        for key, property_schema in sorted(
+            schema.get('properties', {}).items()
+        )
+    ]
+    items = None
+    if 'items' in schema:
+        items = compile_schema(schema['items'])
+    min_items = schema.get('min_items')
+
+    def check(value, path, errors):
+        if not type_check(value):
+            errors.append((path, 'should be %s' % type_name))
+            return
+        if enum is not None and value not in enum:
+            errors.append((path, 'should be one of %s' % ', '.join(enum)))
+        if minimum is not None and value < minimum:
+            errors.append((path, 'should be at least %s' % minimum))
+        for key in required:
+            if key not in value:
+                errors.append((
+                    '%s/%s' % (path, _escape_pointer_token(key)),
+                    'is required'
+                ))
+        for key, check_property in properties:
+            if key in value:
+                check_property(
+                    value[key],
+                    '%s/%s' % (path, _escape_pointer_token(key)), errors
+                )
+        if min_items is not None and len(value) < min_items:
+            errors.append((
+                path, 'should have at least %s items' % min_items
+            ))
+        if items is not None:
+            for index, item in enumerate(value):
+                items(item, '%s/%s' % (path, index), errors)
+
+    return check
+
+
+def _object(required=[], **properties):
+    return {'type': 'object', 'required': required, 'properties': properties}
+
+
+def _array(items, min_items=None):
+    return {'type': 'array', 'items': items, 'min_items': min_items}
+
+
+STRING = {'type': 'string'}
+INTEGER = {'type': 'integer'}
+COUNT = {'type': 'integer', 'minimum': 0}
+PORT = {'type': 'integer', 'minimum': 1}
+QUANTITY = {'type': 'quantity'}
+MAP = {'type': 'map'}
+ANY = {'type': 'any'}
+STRINGS = _array(STRING)
+PROTOCOL = {'type': 'string', 'enum': ['TCP', 'UDP', 'SCTP']}
+
+METADATA = _object(
+    required=['name'], name=STRING, namespace=STRING,
+    labels=MAP, annotations=MAP
+)
+RESOURCE_LIST = _object(cpu=QUANTITY, memory=QUANTITY)
+CONTAINER_PROPERTIES = dict(
+    name=STRING,
+    image=STRING,
+    imagePullPolicy={
+        'type': 'string', 'enum': ['Always', 'IfNotPresent', 'Never']
+    },
+    command=STRINGS,
+    args=STRINGS,
+    ports=_array(_object(
+        required=['containerPort'],
+        containerPort=PORT, name=STRING, protocol=PROTOCOL
+    )),
+    env=_array(_object(
+        required=['name'], name=STRING, value=STRING, valueFrom=ANY
+    )),
+    resources=_object(limits=RESOURCE_LIST, requests=RESOURCE_LIST),
+    volumeMounts=_array(_object(
+        required=['name', 'mountPath'], name=STRING, mountPath=STRING
+    )),
+)
+CONTAINER = _object(required=['name', 'image'], **CONTAINER_PROPERTIES)
+# containers of replicated workloads are capacity planned from limits.
+PLANNED_CONTAINER = _object(
+    required=['name', 'image', 'resources'],
+    **dict(
+        CONTAINER_PROPERTIES,
+        resources=_object(
+            required=['limits'],
+            limits=_object(
+                required=['cpu', 'memory'], cpu=QUANTITY, memory=QUANTITY
+            ),
+            requests=RESOURCE_LIST
+        )
+    )
+)
+
+
+def _pod_spec(container):
+    return _object(
+        required=['containers'],
+        containers=_array(container, min_items=1),
+        initContainers=_array(CONTAINER),
+        nodeSelector=MAP,
+        restartPolicy={
+            'type': 'string', 'enum': ['Always', 'OnFailure', 'Never']
+        },
+        volumes=_array(_object(required=['name'], name=STRING)),
+    )
+
+
+def _controller_spec(required=[], **properties):
+    controller_properties = dict(
+        replicas=COUNT,
+        selector=ANY,
+        template=_object(
+            required=['metadata', 'spec'],
+            metadata=_object(labels=MAP, annotations=MAP),
+            spec=_pod_spec(PLANNED_CONTAINER)
+        ),
+    )
+    controller_properties.update(properties)
+    return _object(
+        required=['template'] + required, **controller_properties
+    )
+
+
+def _manifest(spec=None, required=['spec'], **properties):
+    if spec is not None:
+        properties['spec'] = spec
+    return _object(
+        required=['apiVersion', 'kind', 'metadata'] + required,
+        apiVersion=STRING, kind=STRING, metadata=METADATA, **properties
+    )
+
+
+SCHEMAS = {
+    'Service': _manifest(_object(
+        ports=_array(_object(
+            required=['port'],
+            port=PORT, targetPort=ANY, nodePort=PORT, name=STRING,
+            protocol=PROTOCOL
+        )),
+        selector=MAP,
+        clusterIP=STRING,
+        type={
+            'type': 'string',
+            'enum': ['ClusterIP', 'NodePort', 'LoadBalancer', 'ExternalName']
+        },
+    )),
+    'Pod': _manifest(_pod_spec(CONTAINER)),
+    'ReplicationController': _manifest(_controller_spec(selector=MAP)),
+    'Deployment': _manifest(_controller_spec()),
+    'StatefulSet': _manifest(_controller_spec(
+        required=['serviceName'], serviceName=STRING
+    )),
+    'Secret': _manifest(
+        required=[], type=STRING, data=MAP, stringData=MAP
+    ),
+}
+# other kinds are only checked for the common fields.
+DEFAULT_SCHEMA = _manifest()
+
+VALIDATORS = dict([
+    (kind, compile_schema(schema)) for kind, schema in SCHEMAS.items()
+])
+DEFAULT_VALIDATOR = compile_schema(DEFAULT_SCHEMA)
+
+
+def validate_document(document):
+    """Get errors of a manifest document as (json pointer, message)."""
+    errors = []
+    kind = document.get('kind') if isinstance(document, dict) else None
+    VALIDATORS.get(kind, DEFAULT_VALIDATOR)(document, '', errors)
+    return errors
@@ -0,0 +1,301 @@
+"""Search of capacity plans meeting an app sla.
+
+A candidate plan gives each workload of the base plan a number of
+replicas and a scale of the cpu and memory limits of its containers.
+Candidates are scored in batch as numpy arrays of shape
+(candidates, workloads). Each workload is a multi-server queue of its
+pods, each pod serving requests-per-core times its cpu cores, fed by
+the test plan load times the visits of a request to the workload along
+the service graph. Workloads no request visits keep their base
+replicas and limits.
+
+The queue model, requests per core and the squared coefficient of
+variation of service times, is calibrated from the measurements of
+dry runs of earlier plans.
+
+A plan is a json compatible dict:
+    {
+        'cost': ..., 'latency': ..., 'latency_p50': ..., 'latency_p99': ...,
+        'error_rate': ...,
+        'workloads': [<base plan entry with planned replicas and limits>]
+    }
+where latency is the mean and its percentiles in ms, and error_rate in
+percent of requests. A measured plan also has {'measurement': {'load':
+..., 'latency': ..., 'error_rate': ...}}.
+"""
+import numpy
+
+from smartops.utils import queueing
+from smartops.utils import setting_wrapper as setting
+
+
+# seed of the candidates sampled when there are too many to enumerate.
+SAMPLE_SEED = 0
+# models tried when calibrating.
+CALIBRATION_REQUESTS_PER_CORE = numpy.logspace(0, 4, 161)
+CALIBRATION_SERVICE_SCVS = numpy.array([0.25, 0.5, 1.0, 2.0, 4.0])
+
+
+def get_default_model():
+    return {
+        'requests_per_core': setting.PLANNER_REQUESTS_PER_CORE,
+        'service_scv': setting.PLANNER_SERVICE_SCV,
+    }
+
+
+def _get_options(base_plan, visits):
+    """Get replicas and resource scale options of each workload.
+
+    Returns two float arrays of shape (workloads, max options) padded
+    with their last option, and the number of options of each workload.
+    """
+    scales = sorted(setting.PLANNER_RESOURCE_SCALES)
+    replicas_options = []
+    scale_options = []
+    for workload in base_plan:
+        if not visits.get(workload['name']):
+            replicas_options.append([workload['pod_replicas']])
+            scale_options.append([1.0])
+            continue
+        replicas = range(
+            1, workload['pod_replicas'] + setting.PLANNER_MAX_REPLICA_ADD + 1
+        )
+        replicas_options.append([
+            replica for replica in replicas for _ in scales
+        ])
+        scale_options.append(scales * len(replicas))
+    counts = numpy.array([len(options) for options in replicas_options])
+    width = counts.max()
+
+    def _pad(options):
+        return [
+            workload_options + workload_options[-1:] * (
+                width - len(workload_options)
+            )
+            for workload_options in options
+        ]
+
+    return (
+        numpy.array(_pad(replicas_options), dtype=numpy.float64),
+        numpy.array(_pad(scale_options), dtype=numpy.float64),
+        counts
+    )
+
+
+def get_candidates(counts, max_candidates):
+    """Get option indexes of candidates, shape (candidates, workloads).
+
+    All combinations are enumerated when there are at most
+    max_candidates of them, otherwise max_candidates are sampled.
+    """
+    total = numpy.prod(counts.astype(numpy.float64))
+    if total <= max_candidates:
+        return numpy.array(
+            numpy.unravel_index(numpy.arange(int(total)), counts)
+        ).T
+    random = numpy.random.RandomState(SAMPLE_SEED)
+    candidates = (
+        random.random_sample((max_candidates, len(counts))) * counts
+    ).astype(numpy.int64)
+    if total >= 2 ** 62:
+        # duplicates are unlikely among so many combinations.
+        return candidates
+    return numpy.array(numpy.unravel_index(
+        numpy.unique(numpy.ravel_multi_index(candidates.T, counts)), counts
+    )).T
+
+
+def _get_resources(workloads):
+    """Get cpu cores and memory MiB of a pod of each workload."""
+    return (
+        numpy.array([
+            sum([container['cpu'] for container in workload['containers']])
+            for workload in workloads
+        ]),
+        numpy.array([
+            sum([
+                container['memory'] for container in workload['containers']
+            ])
+            for workload in workloads
+        ])
+    )
+
+
+def predict(load, replicas, cpu, visits, model, quantile=None):
+    """Predict latency (ms) and error rate (%) of candidates.
+
+    replicas and cpu (cores per pod) have shape (..., workloads),
+    visits is an array of the visits of a request to each workload,
+    model has requests_per_core and service_scv arrays broadcasting
+    with the candidates. Load above the capacity of a workload is
+    counted as errors.
+    """
+    visited = visits > 0
+    arrival_rate = load * visits
+    service_rate = cpu * numpy.asarray(model['requests_per_core'])[..., None]
+    latency = queueing.response_times(
+        arrival_rate, replicas, service_rate,
+        numpy.asarray(model['service_scv'])[..., None], quantile
+    ) * 1000
+    served = queueing.served_fractions(arrival_rate, replicas, service_rate)
+    return (
+        numpy.where(visited, latency * visits, 0).sum(axis=-1),
+        (1 - numpy.exp(
+            numpy.where(visited, numpy.log(served) * visits, 0).sum(axis=-1)
+        )) * 100
+    )
+
+
+def calibrate(plans):
+    """Get the model best predicting latency of measured plans.
+
+    Every model of the calibration grid is scored at once by the mean
+    squared log error of its predicted latency; the default model is
+    returned without measured plans.
+    """
+    measured = [
+        plan for plan in plans
+        if plan.get('workloads') and
+        (plan.get('measurement') or {}).get('latency') > 0
+    ]
+    if not measured:
+        return get_default_model()
+    requests_per_core, service_scv = [
+        grid.ravel() for grid in numpy.meshgrid(
+            CALIBRATION_REQUESTS_PER_CORE, CALIBRATION_SERVICE_SCVS
+        )
+    ]
+    model = {
+        'requests_per_core': requests_per_core, 'service_scv': service_scv
+    }
+    errors = numpy.zeros(requests_per_core.shape)
+    for plan in measured:
+        measurement = plan['measurement']
+        cpu, _ = _get_resources(plan['workloads'])
+        latency, _ = predict(
+            float(measurement['load']),
+            numpy.array([
+                workload['pod_replicas'] for workload in plan['workloads']
+            ], dtype=numpy.float64),
+            cpu,
+            numpy.array([
+                workload.get('visits', 1.0) for workload in plan['workloads']
+            ]),
+            model
+        )
+        # models saturating a measured plan are as bad as being 100x off.
+        errors += numpy.minimum(
+            numpy.log(latency / measurement['latency']) ** 2,
+            numpy.log(100) ** 2
+        )
+    best = errors.argmin()
+    return {
+        'requests_per_core': float(requests_per_core[best]),
+        'service_scv': float(service_scv[best]),
+    }
+
+
+def search_plans(base_plan, visits, sla, load, max_plans, model=None):
+    """Get the max_plans cheapest plans satisfying sla at load.
+
+    visits are the visits of a request to the workloads by name, sla
+    has the latency (ms), error_rate (%) and cost limits, load is the
+    requests per second. Plans are sorted by cost then latency.
+    """
+    if not base_plan:
+        return []
+    if model is None:
+        model = get_default_model()
+    replicas_options, scale_options, counts = _get_options(
+        base_plan, visits
+    )
+    candidates = get_candidates(counts, setting.PLANNER_MAX_CANDIDATES)
+    workload_indexes = numpy.arange(len(base_plan))
+    replicas = replicas_options[workload_indexes, candidates]
+    scales = scale_options[workload_indexes, candidates]
+    base_cpu, base_memory = _get_resources(base_plan)
+    workload_visits = numpy.array([
+        visits.get(workload['name'], 0.0) for workload in base_plan
+    ])
+    latency, error_rate = predict(
+        float(load), replicas, scales * base_cpu, workload_visits, model
+    )
+    cost = (replicas * scales * (
+        base_cpu * setting.PLANNER_CPU_COST +
+        base_memory / 1024 * setting.PLANNER_MEMORY_COST
+    )).sum(axis=1)
+    satisfied = numpy.flatnonzero(
+        (latency <= sla['latency']) &
+        (error_rate <= sla['error_rate']) &
+        (cost <= sla['cost'])
+    )
+    ranked = satisfied[
+        numpy.lexsort((latency[satisfied], cost[satisfied]))
+    ][:max_plans]
+    latency_p50, latency_p99 = [
+        predict(
+            float(load), replicas[ranked], scales[ranked] * base_cpu,
+            workload_visits, model, quantile
+        )[0]
+        for quantile in [0.5, 0.99]
+    ]
+    return [
+        {
+            'cost': float(cost[index]),
+            'latency': float(latency[index]),
+            'latency_p50': float(latency_p50[rank]),
+            'latency_p99': float(latency_p99[rank]),
+            'error_rate': float(error_rate[index]),
+            'model': model,
+            'workloads': [
+                dict(
+                    workload,
+                    pod_replicas=int(replicas[index, workload_index]),
+                    visits=float(workload_visits[workload_index]),
+                    containers=[
+                        dict(
+                            container,
+                            cpu=container['cpu'] * scales[
+                                index, workload_index
+                            ],
+                            memory=container['memory'] * scales[
+                                index, workload_index
+                            ]
+                        )
+                        for container in workload['containers']
+                    ]
+                )
+                for workload_index, workload in enumerate(base_plan)
+            ]
+        }
+        for rank, index in enumerate(ranked)
+    ]
+
+
+def get_pareto_front(objectives):
+    """Get indexes of the rows of objectives no other row dominates.
+
+    A row dominates another when it is no worse in every objective, all
+    minimized, and better in one. Rows are sorted lexicographically so
+    a row can only be dominated by rows before it, and each row is
+    checked against the front found so far at once (sort filter
+    skyline). Indexes are in the sorted order.
+    """
+    objectives = numpy.asarray(objectives, dtype=numpy.float64)
+    if not len(objectives):
+        return []
+    front = numpy.empty(objectives.shape)
+    front_size = 0
+    indexes = []
+    for index in numpy.lexsort(objectives.T[::-1]):
+        row = objectives[index]
+        dominating = front[:front_size]
+        if (
+            (dominating <= row).all(axis=1) &
+            (dominating < row).any(axis=1)
+        ).any():
+            continue
+        front[front_size] = row
+        front_size += 1
+        indexes.append(int(index))
+    return indexes
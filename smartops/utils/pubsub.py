@@ -0,0 +1,173 @@
+"""Publish/subscribe hub.
+
+Hub fans messages out to the subscribers of one process. RedisHub
+publishes through redis pub/sub instead, so subscribers of every api
+process get the messages published by any process, including celery
+workers: each process keeps a single redis connection listening on all
+topics and fans what it receives out to its own subscribers.
+"""
+import logging
+import Queue
+import threading
+import time
+
+import simplejson as json
+
+from smartops.utils import setting_wrapper as setting
+
+
+class Subscription(object):
+    """Messages of the subscribed topics queued for one subscriber.
+
+    When the subscriber falls behind by maxsize messages, the oldest
+    ones are dropped.
+    """
+
+    def __init__(self, hub, topics, maxsize=100):
+        self.hub = hub
+        self.topics = topics
+        self.queue = Queue.Queue(maxsize)
+
+    def put(self, message):
+        while True:
+            try:
+                self.queue.put_nowait(message)
+                return
+            except Queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except Queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """Get next message, or None if none arrives within timeout."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except Queue.Empty:
+            return None
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class Hub(object):
+    """Fan out published messages to the subscribers of the topic.
+
+    Publishing costs one queue put per subscriber, however many
+    subscribers watch the same topic.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+
+    def subscribe(self, topics, maxsize=100):
+        subscription = Subscription(self, topics, maxsize)
+        with self.lock:
+            for topic in topics:
+                self.subscriptions.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for topic in subscription.topics:
+                subscriptions = self.subscriptions.get(topic)
+                if not subscriptions:
+                    continue
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.subscriptions[topic]
+
+    def publish(self, topic, message):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(topic, []))
+        logging.debug(
+            'publish %s to %s subscribers of %s',
+            message, len(subscriptions), topic
+        )
+        for subscription in subscriptions:
+            subscription.put(message)
+
+
+class RedisHub(Hub):
+    """Hub publishing json messages through redis pub/sub.
+
+    client is a redis client. The listener thread starts with the first
+    subscription, so it runs in the process serving the subscribers,
+    e.g. a forked api worker, and reconnects after redis errors.
+    Messages published while it reconnects are lost.
+    """
+
+    def __init__(self, client, prefix='smartops:pubsub:'):
+        super(RedisHub, self).__init__()
+        self.client = client
+        self.prefix = prefix
+        self.listener = None
+        self.listening = threading.Event()
+
+    def _listen(self):
+        while True:
+            try:
+                redis_pubsub = self.client.pubsub()
+                redis_pubsub.psubscribe(self.prefix + '*')
+                for message in redis_pubsub.listen():
+                    if message['type'] == 'psubscribe':
+                        self.listening.set()
+                    elif message['type'] == 'pmessage':
+                        super(RedisHub, self).publish(
+                            message['channel'][len(self.prefix):],
+                            json.loads(message['data'])
+                        )
+            except Exception as error:
+                logging.error('failed to listen to redis pubsub: %s', error)
+            self.listening.clear()
+            time.sleep(setting.PUBSUB_RETRY_INTERVAL)
+
+    def _start_listener(self):
+        with self.lock:
+            if self.listener is None or not self.listener.is_alive():
+                self.listener = threading.Thread(
+                    target=self._listen, name='pubsub-listener'
+                )
+                self.listener.daemon = True
+                self.listener.start()
+        # messages published before the listener subscribed are missed.
+        if not self.listening.wait(setting.PUBSUB_CONNECT_TIMEOUT):
+            logging.error('redis pubsub is not listening')
+
+    def subscribe(self, topics, maxsize=100):
+        self._start_listener()
+        return super(RedisHub, self).subscribe(topics, maxsize)
+
+    def publish(self, topic, message):
+        try:
+            self.client.publish(self.prefix + topic, json.dumps(message))
+        except Exception as error:
+            logging.error(
+                'failed to publish %s to %s: %s', message, topic, error
+            )
+
+
+HUB = None
+
+
+def _create_hub():
+    backend_type = setting.PUBSUB_BACKEND
+    if backend_type == 'local':
+        return Hub()
+    if backend_type == 'redis':
+        import redis
+        return RedisHub(redis.StrictRedis.from_url(setting.PUBSUB_REDIS_URL))
+    raise ValueError('unknown pubsub backend %s' % backend_type)
+
+
+def init(hub=None):
+    """Init hub with hub or the one configured in setting."""
+    global HUB
+    HUB = hub or _create_hub()
+
+
+def get_hub():
+    if HUB is None:
+        init()
+    return HUB
@@ -0,0 +1,148 @@
+"""Parser of kubernetes resource quantities, e.g. 500m, 0.5, 2Gi, 1e3.
+
+Quantities are converted to exact integer milli-units, e.g. 500m cpu
+is 500 and 1Ki memory is 1024000, rounded up like kubernetes does for
+values finer than a milli-unit. Parsed strings are memoized, and the
+array functions work on numpy int64 arrays of milli-units for plans
+with many containers, falling back to exact python ints when values
+or sums are out of int64 range, e.g. from about 8Pi.
+"""
+import decimal
+import re
+import threading
+
+import numpy
+
+
+QUANTITY_PATTERN = re.compile(
+    r'^([+-]?(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+))'
+    r'([eE][+-]?[0-9]+|[KMGTPE]i|[numkMGTPE])?$'
+)
+SUFFIX_MULTIPLIERS = {
+    '': decimal.Decimal(1),
+    'n': decimal.Decimal('1e-9'),
+    'u': decimal.Decimal('1e-6'),
+    'm': decimal.Decimal('1e-3'),
+    'k': decimal.Decimal('1e3'),
+    'M': decimal.Decimal('1e6'),
+    'G': decimal.Decimal('1e9'),
+    'T': decimal.Decimal('1e12'),
+    'P': decimal.Decimal('1e15'),
+    'E': decimal.Decimal('1e18'),
+    'Ki': decimal.Decimal(2 ** 10),
+    'Mi': decimal.Decimal(2 ** 20),
+    'Gi': decimal.Decimal(2 ** 30),
+    'Ti': decimal.Decimal(2 ** 40),
+    'Pi': decimal.Decimal(2 ** 50),
+    'Ei': decimal.Decimal(2 ** 60),
+}
+MILLI = 1000
+MEBIBYTE = 2 ** 20
+# largest milli-units in an int64 array.
+MAX_MILLI = int(numpy.iinfo(numpy.int64).max)
+# parsed quantities memoized, cleared when it grows over the size.
+MEMO_SIZE = 10000
+MEMO = {}
+MEMO_LOCK = threading.Lock()
+
+
+def parse_quantity(value):
+    """Parse quantity string or number to an exact decimal."""
+    if isinstance(value, (int, long, float)) and not isinstance(value, bool):
+        return decimal.Decimal(str(value))
+    match = None
+    if isinstance(value, basestring):
+        match = QUANTITY_PATTERN.match(value.strip())
+    if match is None:
+        raise ValueError('invalid quantity %r' % (value,))
+    number, suffix = match.groups()
+    suffix = suffix or ''
+    if suffix not in SUFFIX_MULTIPLIERS:
+        # exponent, e.g. e3; E and Ei are suffixes.
+        return decimal.Decimal(number + suffix)
+    return decimal.Decimal(number) * SUFFIX_MULTIPLIERS[suffix]
+
+
+def parse_milli(value):
+    """Parse quantity to integer milli-units, rounded up."""
+    try:
+        return MEMO[value]
+    except (KeyError, TypeError):
+        pass
+    milli = int((parse_quantity(value) * MILLI).to_integral_value(
+        rounding=decimal.ROUND_CEILING
+    ))
+    if isinstance(value, basestring):
+        with MEMO_LOCK:
+            if len(MEMO) >= MEMO_SIZE:
+                MEMO.clear()
+            MEMO[value] = milli
+    return milli
+
+
+def parse_cpu(value):
+    """Parse cpu quantity to cores."""
+    return parse_milli(value) / float(MILLI)
+
+
+def parse_memory(value):
+    """Parse memory quantity to bytes, rounded up."""
+    return -(-parse_milli(value) // MILLI)
+
+
+def _get_bound(milli):
+    """Get the largest absolute value of a milli-units array."""
+    if not len(milli):
+        return 0
+    return max(int(milli.max()), -int(milli.min()))
+
+
+def parse_array(values):
+    """Parse a sequence of quantities to an int64 array of milli-units.
+
+    Each distinct value is parsed once. The array has dtype object,
+    holding python ints, if any value is out of int64 range.
+    """
+    milli_by_value = {}
+    for value in values:
+        if value not in milli_by_value:
+            milli_by_value[value] = parse_milli(value)
+    if milli_by_value and max(
+        [abs(milli) for milli in milli_by_value.values()]
+    ) > MAX_MILLI:
+        return numpy.array(
+            [milli_by_value[value] for value in values], dtype=object
+        )
+    return numpy.fromiter(
+        (milli_by_value[value] for value in values),
+        dtype=numpy.int64, count=len(values)
+    )
+
+
+def sum_quantities(values, weights=None):
+    """Sum quantities, each times its weight if given, in milli-units."""
+    milli = parse_array(values)
+    weights = numpy.asarray(
+        weights if weights is not None else [1] * len(milli),
+        dtype=numpy.int64
+    )
+    if _get_bound(milli) * _get_bound(weights) * len(milli) > MAX_MILLI:
+        # the sum could overflow int64.
+        milli = milli.astype(object)
+        weights = weights.astype(object)
+    return int((milli * weights).sum())
+
+
+def compare_quantities(values, others):
+    """Compare quantities pairwise.
+
+    Returns an int array with -1, 0 or 1 where values are less than,
+    equal to or greater than others.
+    """
+    values = parse_array(values)
+    others = parse_array(others)
+    # unlike the sign of the difference, it cannot overflow.
+    return (
+        (values > others).astype(numpy.int64) -
+        (values < others).astype(numpy.int64)
+    )
@@ -0,0 +1,71 @@
+"""Multi-server queue formulas vectorized over numpy arrays.
+
+A station is c identical servers fed by poisson arrivals. Response
+times of M/M/c stations are exact; general service times (M/G/c) use
+the Allen-Cunneen approximation, scaling the waiting time by
+(1 + scv) / 2 where scv is the squared coefficient of variation of the
+service time, so scv of 1 is M/M/c.
+"""
+import numpy
+
+
+def erlang_c(servers, offered_load):
+    """Get the probability an arrival waits at M/M/c stations.
+
+    servers is c and offered_load the arrival over service rate of
+    each station; stations should have offered_load below servers.
+    The erlang b recursion keeps it stable for many servers.
+    """
+    servers, offered_load = numpy.broadcast_arrays(
+        numpy.asarray(servers, dtype=numpy.float64),
+        numpy.asarray(offered_load, dtype=numpy.float64)
+    )
+    blocking = numpy.ones(servers.shape)
+    for server in range(1, int(servers.max()) + 1):
+        blocking = numpy.where(
+            server <= servers,
+            offered_load * blocking / (server + offered_load * blocking),
+            blocking
+        )
+    utilization = offered_load / servers
+    return blocking / (1 - utilization * (1 - blocking))
+
+
+def response_times(arrival_rate, servers, service_rate, scv=1.0,
+                   quantile=None):
+    """Get response times of M/G/c stations, inf when saturated.
+
+    It is the mean, or the quantile approximated by the exponential
+    service quantile plus the waiting time quantile, in the time unit
+    of the rates.
+    """
+    arrival_rate, servers, service_rate, scv = numpy.broadcast_arrays(
+        *[
+            numpy.asarray(value, dtype=numpy.float64)
+            for value in [arrival_rate, servers, service_rate, scv]
+        ]
+    )
+    capacity = servers * service_rate
+    stable = arrival_rate < capacity
+    # saturated stations are computed at zero load and then masked.
+    offered_load = numpy.where(stable, arrival_rate, 0) / service_rate
+    waiting = erlang_c(servers, offered_load)
+    drain_rate = numpy.where(stable, capacity - arrival_rate, 1)
+    variability = (1 + scv) / 2
+    if quantile is None:
+        times = 1 / service_rate + waiting / drain_rate * variability
+    else:
+        with numpy.errstate(divide='ignore'):
+            waiting_time = numpy.maximum(
+                numpy.log(waiting / (1 - quantile)), 0
+            ) / drain_rate * variability
+        times = -numpy.log(1 - quantile) / service_rate + waiting_time
+    return numpy.where(stable, times, numpy.inf)
+
+
+def served_fractions(arrival_rate, servers, service_rate):
+    """Get the fraction of arrivals within capacity of stations."""
+    capacity = numpy.asarray(servers, dtype=numpy.float64) * service_rate
+    return numpy.minimum(
+        1.0, capacity / numpy.maximum(arrival_rate, numpy.finfo(float).tiny)
+    )
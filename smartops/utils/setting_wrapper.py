@@ -17,6 +17,75 @@ DEFAULT_LOGBACKUPCOUNT = 5
 VENV_HOME = '/Users/xicheng/.virtualenvs/smartops'
 CELERYCONFIG_DIR = lazypy.delay(lambda: CONFIG_DIR)
 CELERYCONFIG_FILE = ''
+HTTP_CLIENT_POOL_SIZE = 10
+HTTP_CLIENT_TIMEOUT = 10
+HTTP_CLIENT_CACHE_TTL = 30
+HTTP_CLIENT_CACHE_STALE_TTL = 300
+# response cache backend: lru, redis, fake_redis or none. lru and
+# fake_redis do not see writes of other processes, e.g. celery workers,
+# so deployments with several processes use redis.
+RESPONSE_CACHE_BACKEND = 'lru'
+RESPONSE_CACHE_SIZE = 1000
+RESPONSE_CACHE_TTL = 60
+RESPONSE_CACHE_REDIS_URL = 'redis://redis:6379/0'
+# directory where each api process writes its metrics to be merged,
+# empty for a single process; prefork runserver uses a temporary one.
+METRICS_MULTIPROCESS_DIR = ''
+# seconds between writes of the metrics of a process.
+METRICS_FLUSH_INTERVAL = 1
+# pubsub of app status updates: local to one process, or redis to see
+# updates of other processes.
+PUBSUB_BACKEND = 'local'
+PUBSUB_REDIS_URL = 'redis://redis:6379/0'
+# status event streams open at once in an api process, each holding a
+# thread, keep it below the threads of a prefork worker; seconds after
+# which a stream ends and its client reconnects.
+STATUS_STREAM_MAX_PER_PROCESS = 4
+STATUS_STREAM_MAX_SECONDS = 300
+# seconds to wait for redis pubsub to listen, and before reconnecting.
+PUBSUB_CONNECT_TIMEOUT = 5
+PUBSUB_RETRY_INTERVAL = 1
+AUTOSHIFT_ENDPOINT = 'http://10.145.88.66:30500/api/autoshift/api/v1'
+# dry run result url of each app id, formatted with app_id.
+DRY_RUN_RESULT_URLS = {
+    1: '%s/apps/6/demand-profiles/11/all-merged' % AUTOSHIFT_ENDPOINT,
+}
+DRY_RUN_RESULT_URL = (
+    '%s/apps/7/demand-profiles/12/all-merged' % AUTOSHIFT_ENDPOINT
+)
+BLUEPRINT_MAX_SIZE = 10 * 1024 * 1024
+BLUEPRINT_MAX_DOCUMENTS = 1000
+# parsed blueprint cache backend: lru, redis to share it with celery
+# workers, or fake_redis.
+BLUEPRINT_CACHE_BACKEND = 'lru'
+BLUEPRINT_CACHE_SIZE = 100
+BLUEPRINT_CACHE_TTL = 24 * 3600
+BLUEPRINT_CACHE_REDIS_URL = 'redis://redis:6379/0'
+# capacity plan search: replicas added to the base plan replicas,
+# scales of the cpu and memory limits, candidates scored at most,
+# requests per second a cpu core serves and squared coefficient of
+# variation of service times until calibrated by measured plans,
+# cost per core and per GiB, and plans returned by a search.
+PLANNER_MAX_REPLICA_ADD = 6
+PLANNER_RESOURCE_SCALES = [0.5, 1.0, 1.5, 2.0]
+PLANNER_MAX_CANDIDATES = 200000
+PLANNER_REQUESTS_PER_CORE = 100.0
+PLANNER_SERVICE_SCV = 1.0
+PLANNER_CPU_COST = 1.0
+PLANNER_MEMORY_COST = 0.25
+PLANNER_MAX_PLANS = 5
+# connections kept alive to each kubernetes cluster.
+K8S_CONNECTION_POOL_SIZE = 10
+# components of a deployment level applied at once.
+DEPLOY_MAX_WORKERS = 8
+# seconds a watch of the cluster state cache is kept open before renewal.
+K8S_WATCH_TIMEOUT = 300
+# seconds before a failed list or watch of the cache is retried.
+K8S_INFORMER_RETRY_INTERVAL = 1
+# seconds to wait for the first list of the cache.
+K8S_INFORMER_SYNC_TIMEOUT = 30
+# seconds to wait for the components of a deployed app to be ready.
+DEPLOY_READY_TIMEOUT = 600
 
 if 'SMARTOPS_SETTING' in os.environ:
     SETTING = os.environ['SMARTOPS_SETTING']
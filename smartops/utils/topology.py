@@ -0,0 +1,353 @@
+"""Topology graph of the documents in a blueprint.
+
+The graph is a json compatible dict:
+    {
+        'workloads': [{
+            'kind': ..., 'name': ..., 'replicas': ..., 'labels': {...},
+            'containers': [{
+                'name': ..., 'image': ..., 'limits': {...},
+                'requests': {...}
+            }]
+        }],
+        'services': [{
+            'name': ..., 'selector': {...}, 'workloads': [index, ...],
+            'calls': [index, ...]
+        }]
+    }
+where services refer to the workloads their selector matches by index
+in workloads, and to the services their workloads call by index in
+services. A workload calls the services whose names, or kubernetes
+<NAME>_SERVICE_HOST variables, appear as hosts in the env values,
+command or args of its containers.
+"""
+import collections
+import re
+
+from smartops.utils import quantity
+
+
+# kinds running pods from a pod template.
+TEMPLATE_KINDS = [
+    'ReplicationController', 'ReplicaSet', 'Deployment', 'StatefulSet',
+    'DaemonSet', 'Job'
+]
+# kinds keeping spec.replicas pods running.
+REPLICATED_KINDS = [
+    'ReplicationController', 'ReplicaSet', 'Deployment', 'StatefulSet'
+]
+WORKLOAD_KINDS = ['Pod'] + TEMPLATE_KINDS
+HOST_PATTERN = re.compile(r'[A-Za-z0-9_][A-Za-z0-9_.-]*')
+SERVICE_VARIABLE_PATTERN = re.compile(r'^([A-Z0-9_]+)_SERVICE_(HOST|PORT)')
+
+
+def _get_pod_spec(document):
+    spec = document.get('spec') or {}
+    if document['kind'] == 'Pod':
+        return spec
+    return (spec.get('template') or {}).get('spec') or {}
+
+
+def _get_pod_labels(document):
+    if document['kind'] == 'Pod':
+        metadata = document.get('metadata') or {}
+    else:
+        template = (document.get('spec') or {}).get('template') or {}
+        metadata = template.get('metadata') or {}
+    return metadata.get('labels') or {}
+
+
+def _get_replicas(document):
+    if document['kind'] == 'Pod':
+        return 1
+    if document['kind'] in REPLICATED_KINDS:
+        return (document.get('spec') or {}).get('replicas', 1)
+    return 0
+
+
+def _get_containers(document):
+    containers = []
+    for container in _get_pod_spec(document).get('containers') or []:
+        resources = container.get('resources') or {}
+        containers.append({
+            'name': container.get('name'),
+            'image': container.get('image'),
+            'limits': resources.get('limits') or {},
+            'requests': resources.get('requests') or {},
+        })
+    return containers
+
+
+def _get_referenced_hosts(document):
+    """Get names of the hosts containers of document may connect to."""
+    values = []
+    for container in _get_pod_spec(document).get('containers') or []:
+        values.extend(container.get('command') or [])
+        values.extend(container.get('args') or [])
+        values.extend([
+            env.get('value') for env in container.get('env') or []
+        ])
+    hosts = set()
+    for value in values:
+        if not isinstance(value, basestring):
+            continue
+        for token in HOST_PATTERN.findall(value):
+            match = SERVICE_VARIABLE_PATTERN.match(token)
+            if match:
+                hosts.add(match.group(1).lower().replace('_', '-'))
+            else:
+                hosts.add(token.split('.')[0])
+    return hosts
+
+
+def match_expression(expression, labels):
+    """Check if labels match a selector requirement of matchExpressions."""
+    key = expression['key']
+    operator = expression['operator']
+    values = expression.get('values') or []
+    if operator == 'In':
+        return key in labels and labels[key] in values
+    if operator == 'NotIn':
+        return key not in labels or labels[key] not in values
+    if operator == 'Exists':
+        return key in labels
+    if operator == 'DoesNotExist':
+        return key not in labels
+    raise ValueError('unknown selector operator %s' % operator)
+
+
+class LabelIndex(object):
+    """Index of workloads by their pod labels."""
+
+    def __init__(self, workloads):
+        self.workloads = workloads
+        self.index = collections.defaultdict(set)
+        for workload_index, workload in enumerate(workloads):
+            for item in workload['labels'].items():
+                self.index[item].add(workload_index)
+
+    def select(self, selector):
+        """Get sorted indexes of the workloads matching selector.
+
+        selector is either a map of labels, as in services and
+        replication controllers, or a label selector with matchLabels
+        and matchExpressions. An empty selector matches nothing.
+        """
+        if 'matchLabels' in selector or 'matchExpressions' in selector:
+            match_labels = selector.get('matchLabels') or {}
+            expressions = selector.get('matchExpressions') or []
+        else:
+            match_labels = selector
+            expressions = []
+        if not match_labels and not expressions:
+            return []
+        if match_labels:
+            matched = set.intersection(*[
+                self.index.get(item, set())
+                for item in match_labels.items()
+            ])
+        else:
+            matched = set(range(len(self.workloads)))
+        return sorted([
+            workload_index for workload_index in matched
+            if all([
+                match_expression(
+                    expression, self.workloads[workload_index]['labels']
+                )
+                for expression in expressions
+            ])
+        ])
+
+
+def build_graph(documents):
+    """Build the topology graph of blueprint documents."""
+    workloads = []
+    workload_hosts = []
+    services = []
+    for document in documents:
+        kind = document.get('kind')
+        name = (document.get('metadata') or {}).get('name')
+        if kind in WORKLOAD_KINDS:
+            workload_hosts.append(_get_referenced_hosts(document))
+            workloads.append({
+                'kind': kind,
+                'name': name,
+                'replicas': _get_replicas(document),
+                'labels': _get_pod_labels(document),
+                'containers': _get_containers(document),
+            })
+        elif kind == 'Service':
+            spec = document.get('spec') or {}
+            services.append({
+                'name': name,
+                'selector': spec.get('selector') or {},
+            })
+    label_index = LabelIndex(workloads)
+    service_indexes = dict([
+        (service['name'], service_index)
+        for service_index, service in enumerate(services)
+    ])
+    for service_index, service in enumerate(services):
+        service['workloads'] = label_index.select(service['selector'])
+        service['calls'] = sorted(set([
+            service_indexes[host]
+            for workload_index in service['workloads']
+            for host in workload_hosts[workload_index]
+            if host in service_indexes
+        ]) - set([service_index]))
+    return {'workloads': workloads, 'services': services}
+
+
+def get_service_topology(graph):
+    """Get replicas behind each service, keyed by selector name.
+
+    It is the topology format used by the api and capacity planner:
+    {<selector name or service name>: {'service_name': ..., 'replica': ...}}
+    """
+    topology = {}
+    for service in graph['services']:
+        key = service['selector'].get('name', service['name'])
+        topology[key] = {
+            'service_name': service['name'],
+            'replica': sum([
+                graph['workloads'][workload_index]['replicas']
+                for workload_index in service['workloads']
+            ])
+        }
+    return topology
+
+
+def count_pods(graph):
+    return sum([workload['replicas'] for workload in graph['workloads']])
+
+
+def count_containers(graph):
+    return sum([
+        len(workload['containers']) for workload in graph['workloads']
+    ])
+
+
+def get_plan_name(workload):
+    """Get the name of workload in capacity plans."""
+    return workload['name'].replace('rc', '')
+
+
+def get_plan_visits(graph, entrypoint=None):
+    """Get mean visits per request of app to workloads by plan name.
+
+    Requests enter the entrypoint service, or every service no other
+    service calls if entrypoint is not a service, and each request to a
+    service calls each service in its calls once. Requests to a service
+    are spread evenly over its workloads. Calls closing a cycle, the
+    back edges of a depth first search from the entries, are not
+    followed, so visits are propagated once along the remaining acyclic
+    graph in topological order, in O(services + calls).
+    """
+    services = graph['services']
+    service_indexes = dict([
+        (service['name'], service_index)
+        for service_index, service in enumerate(services)
+    ])
+    if entrypoint in service_indexes:
+        entries = [service_indexes[entrypoint]]
+    else:
+        called = set([
+            callee for service in services
+            for callee in service.get('calls', [])
+        ])
+        entries = [
+            service_index for service_index in range(len(services))
+            if service_index not in called
+        ]
+    # depth first search keeping calls which are not back edges, and the
+    # services in post order.
+    on_path = [False] * len(services)
+    visited = [False] * len(services)
+    forward_calls = [[] for _ in services]
+    post_order = []
+    for entry in entries:
+        if visited[entry]:
+            continue
+        visited[entry] = on_path[entry] = True
+        stack = [(entry, iter(services[entry].get('calls', [])))]
+        while stack:
+            service_index, callees = stack[-1]
+            for callee in callees:
+                if on_path[callee]:
+                    continue
+                forward_calls[service_index].append(callee)
+                if not visited[callee]:
+                    visited[callee] = on_path[callee] = True
+                    stack.append(
+                        (callee, iter(services[callee].get('calls', [])))
+                    )
+                    break
+            else:
+                stack.pop()
+                on_path[service_index] = False
+                post_order.append(service_index)
+    service_visits = [0] * len(services)
+    for entry in entries:
+        service_visits[entry] += 1
+    for service_index in reversed(post_order):
+        for callee in forward_calls[service_index]:
+            service_visits[callee] += service_visits[service_index]
+    visits = collections.defaultdict(float)
+    for service_index, service in enumerate(services):
+        for workload_index in service['workloads']:
+            visits[get_plan_name(graph['workloads'][workload_index])] += (
+                service_visits[service_index] /
+                float(len(service['workloads']))
+            )
+    return dict(visits)
+
+
+def get_base_plan(graph):
+    """Get the base capacity plan of the templated workloads in graph.
+
+    Each plan has the workload name, its replicas and the cpu (cores)
+    and memory (MiB) limits of its containers. Workloads with any
+    container lacking cpu or memory limits are left out.
+    """
+    plans = []
+    for workload in graph['workloads']:
+        if workload['kind'] not in TEMPLATE_KINDS:
+            continue
+        if not workload['containers'] or not all([
+            'cpu' in container['limits'] and 'memory' in container['limits']
+            for container in workload['containers']
+        ]):
+            continue
+        plans.append({
+            'name': get_plan_name(workload),
+            'pod_replicas': workload['replicas'],
+            'containers': [
+                {
+                    'name': container['name'],
+                    'cpu': quantity.parse_cpu(container['limits']['cpu']),
+                    'memory': (
+                        quantity.parse_memory(container['limits']['memory'])
+                        / float(quantity.MEBIBYTE)
+                    ),
+                }
+                for container in workload['containers']
+            ]
+        })
+    return plans
+
+
+def get_resource_totals(graph):
+    """Get cpu cores and memory bytes limits of all pods in graph."""
+    totals = {}
+    for resource in ['cpu', 'memory']:
+        limits = []
+        replicas = []
+        for workload in graph['workloads']:
+            for container in workload['containers']:
+                if resource in container['limits']:
+                    limits.append(container['limits'][resource])
+                    replicas.append(workload['replicas'])
+        totals[resource] = quantity.sum_quantities(limits, replicas)
+    return {
+        'cpu_cores': totals['cpu'] / float(quantity.MILLI),
+        'memory_bytes': -(-totals['memory'] // quantity.MILLI)
+    }